@@ -0,0 +1,269 @@
+"""Admission control for the expensive generation routes.
+
+Each generation takes a token from its caller's bucket, keyed by JWT user
+id or, for anonymous calls, by client address. It then takes a token from
+a global bucket and a generation slot, which is held until the job
+finishes. A caller over their own quota gets 429. When the service as a
+whole is over its rate or generation cap the caller gets 503. Both carry
+Retry-After.
+
+The default memory backend keeps every check in-process, so admission costs
+microseconds and never competes with reads for MongoDB; each worker then
+enforces the limits on its own. ADMISSION_BACKEND=mongo shares them between
+workers at one atomic update per check.
+"""
+import asyncio
+import functools
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from auth.jwt_handler import verify_token, TokenError
+from generation.ratelimit import TokenBucket
+from observability.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_BACKEND = os.getenv('ADMISSION_BACKEND', 'memory')  # memory or mongo
+ADMISSION_USER_RATE_PER_MINUTE = float(os.getenv('ADMISSION_USER_RATE_PER_MINUTE', 2))
+ADMISSION_USER_BURST = float(os.getenv('ADMISSION_USER_BURST', 5))
+ADMISSION_ANON_RATE_PER_MINUTE = float(os.getenv('ADMISSION_ANON_RATE_PER_MINUTE', 0.5))
+ADMISSION_ANON_BURST = float(os.getenv('ADMISSION_ANON_BURST', 2))
+ADMISSION_GLOBAL_RATE_PER_MINUTE = float(os.getenv('ADMISSION_GLOBAL_RATE_PER_MINUTE', 60))
+ADMISSION_GLOBAL_BURST = float(os.getenv('ADMISSION_GLOBAL_BURST', 20))
+ADMISSION_MAX_GENERATIONS = int(os.getenv('ADMISSION_MAX_GENERATIONS', 32))
+# A slot its job never released, e.g. because the worker died, frees itself after this long
+ADMISSION_SLOT_TTL = float(os.getenv('ADMISSION_SLOT_TTL', 1800))
+# Retry-After sent when every generation slot is taken or the job queue is full
+ADMISSION_BUSY_RETRY_AFTER = int(os.getenv('ADMISSION_BUSY_RETRY_AFTER', 30))
+# Per-caller buckets kept by the memory backend; the least recently used are forgotten first
+ADMISSION_MAX_KEYS = int(os.getenv('ADMISSION_MAX_KEYS', 100000))
+
+GLOBAL_KEY = 'global'
+GENERATION_SLOTS = 'generations'
+
+ADMISSION_DECISIONS = registry.counter(
+    'admission_decisions_total', "Generation requests admitted or turned away by admission control", ('outcome',)
+)
+
+class AdmissionRejected(Exception):
+    """Raised when a generation is not admitted; status is 429 or 503"""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class MemoryBackend:
+    """Buckets and slots in this process's memory"""
+
+    def __init__(self, max_keys=ADMISSION_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> TokenBucket, least recently used first
+        self._slots = {}  # name -> {lease: monotonic expiry}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, rate, capacity):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # A forgotten caller comes back to a full bucket, as they would after idling
+                bucket = self._buckets[key] = TokenBucket(rate, capacity)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+    def take(self, key, rate, capacity):
+        """Take one token, returning 0 or the seconds until one is available"""
+        return self._bucket(key, rate, capacity).try_acquire()
+
+    def refund(self, key, rate, capacity):
+        self._bucket(key, rate, capacity).refund()
+
+    def acquire_slot(self, name, limit, ttl):
+        """A lease on one of limit slots, or None if they are all held"""
+        now = time.monotonic()
+        with self._lock:
+            holders = self._slots.setdefault(name, {})
+            for lease in [lease for lease, expires in holders.items() if expires <= now]:
+                del holders[lease]
+            if len(holders) >= limit:
+                return None
+            lease = uuid.uuid4().hex
+            holders[lease] = now + ttl
+            return lease
+
+    def release_slot(self, name, lease):
+        with self._lock:
+            self._slots.get(name, {}).pop(lease, None)
+
+    def in_use(self, name):
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for expires in self._slots.get(name, {}).values() if expires > now)
+
+class MongoBackend:
+    """Buckets and slots in MongoDB, shared by every worker.
+
+    Each check is one find_one_and_update with an update pipeline, so the
+    refill, the comparison and the take happen atomically on the server.
+    """
+
+    def take(self, key, rate, capacity):
+        from database.schemas import AdmissionBucket
+        now = time.time()
+        bucket = AdmissionBucket._get_collection().find_one_and_update(
+            {'_id': key},
+            [
+                {'$set': {
+                    'tokens': {'$min': [capacity, {'$add': [
+                        {'$ifNull': ['$tokens', capacity]},
+                        {'$multiply': [{'$max': [0, {'$subtract': [now, {'$ifNull': ['$updated', now]}]}]}, rate]}
+                    ]}]},
+                    'updated': now
+                }},
+                {'$set': {'granted': {'$gte': ['$tokens', 1]}}},
+                {'$set': {
+                    'tokens': {'$cond': ['$granted', {'$subtract': ['$tokens', 1]}, '$tokens']},
+                    'expires_at': datetime.utcnow() + timedelta(seconds=capacity / rate)
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return 0.0 if bucket['granted'] else (1 - bucket['tokens']) / rate
+
+    def refund(self, key, rate, capacity):
+        from database.schemas import AdmissionBucket
+        # The next take caps the balance at capacity again
+        AdmissionBucket._get_collection().update_one({'_id': key}, {'$inc': {'tokens': 1}})
+
+    def acquire_slot(self, name, limit, ttl):
+        from database.schemas import AdmissionSlots
+        now = time.time()
+        lease = uuid.uuid4().hex
+        slots = AdmissionSlots._get_collection().find_one_and_update(
+            {'_id': name},
+            [
+                {'$set': {'holders': {'$filter': {
+                    'input': {'$ifNull': ['$holders', []]},
+                    'cond': {'$gt': ['$$this.expires', now]}
+                }}}},
+                {'$set': {'granted': {'$lt': [{'$size': '$holders'}, limit]}}},
+                {'$set': {'holders': {'$cond': [
+                    '$granted',
+                    {'$concatArrays': ['$holders', [{'lease': lease, 'expires': now + ttl}]]},
+                    '$holders'
+                ]}}}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return lease if slots['granted'] else None
+
+    def release_slot(self, name, lease):
+        from database.schemas import AdmissionSlots
+        AdmissionSlots._get_collection().update_one({'_id': name}, {'$pull': {'holders': {'lease': lease}}})
+
+    def in_use(self, name):
+        from database.schemas import AdmissionSlots
+        slots = AdmissionSlots._get_collection().find_one({'_id': name}) or {}
+        now = time.time()
+        return sum(1 for holder in slots.get('holders', []) if holder['expires'] > now)
+
+def create_backend(name=ADMISSION_BACKEND):
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'mongo':
+        return MongoBackend()
+    raise ValueError(f"Unknown ADMISSION_BACKEND: {name}")
+
+class AdmissionController:
+    """Per-caller and global token buckets plus a cap on generations in flight"""
+
+    def __init__(self, backend, max_generations=ADMISSION_MAX_GENERATIONS, slot_ttl=ADMISSION_SLOT_TTL):
+        self.backend = backend
+        self.max_generations = max_generations
+        self.slot_ttl = slot_ttl
+        self.user_limit = (ADMISSION_USER_RATE_PER_MINUTE / 60, ADMISSION_USER_BURST)
+        self.anonymous_limit = (ADMISSION_ANON_RATE_PER_MINUTE / 60, ADMISSION_ANON_BURST)
+        self.global_limit = (ADMISSION_GLOBAL_RATE_PER_MINUTE / 60, ADMISSION_GLOBAL_BURST)
+
+    def caller(self, token=None, address=None):
+        """Bucket key and limit for a caller: the JWT user if the token verifies, else the address"""
+        if token:
+            try:
+                return f"user:{verify_token(token)['user_id']}", self.user_limit
+            except TokenError:
+                pass
+        return f"ip:{address or 'unknown'}", self.anonymous_limit
+
+    def admit(self, token=None, address=None):
+        """Admit one generation, returning the slot lease to release() when it finishes.
+
+        The caller's quota is checked first so a rejected caller never spends
+        global capacity, and tokens already taken are handed back when a
+        later check fails.
+        """
+        key, (rate, capacity) = self.caller(token, address)
+        wait = self.backend.take(key, rate, capacity)
+        if wait:
+            ADMISSION_DECISIONS.inc(outcome='caller_quota')
+            raise AdmissionRejected("Generation quota exceeded, try again later", 429, wait)
+
+        global_rate, global_capacity = self.global_limit
+        wait = self.backend.take(GLOBAL_KEY, global_rate, global_capacity)
+        if wait:
+            self.backend.refund(key, rate, capacity)
+            ADMISSION_DECISIONS.inc(outcome='global_rate')
+            raise AdmissionRejected("Too many generation requests, try again later", 503, wait)
+
+        lease = self.backend.acquire_slot(GENERATION_SLOTS, self.max_generations, self.slot_ttl)
+        if lease is None:
+            self.backend.refund(key, rate, capacity)
+            self.backend.refund(GLOBAL_KEY, global_rate, global_capacity)
+            ADMISSION_DECISIONS.inc(outcome='saturated')
+            raise AdmissionRejected("All generation slots are busy, try again later", 503,
+                                    ADMISSION_BUSY_RETRY_AFTER)
+        ADMISSION_DECISIONS.inc(outcome='admitted')
+        return lease
+
+    def release(self, lease):
+        if not lease:
+            return
+        try:
+            self.backend.release_slot(GENERATION_SLOTS, lease)
+        except Exception:
+            # The lease times out on its own after slot_ttl
+            logger.exception("Error releasing generation slot")
+
+    def in_flight(self):
+        return self.backend.in_use(GENERATION_SLOTS)
+
+    def releasing(self, handler):
+        """Wrap a job handler so the lease in params['admission_lease'] is released when it finishes"""
+        if asyncio.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def run_async(job_id, params, progress):
+                try:
+                    return await handler(job_id, params, progress)
+                finally:
+                    await asyncio.to_thread(self.release, params.get('admission_lease'))
+            return run_async
+
+        @functools.wraps(handler)
+        def run(job_id, params, progress):
+            try:
+                return handler(job_id, params, progress)
+            finally:
+                self.release(params.get('admission_lease'))
+        return run
+
+admission = AdmissionController(create_backend())
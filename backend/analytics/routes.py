@@ -0,0 +1,89 @@
+import logging
+import os
+from collections import Counter, defaultdict
+from bson import ObjectId
+from flask import Blueprint, request, jsonify
+from database.counters import stat_counter, STATS_WRITE_MODE
+from database.mongodb import DatabaseOperations
+from database.serializers import json_response
+from .store import event_log, parse_events, parse_time, series
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_MAX_BATCH = int(os.getenv('ANALYTICS_MAX_BATCH', 1000))
+
+analytics = Blueprint('analytics', __name__)
+
+@analytics.route('/events', methods=['POST'])
+def ingest_events():
+    """Record a batch of play/like/share events in the analytics log and the lifetime totals"""
+    raw = (request.get_json(silent=True) or {}).get('events')
+    if not isinstance(raw, list) or not raw:
+        return jsonify({"error": "events must be a non-empty list"}), 400
+    if len(raw) > ANALYTICS_MAX_BATCH:
+        return jsonify({"error": f"At most {ANALYTICS_MAX_BATCH} events per batch"}), 400
+    try:
+        events, rejected = parse_events(raw)
+        # One query for the whole batch rather than one per event
+        existing = {str(row['_id']) for row in DatabaseOperations.get_podcasts_by_ids(
+            {podcast_id for _, podcast_id, _, _ in events}, {'_id': 1})}
+        accepted = []
+        for index, podcast_id, action, when in events:
+            if podcast_id in existing:
+                accepted.append((podcast_id, action, when))
+            else:
+                rejected.append({"index": index, "error": "Podcast not found"})
+        if not accepted:
+            return jsonify({"error": "No valid events", "rejected": rejected}), 400
+
+        event_log.record_many(accepted)
+        # Lifetime totals on the podcast documents are written the same way as single stat updates
+        counts = Counter((podcast_id, action) for podcast_id, action, _ in accepted)
+        if STATS_WRITE_MODE == 'buffered':
+            for (podcast_id, action), count in counts.items():
+                stat_counter.increment(podcast_id, f"{action}s", count)
+        else:
+            by_podcast = defaultdict(dict)
+            for (podcast_id, action), count in counts.items():
+                by_podcast[podcast_id][f"{action}s"] = count
+            DatabaseOperations.increment_podcast_stats(by_podcast)
+        return jsonify({
+            "accepted": len(accepted),
+            "rejected": sorted(rejected, key=lambda entry: entry['index'])
+        }), 202
+    except Exception as e:
+        logger.exception("Error in ingest_events")
+        return jsonify({"error": str(e)}), 500
+
+def _series(podcast_id=None):
+    try:
+        start, end = request.args.get('start'), request.args.get('end')
+        result = series(
+            podcast_id,
+            start=parse_time(start) if start else None,
+            end=parse_time(end) if end else None,
+            resolution=request.args.get('resolution')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return json_response(dict(result, podcast_id=podcast_id))
+
+@analytics.route('/podcasts/<podcast_id>', methods=['GET'])
+def podcast_series(podcast_id):
+    """One podcast's counts per minute, hour or day over ?start= to ?end="""
+    try:
+        if not ObjectId.is_valid(podcast_id) or not DatabaseOperations.get_podcasts_by_ids([podcast_id], {'_id': 1}):
+            return jsonify({"error": "Podcast not found"}), 404
+        return _series(podcast_id)
+    except Exception as e:
+        logger.exception("Error in podcast_series")
+        return jsonify({"error": str(e)}), 500
+
+@analytics.route('/global', methods=['GET'])
+def global_series():
+    """Counts across all podcasts per minute, hour or day over ?start= to ?end="""
+    try:
+        return _series()
+    except Exception as e:
+        logger.exception("Error in global_series")
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,353 @@
+"""Per-minute, hour and day play/like/share counts from an append-only event log.
+
+Events are buffered in memory as compact array columns. Every
+ANALYTICS_FLUSH_INTERVAL seconds the buffer is appended to the log as one
+segment and rolled up into AnalyticsBucket counts for each podcast and for
+all podcasts together. Each resolution expires on its own schedule, so
+minute detail covers the last two days, hours the last three months and
+days are kept indefinitely.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+from database.schemas import AnalyticsSegment, AnalyticsBucket
+from observability.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv('ANALYTICS_FLUSH_INTERVAL', 5))
+ANALYTICS_MAX_BUFFERED = int(os.getenv('ANALYTICS_MAX_BUFFERED', 100000))
+# Seconds each resolution is kept after its bucket closes; 0 keeps it forever
+ANALYTICS_RETENTION = {
+    'minute': float(os.getenv('ANALYTICS_MINUTE_RETENTION_HOURS', 48)) * 3600,
+    'hour': float(os.getenv('ANALYTICS_HOUR_RETENTION_DAYS', 90)) * 86400,
+    'day': float(os.getenv('ANALYTICS_DAY_RETENTION_DAYS', 0)) * 86400
+}
+ANALYTICS_LOG_RETENTION = timedelta(days=float(os.getenv('ANALYTICS_LOG_RETENTION_DAYS', 7)))
+# Clients may batch events up, but not report ones older than this
+ANALYTICS_MAX_EVENT_AGE = float(os.getenv('ANALYTICS_MAX_EVENT_AGE_HOURS', 24)) * 3600
+ANALYTICS_MAX_CLOCK_SKEW = 300
+# A segment still not rolled up this long after it was claimed is taken over by another worker
+ANALYTICS_STALE_SECONDS = float(os.getenv('ANALYTICS_STALE_SECONDS', 300))
+MAX_SERIES_POINTS = 2000
+
+ACTIONS = ('play', 'like', 'share')
+FIELDS = ('plays', 'likes', 'shares')
+RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+EVENTS = registry.counter('analytics_events_total', "Events accepted into the analytics log", ('action',))
+EVENTS_DROPPED = registry.counter(
+    'analytics_events_dropped_total', "Events dropped because the analytics buffer filled while writes were failing"
+)
+
+def _seconds(when):
+    """Epoch seconds of a naive UTC datetime"""
+    return int(when.replace(tzinfo=timezone.utc).timestamp())
+
+def _datetime(seconds):
+    """Naive UTC datetime of epoch seconds, as stored everywhere else"""
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+def parse_time(value):
+    """Epoch seconds from a number of seconds or an ISO 8601 string (UTC unless it has an offset)"""
+    try:
+        return _parse_time(value)
+    except OverflowError:
+        # "inf" or 1e400 is a bad value from the client like any other
+        raise ValueError(f"Invalid time: {value}")
+
+def _parse_time(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(float(value))
+        except ValueError:
+            pass
+        try:
+            when = datetime.fromisoformat(value)
+        except ValueError:
+            pass
+        else:
+            return int((when if when.tzinfo else when.replace(tzinfo=timezone.utc)).timestamp())
+    raise ValueError(f"Invalid time: {value}")
+
+def parse_events(raw):
+    """Validate a batch of {"podcast_id", "action", "ts"} events.
+
+    Returns the (index, podcast_id, action, epoch seconds) of the valid ones
+    and an {"index", "error"} entry for each rejected one. ts is optional and
+    must fall within ANALYTICS_MAX_EVENT_AGE of now.
+    """
+    now = time.time()
+    events, rejected = [], []
+    for index, event in enumerate(raw):
+        try:
+            if not isinstance(event, dict):
+                raise ValueError("Event must be an object")
+            podcast_id, action = event.get('podcast_id'), event.get('action')
+            if not isinstance(podcast_id, str) or not ObjectId.is_valid(podcast_id):
+                raise ValueError("Invalid podcast id")
+            if action not in ACTIONS:
+                raise ValueError("Invalid action")
+            when = int(now) if event.get('ts') is None else parse_time(event['ts'])
+            if not now - ANALYTICS_MAX_EVENT_AGE <= when <= now + ANALYTICS_MAX_CLOCK_SKEW:
+                raise ValueError("Event time out of range")
+        except ValueError as e:
+            rejected.append({"index": index, "error": str(e)})
+            continue
+        events.append((index, podcast_id, action, when))
+    return events, rejected
+
+def _pack(column):
+    return zlib.compress(column.tobytes())
+
+def _unpack(typecode, data):
+    column = array(typecode)
+    column.frombytes(zlib.decompress(data))
+    return column
+
+def decode_segment(segment):
+    """(times, podcast_index, actions, podcasts) columns of a stored log segment"""
+    return (
+        _unpack('I', segment['times']),
+        _unpack('I', segment['podcast_index']),
+        _unpack('B', segment['actions']),
+        segment['podcasts']
+    )
+
+def bucket_updates(times, podcast_index, actions, podcasts):
+    """$inc upserts adding events to every bucket they fall in, per podcast and across all podcasts"""
+    minutes = Counter(zip(podcast_index, (when - when % 60 for when in times), actions))
+    buckets = defaultdict(Counter)  # (podcast, resolution, start) -> {field: count}
+    for (index, minute, action), count in minutes.items():
+        for podcast in (podcasts[index], None):
+            for resolution, size in RESOLUTIONS.items():
+                buckets[(podcast, resolution, minute - minute % size)][FIELDS[action]] += count
+
+    updates = []
+    for (podcast, resolution, start), fields in buckets.items():
+        update = {'$inc': dict(fields)}
+        retention = ANALYTICS_RETENTION[resolution]
+        if retention:
+            update['$setOnInsert'] = {'expires_at': _datetime(start + RESOLUTIONS[resolution] + retention)}
+        updates.append(UpdateOne(
+            {'podcast': podcast, 'resolution': resolution, 'start': _datetime(start)}, update, upsert=True
+        ))
+    return updates
+
+class EventLog:
+    """Buffers analytics events and writes them as log segments plus bucket rollups.
+
+    Rollups are at least once: if a worker dies between writing a segment and
+    marking it rolled up, another worker rolls it up after
+    ANALYTICS_STALE_SECONDS. The flusher thread starts on first use so it is
+    created after any worker fork.
+    """
+
+    def __init__(self, flush_interval=ANALYTICS_FLUSH_INTERVAL, max_buffered=ANALYTICS_MAX_BUFFERED):
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._times = array('I')  # epoch seconds
+        self._podcast_index = array('I')  # index into _podcasts
+        self._actions = array('B')  # index into ACTIONS
+        self._podcasts = {}  # podcast ObjectId -> index, in insertion order
+
+    def buffered(self):
+        return len(self._times)
+
+    def record(self, podcast_id, action, when=None):
+        self.record_many([(podcast_id, action, when)])
+
+    def record_many(self, events):
+        """Buffer (podcast_id, action, epoch seconds or None for now) events"""
+        events = [(ObjectId(podcast_id), ACTIONS.index(action), when) for podcast_id, action, when in events]
+        self._ensure_started()
+        now = int(time.time())
+        with self._lock:
+            for podcast_id, action, when in events:
+                self._times.append(now if when is None else when)
+                self._podcast_index.append(self._podcasts.setdefault(podcast_id, len(self._podcasts)))
+                self._actions.append(action)
+            full = len(self._times) >= self.max_buffered
+        for action, count in Counter(action for _, action, _ in events).items():
+            EVENTS.inc(count, action=ACTIONS[action])
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Append buffered events to the log and roll them up, returning how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._times:
+                    return 0
+                times, podcast_index, actions = self._times, self._podcast_index, self._actions
+                podcasts = list(self._podcasts)
+                self._reset()
+
+            now = datetime.utcnow()
+            try:
+                segment_id = AnalyticsSegment._get_collection().insert_one({
+                    'start': _datetime(min(times)),
+                    'count': len(times),
+                    'podcasts': podcasts,
+                    'times': _pack(times),
+                    'podcast_index': _pack(podcast_index),
+                    'actions': _pack(actions),
+                    'rolled': False,
+                    'claimed_at': now,
+                    'expires_at': now + ANALYTICS_LOG_RETENTION,
+                    'created_at': now
+                }).inserted_id
+            except Exception:
+                self._restore(times, podcast_index, actions, podcasts)
+                raise
+            # Once the segment is stored a failed rollup is retried by recover(), not here
+            self._roll(segment_id, times, podcast_index, actions, podcasts)
+            return len(times)
+
+    def _restore(self, times, podcast_index, actions, podcasts):
+        """Put the events of a failed flush back, dropping the oldest past twice max_buffered"""
+        with self._lock:
+            dropped = max(0, len(times) + len(self._times) - 2 * self.max_buffered)
+            dropped = min(dropped, len(times))
+            remap = [self._podcasts.setdefault(podcast_id, len(self._podcasts)) for podcast_id in podcasts]
+            self._times.extend(times[dropped:])
+            self._podcast_index.extend(remap[index] for index in podcast_index[dropped:])
+            self._actions.extend(actions[dropped:])
+        if dropped:
+            EVENTS_DROPPED.inc(dropped)
+            logger.warning("Dropped %d analytics events while the log was unavailable", dropped)
+
+    def _roll(self, segment_id, times, podcast_index, actions, podcasts):
+        AnalyticsBucket._get_collection().bulk_write(
+            bucket_updates(times, podcast_index, actions, podcasts), ordered=False
+        )
+        AnalyticsSegment._get_collection().update_one({'_id': segment_id}, {'$set': {'rolled': True}})
+
+    def recover(self):
+        """Roll up segments a worker stored but never finished rolling up, returning how many"""
+        collection = AnalyticsSegment._get_collection()
+        recovered = 0
+        while True:
+            now = datetime.utcnow()
+            segment = collection.find_one_and_update(
+                {'rolled': False, 'claimed_at': {'$lt': now - timedelta(seconds=ANALYTICS_STALE_SECONDS)}},
+                {'$set': {'claimed_at': now}}
+            )
+            if segment is None:
+                return recovered
+            self._roll(segment['_id'], *decode_segment(segment))
+            recovered += 1
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='analytics-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        last_recovery = time.monotonic()
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing analytics events")
+            if time.monotonic() - last_recovery >= ANALYTICS_STALE_SECONDS:
+                last_recovery = time.monotonic()
+                try:
+                    self.recover()
+                except Exception:
+                    logger.exception("Error recovering analytics rollups")
+
+event_log = EventLog()
+
+def _duration(seconds):
+    return f"{seconds / 86400:g} days" if seconds >= 86400 else f"{seconds / 3600:g} hours"
+
+def choose_resolution(start, end):
+    """Finest resolution that still covers start and fits [start, end) in MAX_SERIES_POINTS buckets"""
+    oldest = time.time()
+    for resolution, size in RESOLUTIONS.items():
+        retention = ANALYTICS_RETENTION[resolution]
+        if (not retention or start >= oldest - retention) and (end - start) / size <= MAX_SERIES_POINTS:
+            return resolution
+    return 'day'
+
+def series(podcast_id=None, start=None, end=None, resolution=None):
+    """Zero-filled counts per bucket over [start, end), for one podcast or all of them.
+
+    start and end are epoch seconds, by default the last 24 hours. Without a
+    resolution the finest one still kept for start is used.
+    """
+    end = int(time.time()) if end is None else end
+    start = end - 86400 if start is None else start
+    if start >= end:
+        raise ValueError("start must be before end")
+    resolution = resolution or choose_resolution(start, end)
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    size = RESOLUTIONS[resolution]
+    retention = ANALYTICS_RETENTION[resolution]
+    if retention and start < time.time() - retention:
+        raise ValueError(f"{resolution} buckets only cover the last {_duration(retention)}")
+    first = start - start % size
+    points = -(-(end - first) // size)
+    if points > MAX_SERIES_POINTS:
+        raise ValueError(f"Range spans {points} {resolution} buckets, at most {MAX_SERIES_POINTS} are allowed")
+
+    rows = AnalyticsBucket._get_collection().find(
+        {
+            'podcast': ObjectId(podcast_id) if podcast_id else None,
+            'resolution': resolution,
+            'start': {'$gte': _datetime(first), '$lt': _datetime(end)}
+        },
+        {'_id': 0, 'start': 1, **{field: 1 for field in FIELDS}}
+    )
+    counts = {_seconds(row['start']): row for row in rows}
+    buckets = []
+    totals = dict.fromkeys(FIELDS, 0)
+    for bucket in range(first, end, size):
+        row = counts.get(bucket, {})
+        entry = {field: row.get(field, 0) for field in FIELDS}
+        for field in FIELDS:
+            totals[field] += entry[field]
+        buckets.append(dict(start=_datetime(bucket), **entry))
+    return {
+        "resolution": resolution,
+        "start": _datetime(first),
+        "end": _datetime(end),
+        "buckets": buckets,
+        "totals": totals
+    }
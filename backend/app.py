@@ -1,62 +1,157 @@
+import time
+_import_started = time.perf_counter()
+
 import os
-from flask import Flask, request, jsonify
+import logging
+import threading
+from flask import Flask, Blueprint, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
-import openai
-from elevenlabs import generate, save, set_api_key
 from bson import ObjectId, json_util
 import json
 from database.mongodb import DatabaseOperations
-from database.schemas import User, Podcast
-from datetime import datetime
-import traceback
+from database.counters import stat_counter, STATS_WRITE_MODE
+from database.serializers import listing_projection, json_response
+from database.schemas import User
+from mongoengine.errors import NotUniqueError
 from auth.routes import auth
-from werkzeug.security import generate_password_hash
-from auth.jwt_handler import generate_token
-import cloudinary
-import cloudinary.uploader
+from jobs.routes import jobs
+from media.routes import media
+from search.routes import search
+from search.similar import similarity_index, SIGNATURE_FIELDS
+from trending.engine import TRENDING_TOP_N
+from analytics.routes import analytics
+from analytics.store import event_log
+from transfer.routes import transfer
+from media.mp3 import audio_info
+from jobs.queue import create_job_queue, QueueFull
+from generation.pipeline import generate_podcast_job, build_seed_graph, reuse_podcast
+from generation.batch import generate_batch_job, parse_batch, BATCH_CONCURRENCY
+from generation.graph import StageError
+from generation.cache import generation_cache
+from generation.tts import phrase_cache
+from auth.passwords import password_hasher, HasherBusy
+from auth.jwt_handler import generate_token, revoke_user_tokens, token_required, get_request_token
+from admission.control import admission, AdmissionRejected, ADMISSION_BUSY_RETRY_AFTER
+from observability.logs import setup_logging
+from observability.metrics import registry
+from observability.routes import observability, instrument
 
 # Load environment variables
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+api = Blueprint('api', __name__)
+
+# Background job queue for long-running generation work; its worker threads
+# start on first use in each process
+job_queue = create_job_queue()
+# Each job frees the generation slot it was admitted with when it finishes
+job_queue.register('generate_podcast', admission.releasing(generate_podcast_job))
+job_queue.register('generate_batch', admission.releasing(generate_batch_job))
+
+COLD_START_SECONDS = registry.gauge('app_cold_start_seconds', "Import plus create_app() time of this process")
+WORKER_START_SECONDS = registry.gauge('worker_start_seconds', "Per-process startup run on a worker's first request")
+registry.callback_gauge('job_queue_free_slots', "Jobs that can still be queued before submissions are refused",
+                        job_queue.free_slots)
+registry.callback_gauge('generation_cache_stats', "Generation cache counters and sizes",
+                        lambda: {(name,): value for name, value in generation_cache.snapshot().items()}, ('stat',))
+registry.callback_gauge('admission_generations_in_flight', "Admitted generations that have not finished yet",
+                        admission.in_flight)
+registry.callback_gauge('analytics_events_buffered', "Analytics events waiting for the next log flush",
+                        event_log.buffered)
+registry.callback_gauge('tts_phrase_cache_stats', "TTS phrase cache counters and sizes",
+                        lambda: {(name,): value for name, value in phrase_cache.snapshot().items()}, ('stat',))
+
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+def start_worker():
+    """Per-process startup, run on the first request each (possibly forked) worker handles.
+
+    Nothing here runs at import time, so a gunicorn --preload master never
+    opens MongoDB connections, hashing processes or worker threads that its
+    forked workers would inherit.
+    """
+    global _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        started = time.perf_counter()
+        # Start the password hashing workers in the background rather than on the first login
+        password_hasher.warm_up()
+        setup_logging()
+        # Begin loading the near-duplicate index; checks are skipped, not parked, until it is ready
+        similarity_index.start()
+        try:
+            resumed = job_queue.resume_unfinished()
+        except Exception:
+            resumed = 0
+            logger.exception("Error resuming unfinished jobs")
+        _worker_pid = os.getpid()
+        WORKER_START_SECONDS.set(time.perf_counter() - started)
+        logger.info("Worker started in %.3fs, resumed %d jobs", time.perf_counter() - started, resumed,
+                    extra={'pid': _worker_pid})
+
+def create_app():
+    """Build the Flask app without touching MongoDB or any provider SDK"""
+    setup_logging()
+    app = Flask(__name__)
+    app.config['CORS_HEADERS'] = 'Content-Type'
+    CORS(app, resources={r"/*": {"origins": "http://localhost:3010"}})
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name = "dvgyv4sgq",
-    api_key = os.getenv('CLOUDINARY_API_KEY'),
-    api_secret = os.getenv('CLOUDINARY_API_SECRET')
-)
+    app.register_blueprint(api)
+    app.register_blueprint(auth, url_prefix='/auth')
+    app.register_blueprint(jobs, url_prefix='/jobs')
+    app.register_blueprint(media)
+    app.register_blueprint(search)
+    app.register_blueprint(analytics, url_prefix='/analytics')
+    app.register_blueprint(transfer, url_prefix='/admin')
+    app.register_blueprint(observability)
+    app.extensions['job_queue'] = job_queue
+    app.before_request(start_worker)
+    instrument(app)
 
-# Initialize Flask app
-app = Flask(__name__)
-app.config['CORS_HEADERS'] = 'Content-Type'
-CORS(app, resources={r"/*": {"origins": "http://localhost:3010"}})
+    cold_start = time.perf_counter() - _import_started
+    COLD_START_SECONDS.set(cold_start)
+    logger.info("App created in %.3fs", cold_start)
+    return app
 
-# Register the auth blueprint
-app.register_blueprint(auth, url_prefix='/auth')
+MAX_PAGE_SIZE = 100
 
-# API Keys Configuration
-openai.api_key = os.getenv('OPENAI_API_KEY')
-set_api_key(os.getenv('ELEVENLABS_API_KEY'))
+def retry_later(error, status=503, retry_after=ADMISSION_BUSY_RETRY_AFTER):
+    """Error response telling the client when to try again"""
+    response = jsonify({"error": str(error)})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, status
 
-@app.route('/seed-sample-podcasts', methods=['POST'])
-def seed_sample_podcasts():
+@api.route('/seed-sample-podcasts', methods=['POST'])
+@token_required
+def seed_sample_podcasts(current_user):
+    """Generate the sample podcasts in the request (admin only)"""
+    if current_user.get('role') != 'admin':
+        return jsonify({"error": "Admin access required"}), 403
     try:
-        print("Starting sample podcast seeding process...")
+        lease = admission.admit(get_request_token(), request.remote_addr)
+    except AdmissionRejected as e:
+        return retry_later(e, e.status, e.retry_after)
+    try:
+        logger.info("Starting sample podcast seeding")
         
         # Create a test user if it doesn't exist
         test_user = User.objects(email="eyeoverthink@gmail.com").first()
         if not test_user:
-            print("Creating test user...")
             try:
                 test_user = DatabaseOperations.create_user(
                     username="eyeoverthink",
                     email="eyeoverthink@gmail.com",
                     password_hash="test_password_hash"
                 )
-                print("Test user created successfully")
+                logger.info("Test user created")
             except Exception as user_error:
-                print(f"Error creating test user: {str(user_error)}")
-                print(traceback.format_exc())
+                logger.exception("Error creating test user")
                 return jsonify({"error": f"Failed to create test user: {str(user_error)}"}), 500
 
         # Sample topics for diverse content
@@ -71,63 +166,27 @@ def seed_sample_podcasts():
         created_podcasts = []
         for topic_data in sample_topics:
             try:
-                print(f"\n=== Starting podcast generation for topic: {topic_data['topic']} ===")
-                
-                # Generate script using OpenAI
-                print("\n1. Generating script with OpenAI...")
-                try:
-                    response = openai.ChatCompletion.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "You are a professional podcast script writer. Write a short, engaging script about programming topics."},
-                            {"role": "user", "content": f"Write a 2-minute podcast script about {topic_data['topic']}. Include a brief introduction and 2-3 main points."}
-                        ]
-                    )
-                    script = response.choices[0].message.content
-                    print("✅ Script generated successfully")
-                    print(f"Script length: {len(script)} characters")
-                except Exception as openai_error:
-                    print(f"❌ OpenAI Error: {str(openai_error)}")
-                    print(traceback.format_exc())
-                    continue
-
-                # Generate thumbnail using DALL-E
-                print("\n2. Generating thumbnail with DALL-E...")
-                try:
-                    image_response = openai.Image.create(
-                        prompt=f"A minimalist, modern podcast cover art about Python programming. Use cool blue colors and simple Python logo.",
-                        n=1,
-                        size="1024x1024"
-                    )
-                    thumbnail_url = image_response['data'][0]['url']
-                    print("✅ Thumbnail generated successfully")
-                    print(f"Thumbnail URL: {thumbnail_url}")
-                except Exception as dalle_error:
-                    print(f"❌ DALL-E Error: {str(dalle_error)}")
-                    print(traceback.format_exc())
-                    continue
+                logger.info("Generating sample podcast", extra={'topic': topic_data['topic']})
 
                 # Generate audio file path
-                audio_filename = f"sample_python_intro.mp3"
+                audio_filename = "sample_python_intro.mp3"
                 audio_path = os.path.join('podcasts', audio_filename)
-                
-                # Generate audio using ElevenLabs
-                print(f"\n3. Generating audio file: {audio_filename}")
+
+                # Script -> audio runs alongside the DALL-E thumbnail
                 try:
-                    audio = generate(
-                        text=script,
-                        voice=topic_data['voice']
+                    graph = build_seed_graph(topic_data['topic'], topic_data['voice'], topic_data['language'], audio_path)
+                    results = graph.run(
+                        on_stage_done=lambda name, completed, total: logger.info(
+                            "Stage %s done (%d/%d)", name, completed, total
+                        )
                     )
-                    save(audio, audio_path)
-                    print("✅ Audio generated and saved successfully")
-                    print(f"Audio saved to: {audio_path}")
-                except Exception as audio_error:
-                    print(f"❌ ElevenLabs Error: {str(audio_error)}")
-                    print(traceback.format_exc())
+                    script = results['script']
+                    thumbnail_url = results['thumbnail']
+                except StageError:
+                    logger.exception("Sample podcast generation failed", extra={'topic': topic_data['topic']})
                     continue
 
                 # Create podcast document
-                print("\n4. Creating podcast document in MongoDB...")
                 try:
                     podcast = DatabaseOperations.create_podcast(
                         user_id=test_user.id,
@@ -136,172 +195,197 @@ def seed_sample_podcasts():
                         audio_path=audio_path,
                         thumbnail_url=thumbnail_url,
                         voice=topic_data['voice'],
-                        language=topic_data['language']
+                        language=topic_data['language'],
+                        **audio_info(results['tts'])
                     )
                     created_podcasts.append(podcast)
-                    print(f"✅ Podcast '{topic_data['topic']}' created successfully")
-                    print(f"Podcast ID: {podcast.id}")
-                except Exception as db_error:
-                    print(f"❌ Database Error: {str(db_error)}")
-                    print(traceback.format_exc())
+                    logger.info("Sample podcast created", extra={'topic': topic_data['topic'], 'podcast_id': str(podcast.id)})
+                except Exception:
+                    logger.exception("Error saving sample podcast", extra={'topic': topic_data['topic']})
                     continue
 
-            except Exception as topic_error:
-                print(f"❌ Error processing topic '{topic_data['topic']}': {str(topic_error)}")
-                print(traceback.format_exc())
+            except Exception:
+                logger.exception("Error processing sample topic", extra={'topic': topic_data['topic']})
                 continue
 
         if not created_podcasts:
             error_msg = "Failed to create any podcasts. Check server logs for details."
-            print(error_msg)
+            logger.error(error_msg)
             return jsonify({"error": error_msg}), 500
 
-        print(f"Successfully created {len(created_podcasts)} sample podcasts")
+        logger.info("Created %d sample podcasts", len(created_podcasts))
         return jsonify({
             "message": f"Created {len(created_podcasts)} sample podcasts",
-            "podcasts": json.loads(json_util.dumps([p.to_mongo() for p in created_podcasts]))
+            "podcasts": json.loads(json_util.dumps([
+                {key: value for key, value in p.to_mongo().items() if key not in SIGNATURE_FIELDS}
+                for p in created_podcasts
+            ]))
         }), 200
 
     except Exception as e:
-        print(f"Error in seed_sample_podcasts: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in seed_sample_podcasts")
         return jsonify({"error": str(e)}), 500
+    finally:
+        admission.release(lease)
 
-@app.route('/generate-podcast', methods=['POST'])
+@api.route('/generate-podcast', methods=['POST'])
 def generate_podcast():
     try:
-        data = request.json
+        data = request.json or {}
         topic = data.get('topic')
-        voice = data.get('voice', 'Rachel')
+        if not topic:
+            return jsonify({"error": "Topic is required"}), 400
+
         language = data.get('language', 'English')
+        # A near-duplicate of an existing podcast is served from it before any provider call,
+        # unless the client insists with "allow_duplicate": true
+        dedupe = not data.get('allow_duplicate')
+        match = similarity_index.check_topic(topic, language) if dedupe else None
+        if match is not None and match['action'] == 'reuse':
+            result = reuse_podcast(match, 'topic')
+            if result is not None:
+                return json_response({"message": "A similar podcast already exists", "podcast": result})
 
-        # Generate script using OpenAI
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a professional podcast script writer. Create engaging, well-structured content that flows naturally when spoken."},
-                    {"role": "user", "content": f"""Write a podcast script about {topic}. Include:
-                    - A catchy introduction
-                    - Clear main points
-                    - Engaging examples or stories
-                    - A strong conclusion
-                    Keep it under 5 minutes when read aloud."""}
-                ]
-            )
-            script = response.choices[0].message.content
-        except Exception as openai_error:
-            print(f"OpenAI Error: {str(openai_error)}")
-            return jsonify({"error": str(openai_error)}), 500
-
-        # Generate audio using ElevenLabs
-        try:
-            audio = generate(
-                text=script,
-                voice=voice
-            )
-            
-            # Save temporarily
-            temp_path = f"temp_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.mp3"
-            save(audio, temp_path)
-            
-            # Upload to Cloudinary
-            upload_result = cloudinary.uploader.upload(
-                temp_path,
-                resource_type="video",  # Cloudinary uses "video" for audio files
-                folder="podcasts"
-            )
-            
-            # Clean up temp file
-            os.remove(temp_path)
-            
-            audio_url = upload_result['secure_url']
-            
-        except Exception as audio_error:
-            print(f"Audio Generation Error: {str(audio_error)}")
-            return jsonify({"error": str(audio_error)}), 500
-
-        # Create podcast document
+        params = {
+            "topic": topic,
+            "voice": data.get('voice', 'Rachel'),
+            "language": language,
+            "dedupe": dedupe
+        }
+        if match is not None:
+            params["similar_to"] = match
+        params["admission_lease"] = admission.admit(get_request_token(), request.remote_addr)
         try:
-            # Generate a thumbnail using DALL-E
-            thumbnail_response = openai.Image.create(
-                prompt=f"A professional podcast cover art for a podcast about {topic}. Modern, minimal style.",
-                n=1,
-                size="1024x1024"
-            )
-            thumbnail_url = thumbnail_response['data'][0]['url']
-            
-            # Upload thumbnail to Cloudinary
-            thumbnail_upload = cloudinary.uploader.upload(
-                thumbnail_url,
-                folder="podcast_thumbnails"
-            )
-            
-            podcast = DatabaseOperations.create_podcast(
-                topic=topic,
-                script=script,
-                audio_path=audio_url,
-                thumbnail_url=thumbnail_upload['secure_url'],
-                voice=voice,
-                language=language
-            )
-        except Exception as db_error:
-            print(f"Database Error: {str(db_error)}")
-            return jsonify({"error": str(db_error)}), 500
+            job = job_queue.submit('generate_podcast', params)
+        except Exception:
+            admission.release(params["admission_lease"])
+            raise
+        response = {
+            "message": "Podcast generation started",
+            "job_id": job['job_id'],
+            "status_url": f"/jobs/{job['job_id']}"
+        }
+        if match is not None:
+            response["similar_to"] = match
+        return jsonify(response), 202
+    except AdmissionRejected as e:
+        return retry_later(e, e.status, e.retry_after)
+    except QueueFull as e:
+        return retry_later(e)
+    except Exception as e:
+        logger.exception("Error in generate_podcast")
+        return jsonify({"error": str(e)}), 500
 
+@api.route('/generate-batch', methods=['POST'])
+@token_required
+def generate_batch(current_user):
+    """Queue a catalogue build of many topics as one background job (admin only)"""
+    if current_user.get('role') != 'admin':
+        return jsonify({"error": "Admin access required"}), 403
+    try:
+        data = request.json or {}
+        items = parse_batch(data)
+        concurrency = max(1, min(int(data.get('concurrency', BATCH_CONCURRENCY)), BATCH_CONCURRENCY))
+        lease = admission.admit(get_request_token(), request.remote_addr)
+        try:
+            job = job_queue.submit('generate_batch', {
+                "items": items,
+                "user_id": current_user.get('user_id'),
+                "concurrency": concurrency,
+                "admission_lease": lease
+            })
+        except Exception:
+            admission.release(lease)
+            raise
         return jsonify({
-            "message": "Podcast generated successfully",
-            "podcast": {
-                "id": str(podcast.id),
-                "topic": podcast.topic,
-                "audio_url": podcast.audio_path,
-                "thumbnail_url": podcast.thumbnail_url,
-                "script": podcast.script
-            }
-        }), 200
+            "message": f"Batch generation of {len(items)} podcasts started",
+            "job_id": job['job_id'],
+            "status_url": f"/jobs/{job['job_id']}"
+        }), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except AdmissionRejected as e:
+        return retry_later(e, e.status, e.retry_after)
+    except QueueFull as e:
+        return retry_later(e)
     except Exception as e:
-        print(f"Error in generate_podcast: {str(e)}")
+        logger.exception("Error in generate_batch")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/trending-podcasts', methods=['GET'])
+@api.route('/trending-podcasts', methods=['GET'])
 def get_trending_podcasts():
     try:
-        limit = int(request.args.get('limit', 10))
-        podcasts = DatabaseOperations.get_trending_podcasts(limit=limit)
-        return jsonify(json.loads(json_util.dumps([p.to_mongo() for p in podcasts]))), 200
+        limit = max(1, min(int(request.args.get('limit', 10)), TRENDING_TOP_N))
+        projection = listing_projection(request.args.get('fields'))
+        podcasts = DatabaseOperations.get_trending_podcasts(limit=limit, projection=projection)
+        return json_response(podcasts)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error in get_trending_podcasts: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in get_trending_podcasts")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/user-podcasts/<user_id>', methods=['GET'])
+@api.route('/user-podcasts/<user_id>', methods=['GET'])
 def get_user_podcasts(user_id):
     try:
-        limit = int(request.args.get('limit', 10))
-        skip = int(request.args.get('skip', 0))
-        podcasts = DatabaseOperations.get_user_podcasts(user_id, limit=limit, skip=skip)
-        return jsonify(json.loads(json_util.dumps([p.to_mongo() for p in podcasts]))), 200
+        if not ObjectId.is_valid(user_id):
+            return jsonify({"error": "Invalid user id"}), 400
+        limit = max(1, min(int(request.args.get('limit', 10)), MAX_PAGE_SIZE))
+        projection = listing_projection(request.args.get('fields'))
+        podcasts, next_cursor = DatabaseOperations.get_user_podcasts(
+            user_id,
+            limit=limit,
+            cursor=request.args.get('cursor'),
+            projection=projection
+        )
+        return json_response({"podcasts": podcasts, "next_cursor": next_cursor})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error in get_user_podcasts: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in get_user_podcasts")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/podcast/<podcast_id>/<action>', methods=['POST'])
+@api.route('/podcast/<podcast_id>/<action>', methods=['POST'])
 def update_podcast_stats(podcast_id, action):
     try:
         if action not in ['play', 'like', 'share']:
             return jsonify({"error": "Invalid action"}), 400
         
+        if STATS_WRITE_MODE == 'buffered':
+            if not ObjectId.is_valid(podcast_id):
+                return jsonify({"error": "Podcast not found"}), 404
+            # Merged with other increments and written in the next bulk flush
+            stat_counter.increment(podcast_id, f"{action}s")
+            event_log.record(podcast_id, action)
+            return jsonify({"message": f"Queued {action} count update"}), 202
+
         success = DatabaseOperations.increment_podcast_stat(podcast_id, f"{action}s")
         if success:
+            event_log.record(podcast_id, action)
             return jsonify({"message": f"Updated {action} count"}), 200
         return jsonify({"error": "Podcast not found"}), 404
     except Exception as e:
-        print(f"Error in update_podcast_stats: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in update_podcast_stats")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/setup-admin', methods=['GET'])
+@api.route('/generation-cache/stats', methods=['GET'])
+def get_generation_cache_stats():
+    return jsonify(dict(generation_cache.snapshot(), tts_phrases=phrase_cache.snapshot())), 200
+
+def _admin_response(user, message, status):
+    # Generate token with User object
+    return jsonify({
+        "message": message,
+        "token": generate_token(user),
+        "user": {
+            "id": str(user.id),
+            "email": user.email,
+            "username": user.username,
+            "role": user.role
+        }
+    }), status
+
+@api.route('/setup-admin', methods=['GET'])
 def setup_admin():
     try:
         # Check if admin user already exists
@@ -313,48 +397,32 @@ def setup_admin():
             if existing_user.role != 'admin':
                 existing_user.role = 'admin'
                 existing_user.save()
-            
-            # Generate new token with User object
-            token = generate_token(existing_user)
-            
-            return jsonify({
-                "message": "Admin user already exists",
-                "token": token,
-                "user": {
-                    "id": str(existing_user.id),
-                    "email": existing_user.email,
-                    "username": existing_user.username,
-                    "role": existing_user.role
-                }
-            }), 200
+                # Tokens issued with the old role stop working immediately
+                revoke_user_tokens(existing_user.id)
+            return _admin_response(existing_user, "Admin user already exists", 200)
         
         # Create new admin user
-        password_hash = generate_password_hash("EyeCastr2024!")
-        new_user = User(
-            username="EyeThink",
-            email=admin_email,
-            password_hash=password_hash,
-            role='admin'
-        ).save()
-        
-        # Generate token with User object
-        token = generate_token(new_user)
-        
-        return jsonify({
-            "message": "Admin user created successfully",
-            "token": token,
-            "user": {
-                "id": str(new_user.id),
-                "email": new_user.email,
-                "username": new_user.username,
-                "role": new_user.role
-            }
-        }), 201
+        password_hash = password_hasher.hash("EyeCastr2024!")
+        try:
+            new_user = User(
+                username="EyeThink",
+                email=admin_email,
+                password_hash=password_hash,
+                role='admin'
+            ).save()
+        except NotUniqueError:
+            # A concurrent request created the admin first; it is already an admin
+            return _admin_response(User.objects(email=admin_email).first(), "Admin user already exists", 200)
+        return _admin_response(new_user, "Admin user created successfully", 201)
         
+    except HasherBusy as e:
+        return retry_later(e, 503, e.retry_after)
     except Exception as e:
-        print(f"Error in setup_admin: {str(e)}")
+        logger.exception("Error in setup_admin")
         return jsonify({"error": str(e)}), 500
 
+app = create_app()
+
 if __name__ == '__main__':
     os.makedirs('podcasts', exist_ok=True)
     app.run(debug=True, port=3030)
@@ -0,0 +1,204 @@
+"""asyncio serving mode for the generation and listing routes.
+
+Generation is nearly all waiting on upstream APIs, so here each request and
+each generation is a task on one event loop rather than a thread. It runs
+beside the Flask app on the same MongoDB, job collection and caches:
+
+    python async_app.py                      # port ASYNC_PORT (3031)
+    gunicorn async_app:create_app --worker-class aiohttp.GunicornWebWorker
+"""
+import asyncio
+import os
+import time
+from aiohttp import web
+from bson import ObjectId
+from dotenv import load_dotenv
+from database.aio import AsyncDatabaseOperations, close_database
+from database.serializers import listing_projection, dumps
+from jobs.aio import create_job_runner
+from jobs.queue import QueueFull
+from admission.control import admission, AdmissionRejected, ADMISSION_BUSY_RETRY_AFTER
+from generation.aio_pipeline import generate_podcast_job, reuse_podcast
+from search.similar import similarity_index
+from trending.engine import TRENDING_TOP_N
+from providers.http import close_aio_session
+from observability.logs import setup_logging
+from observability.metrics import registry
+from observability.routes import REQUEST_SECONDS, REQUESTS_IN_FLIGHT
+
+load_dotenv()
+
+ASYNC_PORT = int(os.getenv('ASYNC_PORT', 3031))
+CORS_ORIGIN = "http://localhost:3010"
+MAX_PAGE_SIZE = 100
+
+routes = web.RouteTableDef()
+
+def json_response(value, status=200):
+    return web.Response(body=dumps(value), status=status, content_type='application/json')
+
+def error(message, status):
+    return json_response({"error": message}, status)
+
+def retry_later(message, status=503, retry_after=ADMISSION_BUSY_RETRY_AFTER):
+    response = error(message, status)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def bearer_token(request):
+    parts = request.headers.get('Authorization', '').split(" ")
+    return parts[1] if len(parts) > 1 else None
+
+@routes.post('/generate-podcast')
+async def generate_podcast(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    topic = (data or {}).get('topic')
+    if not topic:
+        return error("Topic is required", 400)
+    language = data.get('language', 'English')
+    dedupe = not data.get('allow_duplicate')
+    match = await asyncio.to_thread(similarity_index.check_topic, topic, language) if dedupe else None
+    if match is not None and match['action'] == 'reuse':
+        result = await reuse_podcast(match, 'topic')
+        if result is not None:
+            return json_response({"message": "A similar podcast already exists", "podcast": result})
+
+    params = {"topic": topic, "voice": data.get('voice', 'Rachel'), "language": language, "dedupe": dedupe}
+    if match is not None:
+        params["similar_to"] = match
+    try:
+        params["admission_lease"] = await asyncio.to_thread(admission.admit, bearer_token(request), request.remote)
+    except AdmissionRejected as e:
+        return retry_later(str(e), e.status, e.retry_after)
+    try:
+        job = await request.app['jobs'].submit('generate_podcast', params)
+    except QueueFull as e:
+        await asyncio.to_thread(admission.release, params["admission_lease"])
+        return retry_later(str(e))
+    except Exception:
+        await asyncio.to_thread(admission.release, params["admission_lease"])
+        raise
+    response = {
+        "message": "Podcast generation started",
+        "job_id": job['job_id'],
+        "status_url": f"/jobs/{job['job_id']}"
+    }
+    if match is not None:
+        response["similar_to"] = match
+    return json_response(response, 202)
+
+@routes.get('/jobs/{job_id}')
+async def get_job(request):
+    job = await request.app['jobs'].get(request.match_info['job_id'])
+    if not job:
+        return error("Job not found", 404)
+    return json_response({
+        "job_id": job['job_id'],
+        "kind": job['kind'],
+        "status": job['status'],
+        "stage": job.get('stage'),
+        "progress": job.get('progress', 0),
+        "result": job.get('result') or None,
+        "error": job.get('error'),
+        "created_at": job['created_at'].isoformat(),
+        "updated_at": job['updated_at'].isoformat()
+    })
+
+@routes.get('/trending-podcasts')
+async def get_trending_podcasts(request):
+    try:
+        limit = max(1, min(int(request.query.get('limit', 10)), TRENDING_TOP_N))
+        projection = listing_projection(request.query.get('fields'))
+    except ValueError as e:
+        return error(str(e), 400)
+    return json_response(await AsyncDatabaseOperations.get_trending_podcasts(limit=limit, projection=projection))
+
+@routes.get('/user-podcasts/{user_id}')
+async def get_user_podcasts(request):
+    user_id = request.match_info['user_id']
+    if not ObjectId.is_valid(user_id):
+        return error("Invalid user id", 400)
+    try:
+        limit = max(1, min(int(request.query.get('limit', 10)), MAX_PAGE_SIZE))
+        podcasts, next_cursor = await AsyncDatabaseOperations.get_user_podcasts(
+            user_id,
+            limit=limit,
+            cursor=request.query.get('cursor'),
+            projection=listing_projection(request.query.get('fields'))
+        )
+    except ValueError as e:
+        return error(str(e), 400)
+    return json_response({"podcasts": podcasts, "next_cursor": next_cursor})
+
+@routes.get('/health/live')
+async def liveness(request):
+    return json_response({"status": "ok", "pid": os.getpid()})
+
+@routes.get('/health/ready')
+async def readiness(request):
+    started = time.perf_counter()
+    try:
+        await AsyncDatabaseOperations.ping()
+    except Exception as e:
+        return json_response({"status": "unavailable", "checks": {"mongodb": {"ok": False, "error": str(e)}}}, 503)
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    return json_response({"status": "ready", "checks": {"mongodb": {"ok": True, "latency_ms": latency_ms}}})
+
+@routes.get('/metrics')
+async def metrics(request):
+    return web.Response(body=registry.render().encode('utf-8'),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+@web.middleware
+async def instrument(request, handler):
+    """Same request metrics as the Flask app, plus its CORS policy"""
+    started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+    status = 500
+    try:
+        if request.method == 'OPTIONS':
+            response = web.Response(status=204, headers={
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+            })
+        else:
+            response = await handler(request)
+        response.headers['Access-Control-Allow-Origin'] = CORS_ORIGIN
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method, status=status)
+
+async def _startup(app):
+    # Begin loading the near-duplicate index; checks are skipped, not parked, until it is ready
+    similarity_index.start()
+
+async def _shutdown(app):
+    await app['jobs'].shutdown()
+    await close_aio_session()
+    close_database()
+
+def create_app():
+    """Build the aiohttp app; clients and sessions are created on first use in the event loop"""
+    setup_logging()
+    app = web.Application(middlewares=[instrument])
+    app['jobs'] = create_job_runner()
+    app['jobs'].register('generate_podcast', admission.releasing(generate_podcast_job))
+    registry.callback_gauge('async_generations_in_flight', "Generations running on the event loop",
+                            app['jobs'].in_flight)
+    app.add_routes(routes)
+    app.on_startup.append(_startup)
+    app.on_cleanup.append(_shutdown)
+    return app
+
+if __name__ == '__main__':
+    web.run_app(create_app(), port=ASYNC_PORT)
@@ -1,15 +1,183 @@
 import jwt
-from datetime import datetime, timedelta
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 from flask import request, jsonify
 import os
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key')  # In production, always use environment variable
 JWT_ALGORITHM = "HS256"
 TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.getenv('TOKEN_REVOCATION_SYNC_SECONDS', 5))
+# Revocations are synced from the server-stamped created_at of the newest entry seen, less
+# this much, so an entry whose write committed after a sync read is still picked up
+TOKEN_REVOCATION_SYNC_OVERLAP = timedelta(seconds=float(os.getenv('TOKEN_REVOCATION_SYNC_OVERLAP', 5)))
+
+class TokenError(Exception):
+    """Base class for token verification failures"""
+
+class TokenExpiredError(TokenError):
+    def __init__(self):
+        super().__init__("Token has expired")
+
+class InvalidTokenError(TokenError):
+    def __init__(self):
+        super().__init__("Invalid token")
+
+class TokenRevokedError(TokenError):
+    def __init__(self):
+        super().__init__("Token has been revoked")
+
+def token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token payloads, each expiring at the token's own exp"""
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # digest -> payload
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.verify_seconds = 0.0
+
+    def get(self, digest):
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is None:
+                self.misses += 1
+                return None
+            if payload['exp'] <= time.time():
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return payload
+
+    def set(self, digest, payload):
+        with self._lock:
+            self._entries[digest] = payload
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def record_timing(self, hit, seconds):
+        with self._lock:
+            if hit:
+                self.hit_seconds += seconds
+            else:
+                self.verify_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "avg_hit_ms": round(self.hit_seconds * 1000 / self.hits, 4) if self.hits else 0.0,
+                "avg_verify_ms": round(self.verify_seconds * 1000 / self.misses, 4) if self.misses else 0.0
+            }
+
+class RevocationList:
+    """Revoked tokens and per-user cutoffs, shared between workers through MongoDB.
+
+    A revoked token is rejected until it would have expired anyway. A user
+    cutoff rejects every token issued to that user up to it, which is how
+    role changes take effect; cutoffs and token iat are sub-second, so a token
+    issued in the same second just before the cutoff is caught and one issued
+    just after it is not. Entries from other workers are picked up at most
+    TOKEN_REVOCATION_SYNC_SECONDS later.
+    """
+
+    def __init__(self, sync_seconds=TOKEN_REVOCATION_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._tokens = {}  # digest -> exp timestamp
+        self._user_cutoffs = {}  # user id -> issued-at cutoff
+        self._lock = threading.Lock()
+        self._synced_at = 0.0
+        self._synced_until = None
+
+    def revoke_token(self, digest, exp):
+        with self._lock:
+            self._tokens[digest] = exp
+        self._persist('token', digest, datetime.utcfromtimestamp(exp))
+
+    def revoke_user(self, user_id):
+        cutoff = time.time()
+        with self._lock:
+            self._user_cutoffs[str(user_id)] = cutoff
+        self._persist('user', str(user_id), datetime.utcnow() + timedelta(minutes=TOKEN_EXPIRE_MINUTES), cutoff)
+
+    def is_revoked(self, digest, payload):
+        self._sync()
+        with self._lock:
+            if digest in self._tokens:
+                return True
+            cutoff = self._user_cutoffs.get(str(payload.get('user_id')))
+        if cutoff is None:
+            return False
+        issued_at = payload.get('iat', payload['exp'] - TOKEN_EXPIRE_MINUTES * 60)
+        # Whole-second iat from older tokens rounds down, so the revoking second is covered too
+        return issued_at <= cutoff
+
+    def _persist(self, kind, key, expires_at, cutoff=None):
+        from database.schemas import RevokedToken
+        # created_at comes from the database clock, so syncing never depends on worker clocks agreeing
+        RevokedToken._get_collection().update_one(
+            {'kind': kind, 'key': key},
+            {'$set': {'expires_at': expires_at, 'cutoff': cutoff}, '$currentDate': {'created_at': True}},
+            upsert=True
+        )
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_seconds:
+            return
+        self._synced_at = now
+        from database.schemas import RevokedToken
+        query = RevokedToken.objects(expires_at__gt=datetime.utcnow())
+        if self._synced_until is not None:
+            query = query.filter(created_at__gte=self._synced_until)
+        try:
+            entries = list(query.as_pymongo())
+        except Exception:
+            logger.exception("Error syncing token revocations")
+            return
+        with self._lock:
+            wall_now = time.time()
+            self._tokens = {d: exp for d, exp in self._tokens.items() if exp > wall_now}
+            for entry in entries:
+                if entry['kind'] == 'token':
+                    self._tokens[entry['key']] = entry['expires_at'].replace(tzinfo=timezone.utc).timestamp()
+                else:
+                    self._user_cutoffs[entry['key']] = max(entry.get('cutoff') or 0, self._user_cutoffs.get(entry['key'], 0))
+        if entries:
+            watermark = max(entry['created_at'] for entry in entries) - TOKEN_REVOCATION_SYNC_OVERLAP
+            if self._synced_until is None or watermark > self._synced_until:
+                self._synced_until = watermark
+
+token_cache = VerifiedTokenCache()
+revocations = RevocationList()
 
 def generate_token(user_data):
     """Generate JWT token for user"""
@@ -21,24 +189,59 @@ def generate_token(user_data):
         "role": user_data.get("role") if isinstance(user_data, dict) else user_data.role if hasattr(user_data, "role") else "user"
     }
 
+    now = time.time()
     payload = {
         "user_id": user_dict["_id"],
         "email": user_dict["email"],
         "username": user_dict["username"],
         "role": user_dict["role"],
-        "exp": datetime.utcnow() + timedelta(days=1)
+        # Sub-second, so per-user revocation cutoffs can tell apart tokens issued in the same second
+        "iat": now,
+        "exp": datetime.utcfromtimestamp(now) + timedelta(days=1)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
 
 def verify_token(token: str) -> dict:
-    """Verify a JWT token and return the payload"""
+    """Verify a JWT token and return the payload, using the verified-token cache"""
+    started = time.perf_counter()
+    digest = token_digest(token)
+    payload = token_cache.get(digest)
+    hit = payload is not None
+    if not hit:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            raise TokenExpiredError()
+        except jwt.InvalidTokenError:
+            raise InvalidTokenError()
+        token_cache.set(digest, payload)
+    if revocations.is_revoked(digest, payload):
+        token_cache.discard(digest)
+        raise TokenRevokedError()
+    token_cache.record_timing(hit, time.perf_counter() - started)
+    return dict(payload)
+
+def revoke_token(token: str):
+    """Revoke a single token, e.g. on logout"""
+    digest = token_digest(token)
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise Exception("Token has expired")
+        exp = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])['exp']
     except jwt.InvalidTokenError:
-        raise Exception("Invalid token")
+        return
+    token_cache.discard(digest)
+    revocations.revoke_token(digest, exp)
+
+def revoke_user_tokens(user_id):
+    """Revoke every token issued to a user so far, e.g. after a role change"""
+    revocations.revoke_user(user_id)
+
+def get_request_token():
+    """Bearer token from the Authorization header, or None"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return None
+    parts = auth_header.split(" ")
+    return parts[1] if len(parts) > 1 else None
 
 def token_required(f):
     """Decorator to protect routes with JWT authentication"""
@@ -58,8 +261,8 @@ def token_required(f):
 
         try:
             current_user = verify_token(token)
-            return f(current_user, *args, **kwargs)
-        except Exception as e:
+        except TokenError as e:
             return jsonify({"error": str(e)}), 401
+        return f(current_user, *args, **kwargs)
 
     return decorated
@@ -0,0 +1,133 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+# Full method spec, so stored hashes can be compared against it for rehashing
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+# The pool starts lazily in a process that already runs background threads, and a
+# forked child could inherit one of their locks held; forkserver children start clean
+PASSWORD_HASH_START_METHOD = os.getenv('PASSWORD_HASH_START_METHOD', 'forkserver')
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full and the request should be shed"""
+
+    retry_after = 1
+
+class PasswordHasher:
+    """Runs password hashing in a dedicated process pool with a bounded queue.
+
+    At most workers + queue_size hashes are in flight; beyond that callers get
+    HasherBusy straight away instead of piling up behind PBKDF2. The pool is
+    created on first use in each process, so it is never shared across a fork,
+    and replaced if one of its worker processes dies.
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=PASSWORD_HASH_WORKERS,
+                 queue_size=PASSWORD_HASH_QUEUE, timeout=PASSWORD_HASH_TIMEOUT):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(PASSWORD_HASH_START_METHOD)
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _replace(self, broken):
+        """Swap out a pool whose worker died, unless another thread already has"""
+        with self._lock:
+            if self._executor is broken:
+                logger.warning("Password hashing pool broken, starting a new one")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pid = None
+
+    def warm_up(self):
+        """Start the worker processes in the background, so the first hash does not wait for them"""
+        # Starting the forkserver takes ~100ms, which worker startup should not block on
+        threading.Thread(target=self._start_workers, name='password-pool-warm-up', daemon=True).start()
+
+    def _start_workers(self):
+        try:
+            self._pool().submit(len, '').result()
+        except Exception:
+            logger.exception("Error starting password hashing workers")
+
+    def shutdown(self):
+        """Stop this process's worker processes; os._exit() would leave them orphaned"""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._pid = None
+
+    def _submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("Too many password operations in progress, try again shortly")
+        try:
+            executor = self._pool()
+            try:
+                future = executor.submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                self._replace(executor)
+                future = self._pool().submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _call(self, fn, *args, **kwargs):
+        executor = self._pool()
+        try:
+            return self._submit(fn, *args, **kwargs).result(timeout=self.timeout)
+        except BrokenProcessPool:
+            # A worker died mid-call (e.g. OOM-killed); hashing is idempotent, so retry once on a new pool
+            self._replace(executor)
+            return self._submit(fn, *args, **kwargs).result(timeout=self.timeout)
+
+    def hash(self, password):
+        return self._call(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        return self._call(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when a hash was made with different parameters than the current method"""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def rehash_later(self, password, on_done):
+        """Hash password in the background and pass the new hash to on_done.
+
+        Rehashing is best effort, so a full queue or a failure is only logged.
+        """
+        try:
+            future = self._submit(generate_password_hash, password, method=self.method)
+        except HasherBusy:
+            return
+
+        def done(f):
+            try:
+                on_done(f.result())
+            except Exception:
+                logger.exception("Error rehashing password")
+        future.add_done_callback(done)
+
+password_hasher = PasswordHasher()
@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from mongoengine.errors import NotUniqueError
 from database.mongodb import DatabaseOperations
 from database.schemas import User
-from .jwt_handler import generate_token, token_required
+from .passwords import password_hasher, HasherBusy
+from .jwt_handler import generate_token, token_required, get_request_token, revoke_token, token_cache
 import re
 
 auth = Blueprint('auth', __name__)
@@ -25,6 +26,12 @@ def is_strong_password(password: str) -> bool:
         return False
     return True
 
+def busy_response(error):
+    """503 with Retry-After when password hashing is shedding load"""
+    response = jsonify({"error": str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
 @auth.route('/signup', methods=['POST'])
 def signup():
     data = request.json
@@ -43,13 +50,12 @@ def signup():
         return jsonify({"error": "Password must be at least 8 characters and contain uppercase, lowercase, and numbers"}), 400
 
     # Check if user already exists
-    existing_user = User.objects(email=email).first()
-    if existing_user:
+    if User.objects(email=email).only('id').first():
         return jsonify({"error": "Email already registered"}), 409
 
     try:
         # Create new user
-        password_hash = generate_password_hash(password)
+        password_hash = password_hasher.hash(password)
         user = DatabaseOperations.create_user(
             username=username,
             email=email,
@@ -68,6 +74,11 @@ def signup():
                 "username": user.username
             }
         }), 201
+    except HasherBusy as e:
+        return busy_response(e)
+    except NotUniqueError:
+        # Lost a race with another signup for the same email
+        return jsonify({"error": "Email already registered"}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -82,9 +93,16 @@ def login():
 
     try:
         user = User.objects(email=email).first()
-        if not user or not check_password_hash(user.password_hash, password):
+        if not user or not password_hasher.verify(user.password_hash, password):
             return jsonify({"error": "Invalid email or password"}), 401
 
+        # Upgrade hashes made with older parameters without delaying the response
+        if password_hasher.needs_rehash(user.password_hash):
+            password_hasher.rehash_later(
+                password,
+                lambda new_hash: DatabaseOperations.update_password_hash(user.id, new_hash)
+            )
+
         token = generate_token(user.to_mongo())
         
         return jsonify({
@@ -96,6 +114,8 @@ def login():
                 "username": user.username
             }
         }), 200
+    except HasherBusy as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -107,3 +127,14 @@ def verify_token(current_user):
         "valid": True,
         "user": current_user
     }), 200
+
+@auth.route('/logout', methods=['POST'])
+@token_required
+def logout(current_user):
+    """Revoke the token used for this request"""
+    revoke_token(get_request_token())
+    return jsonify({"message": "Logged out"}), 200
+
+@auth.route('/token-cache-stats', methods=['GET'])
+def token_cache_stats():
+    return jsonify(token_cache.stats()), 200
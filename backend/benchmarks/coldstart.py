@@ -0,0 +1,76 @@
+"""Cold-start benchmark: how long a fresh interpreter takes to serve traffic.
+
+Each run starts a new Python process, imports the app (which calls
+create_app()), then times the first request, which runs the per-process
+worker startup, and a second, warm request:
+
+    python -m benchmarks.coldstart --runs 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from .load import percentile, write_json
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from benchmarks.run import configure_environment
+configure_environment(sys.argv[1])
+env_ready = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+client = app_module.app.test_client()
+first = client.get('/health/live').status_code
+first_done = time.perf_counter()
+client.get('/health/live')
+warm_done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - env_ready) * 1000,
+    'first_request_ms': (first_done - imported) * 1000,
+    'warm_request_ms': (warm_done - first_done) * 1000,
+    'status': first,
+    'sdks_loaded': sorted(m for m in ('openai', 'cloudinary', 'requests') if m in sys.modules)
+}))
+sys.stdout.flush()
+from auth.passwords import password_hasher
+password_hasher.shutdown()
+import os
+os._exit(0)
+"""
+
+def measure(workdir):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, workdir],
+        cwd=backend_dir, capture_output=True, text=True, check=True, timeout=120
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Time app import and first request in fresh processes")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help="write the raw runs and summary as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='aye-eye-coldstart-') as workdir:
+        runs = [measure(workdir) for _ in range(args.runs)]
+
+    summary = {}
+    for field in ('import_ms', 'first_request_ms', 'warm_request_ms'):
+        values = sorted(run[field] for run in runs)
+        summary[field] = {
+            'p50': round(percentile(values, 50), 2),
+            'p95': round(percentile(values, 95), 2),
+            'max': round(values[-1], 2)
+        }
+        print(f"{field:<18} p50 {summary[field]['p50']:>8.2f}ms  p95 {summary[field]['p95']:>8.2f}ms  "
+              f"max {summary[field]['max']:>8.2f}ms")
+    print(f"SDKs loaded at startup: {', '.join(runs[-1]['sdks_loaded']) or 'none'}")
+    if args.output:
+        write_json(args.output, {'runs': runs, 'summary': summary})
+
+if __name__ == '__main__':
+    main()
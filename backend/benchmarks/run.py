@@ -0,0 +1,238 @@
+"""End-to-end load benchmark for the Flask API.
+
+Runs every route against an in-memory MongoDB (mongomock) and the fake
+providers, so no network or credentials are needed:
+
+    python -m benchmarks.run --concurrency 16 --output results.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.25
+
+Exits with status 1 when an endpoint regresses past the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from .load import run_load, compare, write_json
+
+# (default request count, expected statuses) per endpoint. Password hashing
+# is deliberately slow, so signup and login get fewer requests.
+ENDPOINTS = {
+    'generate': (100, (200,)),
+    'trending': (2000, (200,)),
+    'user_podcasts': (2000, (200,)),
+    'stats': (2000, (200, 202)),
+    'setup_admin': (500, (200, 201)),
+    'signup': (100, (201,)),
+    'login': (100, (200,)),
+    'verify_token': (2000, (200,))
+}
+SEED_PODCASTS = 500
+BENCH_PASSWORD = 'Benchmark123'
+
+def configure_environment(workdir):
+    """Point the app at mongomock, the fake providers and scratch directories"""
+    defaults = {
+        'MONGODB_URI': 'mongodb://localhost/benchmark',
+        'PROVIDER_BACKEND': 'fake',
+        'JOB_BACKEND': 'local',
+        'JOB_MAX_PENDING': '100000',
+        'GENERATION_CACHE_DIR': os.path.join(workdir, 'cache'),
+        'TTS_PHRASE_CACHE_DIR': os.path.join(workdir, 'tts_phrases'),
+        'SEARCH_INDEX_PATH': os.path.join(workdir, 'search.index'),
+        'HLS_DIR': os.path.join(workdir, 'hls'),
+        'FAKE_LLM_LATENCY_MS': '50',
+        'FAKE_IMAGE_LATENCY_MS': '80',
+        'FAKE_TTS_LATENCY_MS': '20',
+        'FAKE_BLOB_LATENCY_MS': '20',
+        'FAKE_SCRIPT_CHARS': '1500',
+        'TOKEN_REVOCATION_SYNC_SECONDS': '3600'
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+    # Fake providers must not be throttled by the real providers' quotas
+    for provider in ('OPENAI_CHAT', 'DALLE', 'ELEVENLABS', 'CLOUDINARY'):
+        os.environ.setdefault(f"RATE_LIMIT_{provider}", '1000000')
+    # ... nor the load generator by the per-caller and global generation quotas
+    for caller in ('USER', 'ANON', 'GLOBAL'):
+        os.environ.setdefault(f"ADMISSION_{caller}_RATE_PER_MINUTE", '1000000')
+        os.environ.setdefault(f"ADMISSION_{caller}_BURST", '1000000')
+    os.environ.setdefault('ADMISSION_MAX_GENERATIONS', '100000')
+
+    import mongomock
+    import mongoengine
+
+    register_connection = mongoengine.register_connection
+
+    def register_in_memory(*args, **kwargs):
+        kwargs['mongo_client_class'] = mongomock.MongoClient
+        return register_connection(*args, **kwargs)
+    mongoengine.register_connection = register_in_memory
+
+def seed():
+    """One owner with SEED_PODCASTS podcasts, plus a user to log in as"""
+    from bson import ObjectId
+    from database.mongodb import DatabaseOperations
+    from database.schemas import Podcast
+    from auth.passwords import password_hasher
+    from auth.jwt_handler import generate_token
+
+    password_hash = password_hasher.hash(BENCH_PASSWORD)
+    owner = DatabaseOperations.create_user('bench-owner', 'owner@benchmark.test', password_hash)
+    podcasts = [
+        Podcast(
+            id=ObjectId(),
+            owner=owner.id,
+            topic=f"Seeded topic {i}",
+            script="Seeded script. " * 50,
+            audio_path=f"https://fake-provider.test/podcasts/{i}.mp3",
+            thumbnail_url=f"https://fake-provider.test/podcast_thumbnails/{i}.png",
+            voice='Rachel',
+            language='English',
+            likes=i % 17,
+            plays=i % 101
+        )
+        for i in range(SEED_PODCASTS)
+    ]
+    DatabaseOperations.create_podcasts(podcasts)
+    return {
+        'owner_id': str(owner.id),
+        'podcast_ids': [str(p.id) for p in podcasts],
+        'token': generate_token(owner)
+    }
+
+def build_requests(app, context, run_id):
+    """Map each endpoint name to a request(n) callable returning the status code"""
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client
+
+    auth_header = {'Authorization': f"Bearer {context['token']}"}
+    podcast_ids = context['podcast_ids']
+    owner_id = context['owner_id']
+
+    # Walk the owner's listing once so requests can hit pages past the first
+    cursors = [None]
+    while len(cursors) < 10:
+        page = client().get(f"/user-podcasts/{owner_id}", query_string={'cursor': cursors[-1]} if cursors[-1] else {})
+        next_cursor = page.get_json()['next_cursor']
+        if not next_cursor:
+            break
+        cursors.append(next_cursor)
+
+    def generate(n):
+        response = client().post('/generate-podcast', json={'topic': f"Benchmark topic {run_id} {n}"})
+        if response.status_code != 202:
+            return response.status_code
+        status_url = response.get_json()['status_url']
+        while True:
+            job = client().get(status_url).get_json()
+            if job['status'] == 'succeeded':
+                return 200
+            if job['status'] == 'failed':
+                return 'job failed'
+            time.sleep(0.01)
+
+    def user_podcasts(n):
+        cursor = cursors[n % len(cursors)]
+        return client().get(f"/user-podcasts/{owner_id}", query_string={'cursor': cursor} if cursor else {}).status_code
+
+    def stats(n):
+        action = ('play', 'like', 'share')[n % 3]
+        return client().post(f"/podcast/{podcast_ids[n % len(podcast_ids)]}/{action}").status_code
+
+    def signup(n):
+        return client().post('/auth/signup', json={
+            'username': f"bench{n}",
+            'email': f"bench-{run_id}-{n}@benchmark.test",
+            'password': BENCH_PASSWORD
+        }).status_code
+
+    def login(n):
+        return client().post('/auth/login', json={
+            'email': 'owner@benchmark.test',
+            'password': BENCH_PASSWORD
+        }).status_code
+
+    return {
+        'generate': generate,
+        'trending': lambda n: client().get('/trending-podcasts').status_code,
+        'user_podcasts': user_podcasts,
+        'stats': stats,
+        'setup_admin': lambda n: client().get('/setup-admin').status_code,
+        'signup': signup,
+        'login': login,
+        'verify_token': lambda n: client().get('/auth/verify-token', headers=auth_header).status_code
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test every API route against mongomock and fake providers")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every endpoint's request count")
+    parser.add_argument('--endpoints', help="comma-separated subset of: " + ', '.join(ENDPOINTS))
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help="results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed p95/throughput regression (0.2 = 20%%)")
+    parser.add_argument('--save-baseline', action='store_true', help="also write the results to --baseline")
+    args = parser.parse_args()
+
+    names = args.endpoints.split(',') if args.endpoints else list(ENDPOINTS)
+    unknown = set(names) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix='aye-eye-bench-')
+    configure_environment(workdir)
+    import app as app_module
+    from auth.passwords import password_hasher
+
+    context = seed()
+    request_fns = build_requests(app_module.app, context, run_id=int(time.time()))
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + 'Z',
+            "concurrency": args.concurrency,
+            "scale": args.scale,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count()
+        },
+        "endpoints": {}
+    }
+    for name in names:
+        count, expected = ENDPOINTS[name]
+        total = max(1, int(count * args.scale))
+        summary = run_load(request_fns[name], total, args.concurrency, expected)
+        results['endpoints'][name] = summary
+        print(f"{name:<14} {summary['throughput_rps']:>9.1f} req/s  p50 {summary['p50_ms']:>8.2f}ms  "
+              f"p95 {summary['p95_ms']:>8.2f}ms  p99 {summary['p99_ms']:>8.2f}ms  errors {summary['errors']}")
+
+    write_json(args.output, results)
+    print(f"Results written to {args.output}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    status = 0
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        status = 1 if regressions else 0
+    if args.baseline and args.save_baseline:
+        write_json(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+
+    sys.stdout.flush()
+    password_hasher.shutdown()
+    # Background job and flush threads would otherwise keep the process alive
+    os._exit(status)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Search index benchmark on a synthetic catalogue, without MongoDB.
+
+Builds an index of generated episodes whose words follow a Zipf
+distribution, writes and reloads its snapshot, then times BM25 queries and
+topic autocomplete against the reloaded copy:
+
+    python -m benchmarks.search --episodes 100000
+"""
+import argparse
+import itertools
+import os
+import random
+import string
+import tempfile
+import time
+from search.index import SearchIndex
+from .load import percentile, write_json
+
+def vocabulary(rng, size):
+    return [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3)
+    }
+
+def timed(calls):
+    latencies = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+    return latency_summary(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time search index build, snapshot and queries")
+    parser.add_argument('--episodes', type=int, default=100000)
+    parser.add_argument('--script-words', type=int, default=400)
+    parser.add_argument('--vocabulary', type=int, default=40000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the results as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(rng, args.vocabulary)
+    weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(words) + 1)))
+    topic_words = words[50:5000]
+
+    with tempfile.TemporaryDirectory(prefix='aye-eye-search-') as workdir:
+        path = os.path.join(workdir, 'search.index')
+        index = SearchIndex(path=path, background=False)
+        started = time.perf_counter()
+        for n in range(args.episodes):
+            index.add_podcast(f"{n:024x}", ' '.join(rng.choices(topic_words, k=4)),
+                              ' '.join(rng.choices(words, cum_weights=weights, k=args.script_words)))
+        build_seconds = time.perf_counter() - started
+        stats = index.stats()
+
+        started = time.perf_counter()
+        snapshot_bytes = index.save()
+        save_seconds = time.perf_counter() - started
+        del index
+        index = SearchIndex(path=path, background=False)
+        started = time.perf_counter()
+        index.load()
+        load_seconds = time.perf_counter() - started
+
+    # Common but informative words: the head of the distribution is what makes queries slow
+    queries = [' '.join(rng.choices(words[20:3000], k=rng.randint(1, 3))) for _ in range(args.queries)]
+    prefixes = [rng.choice(topic_words)[:rng.randint(1, 5)] for _ in range(args.queries)]
+    # The first query imports numpy
+    index.search(queries[0])
+    results = {
+        'episodes': args.episodes,
+        'index': stats,
+        'build_seconds': round(build_seconds, 2),
+        'snapshot_mb': round(snapshot_bytes / 1024 / 1024, 2),
+        'snapshot_save_seconds': round(save_seconds, 2),
+        'snapshot_load_seconds': round(load_seconds, 2),
+        'search': timed(lambda q=q: index.search(q, limit=10) for q in queries),
+        'search_page_5': timed(lambda q=q: index.search(q, limit=10, offset=40) for q in queries),
+        'suggest': timed(lambda p=p: index.suggest(p, limit=10) for p in prefixes)
+    }
+
+    print(f"{args.episodes} episodes, {stats['terms']} terms, {stats['postings']} postings")
+    print(f"build {build_seconds:.1f}s, snapshot {results['snapshot_mb']}MB "
+          f"(save {save_seconds:.2f}s, load {load_seconds:.2f}s)")
+    for name in ('search', 'search_page_5', 'suggest'):
+        summary = results[name]
+        print(f"{name:<14} p50 {summary['p50_ms']:>7.2f}ms  p95 {summary['p95_ms']:>7.2f}ms  "
+              f"p99 {summary['p99_ms']:>7.2f}ms  max {summary['max_ms']:>7.2f}ms")
+    if args.output:
+        write_json(args.output, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import weakref
+from datetime import datetime
+from bson import ObjectId
+from .schemas import Podcast, Job
+from .mongodb import DatabaseOperations, MONGODB_POOL_SIZE, MONGODB_MIN_POOL_SIZE, MONGODB_TIMEOUT_MS
+from .pagination import encode_cursor, keyset_filter
+from trending.engine import trending_engine
+from search.similar import sign_podcasts
+
+logger = logging.getLogger(__name__)
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> motor client
+
+def get_database():
+    """Motor database for the running event loop, connected on first use.
+
+    Uses the same MONGODB_URI and pool settings as the mongoengine
+    connection, so both serving modes read and write the same collections.
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        mongodb_uri = os.getenv('MONGODB_URI')
+        if not mongodb_uri:
+            raise ValueError("MongoDB URI not found in environment variables")
+        client = _clients[loop] = AsyncIOMotorClient(
+            mongodb_uri,
+            maxPoolSize=MONGODB_POOL_SIZE,
+            minPoolSize=MONGODB_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=MONGODB_TIMEOUT_MS,
+            connectTimeoutMS=MONGODB_TIMEOUT_MS
+        )
+    return client.get_default_database()
+
+def close_database():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        client.close()
+
+def _collection(document_class):
+    return get_database()[document_class._get_collection_name()]
+
+class AsyncDatabaseOperations:
+    """Non-blocking counterparts of the DatabaseOperations used by the async app"""
+
+    @staticmethod
+    async def ping():
+        await get_database().command('ping')
+
+    @staticmethod
+    async def insert_podcast(podcast):
+        """Insert a validated Podcast document built with a client-side id"""
+        # MinHash signing and indexing are CPU work, kept off the event loop
+        await asyncio.to_thread(sign_podcasts, [podcast])
+        await _collection(Podcast).insert_one(podcast.to_mongo().to_dict())
+        await asyncio.to_thread(DatabaseOperations.index_podcast, podcast)
+        return podcast
+
+    @staticmethod
+    async def get_trending_podcasts(limit=10, projection=None):
+        # The first call in a worker can wait up to 30s for the trending engine's initial load
+        podcast_ids = await asyncio.to_thread(trending_engine.top, limit)
+        return await AsyncDatabaseOperations.get_podcasts_by_ids(podcast_ids, projection)
+
+    @staticmethod
+    async def get_podcasts_by_ids(podcast_ids, projection=None):
+        ids = [ObjectId(podcast_id) for podcast_id in podcast_ids]
+        rows = {row['_id']: row async for row in _collection(Podcast).find({'_id': {'$in': ids}}, projection)}
+        return [rows[podcast_id] for podcast_id in ids if podcast_id in rows]
+
+    @staticmethod
+    async def get_user_podcasts(user_id, limit=10, cursor=None, projection=None):
+        """Same keyset pagination as DatabaseOperations.get_user_podcasts"""
+        query = keyset_filter({'owner': ObjectId(user_id)}, cursor)
+        if projection is not None:
+            projection = dict(projection, created_at=1)
+        rows = await (
+            _collection(Podcast)
+            .find(query, projection)
+            .sort([('owner', 1), ('created_at', -1), ('_id', -1)])
+            .limit(limit + 1)
+            .to_list(None)
+        )
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['_id'])
+        return rows, next_cursor
+
+class AsyncMongoJobStore:
+    """MongoJobStore over motor, sharing the jobs collection with the Flask app"""
+
+    async def create(self, job):
+        document = Job(**job)
+        document.validate()
+        await _collection(Job).insert_one(document.to_mongo().to_dict())
+
+    async def update(self, job_id, **fields):
+        await _collection(Job).update_one({'job_id': job_id}, {'$set': dict(fields, updated_at=datetime.utcnow())})
+
+    async def get(self, job_id):
+        return await _collection(Job).find_one({'job_id': job_id}, {'_id': 0})
+
+    async def heartbeat(self, job_ids):
+        await _collection(Job).update_many({'job_id': {'$in': list(job_ids)}},
+                                           {'$set': {'heartbeat_at': datetime.utcnow()}})
+
+class AsyncLocalJobStore:
+    """Coroutine wrapper around an in-process LocalJobStore"""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def create(self, job):
+        self.store.create(job)
+
+    async def update(self, job_id, **fields):
+        self.store.update(job_id, **fields)
+
+    async def get(self, job_id):
+        return self.store.get(job_id)
+
+    async def heartbeat(self, job_ids):
+        self.store.heartbeat(job_ids)
@@ -0,0 +1,103 @@
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+from bson import ObjectId
+from pymongo import UpdateOne
+from .schemas import Podcast
+
+logger = logging.getLogger(__name__)
+
+STATS_WRITE_MODE = os.getenv('STATS_WRITE_MODE', 'buffered')  # buffered or atomic
+STATS_FLUSH_INTERVAL = float(os.getenv('STATS_FLUSH_INTERVAL', 1.0))
+STATS_MAX_BUFFERED = int(os.getenv('STATS_MAX_BUFFERED', 10000))
+
+STAT_FIELDS = ('plays', 'likes', 'shares')
+
+class StatCounter:
+    """Buffers podcast stat increments and writes them as bulk $inc batches.
+
+    Increments for the same (podcast, field) are merged in memory, so a burst
+    of plays on one episode becomes a single update per flush. The flusher
+    thread starts on first use so it is created after any worker fork.
+    """
+
+    def __init__(self, flush_interval=STATS_FLUSH_INTERVAL, max_buffered=STATS_MAX_BUFFERED):
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self._pending = defaultdict(int)  # (podcast_id, field) -> delta
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.listeners = []  # called with {podcast_id: {field: delta}} after each flush
+
+    def increment(self, podcast_id, field, amount=1):
+        if field not in STAT_FIELDS:
+            raise ValueError(f"Unknown stat field: {field}")
+        self._ensure_started()
+        with self._lock:
+            self._pending[(ObjectId(podcast_id), field)] += amount
+            full = len(self._pending) >= self.max_buffered
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write all buffered increments, returning the number of podcasts updated"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(int)
+            if not pending:
+                return 0
+
+            by_podcast = defaultdict(dict)
+            for (podcast_id, field), delta in pending.items():
+                by_podcast[podcast_id][field] = delta
+
+            try:
+                Podcast._get_collection().bulk_write(
+                    [UpdateOne({'_id': podcast_id}, {'$inc': fields}) for podcast_id, fields in by_podcast.items()],
+                    ordered=False
+                )
+            except Exception:
+                # Put the deltas back so the next flush retries them
+                with self._lock:
+                    for key, delta in pending.items():
+                        self._pending[key] += delta
+                raise
+
+            for listener in self.listeners:
+                listener(by_podcast)
+            return len(by_podcast)
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='stat-counter-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing podcast stats")
+
+stat_counter = StatCounter()
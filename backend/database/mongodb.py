@@ -1,60 +1,196 @@
-from mongoengine import connect
+from mongoengine import register_connection, disconnect, DEFAULT_CONNECTION_NAME
+from mongoengine import connection as mongo_connection
 from dotenv import load_dotenv
+import logging
 import os
-import sys
-from datetime import datetime
-from .schemas import Podcast
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .schemas import Podcast, User
+from .counters import stat_counter
+from .pagination import encode_cursor, keyset_filter
+from trending.engine import trending_engine
+from search.index import search_index
+from search.similar import similarity_index, sign_podcasts
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+MONGODB_POOL_SIZE = int(os.getenv('MONGODB_POOL_SIZE', 100))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 0))
+MONGODB_TIMEOUT_MS = int(os.getenv('MONGODB_TIMEOUT_MS', 5000))
+
+_connection_settings = None
+
 def connect_db():
-    try:
-        # Get MongoDB URI from environment variables
-        mongodb_uri = os.getenv('MONGODB_URI')
-        if not mongodb_uri:
-            raise ValueError("MongoDB URI not found in environment variables")
-            
-        # Connect to MongoDB
-        conn = connect(host=mongodb_uri)
-        print(f"Connected to MongoDB {conn.get_database().name}")
-    except Exception as error:
-        print("Failed to connect to MongoDB", error)
-        sys.exit(1)  # 1 is failure, 0 is success
-
-# Connect on import
+    """Register the MongoDB connection without opening it.
+
+    mongoengine creates the client on the first query, so importing this
+    module does no I/O, and a process forked from a parent that never
+    queried gets its own client rather than sharing the parent's sockets.
+    """
+    global _connection_settings
+    mongodb_uri = os.getenv('MONGODB_URI')
+    if not mongodb_uri:
+        logger.critical("MongoDB URI not found in environment variables")
+        return
+    _connection_settings = {
+        'host': mongodb_uri,
+        'maxPoolSize': MONGODB_POOL_SIZE,
+        'minPoolSize': MONGODB_MIN_POOL_SIZE,
+        'serverSelectionTimeoutMS': MONGODB_TIMEOUT_MS,
+        'connectTimeoutMS': MONGODB_TIMEOUT_MS
+    }
+    register_connection(DEFAULT_CONNECTION_NAME, **_connection_settings)
+
+def _reset_after_fork():
+    # A client the parent already opened is forgotten rather than closed: its
+    # sockets and monitor threads still belong to the parent
+    if _connection_settings is None:
+        return
+    mongo_connection._connections.pop(DEFAULT_CONNECTION_NAME, None)
+    disconnect(DEFAULT_CONNECTION_NAME)
+    register_connection(DEFAULT_CONNECTION_NAME, **_connection_settings)
+
 connect_db()
+os.register_at_fork(after_in_child=_reset_after_fork)
 
 class DatabaseOperations:
     @staticmethod
-    def create_podcast(topic, script, audio_path, thumbnail_url, voice, language):
+    def ping():
+        """Round-trip to the server, raising if MongoDB is unreachable"""
+        mongo_connection.get_db().command('ping')
+
+    @staticmethod
+    def create_user(username, email, password_hash, role='user'):
+        """Create a new user, raising NotUniqueError if the email is taken"""
+        user = User(
+            username=username,
+            email=email,
+            password_hash=password_hash,
+            role=role
+        )
+        return user.save()
+
+    @staticmethod
+    def update_password_hash(user_id, password_hash):
+        """Replace a user's stored password hash"""
+        return User.objects(id=user_id).update_one(set__password_hash=password_hash) == 1
+
+    @staticmethod
+    def create_podcast(topic, script, audio_path, thumbnail_url, voice, language, user_id=None,
+                       duration=None, bitrate=None, size_bytes=None):
         """Create a new podcast entry"""
         podcast = Podcast(
+            owner=ObjectId(user_id) if user_id else None,
             topic=topic,
             script=script,
             audio_path=audio_path,
             thumbnail_url=thumbnail_url,
             voice=voice,
-            language=language
+            language=language,
+            duration=duration,
+            bitrate=bitrate,
+            size_bytes=size_bytes
         )
-        return podcast.save()
+        sign_podcasts([podcast])
+        podcast.save()
+        DatabaseOperations.index_podcast(podcast)
+        return podcast
+
+    @staticmethod
+    def index_podcast(podcast):
+        """Add a newly written podcast to the in-process trending, search and near-duplicate indexes"""
+        trending_engine.add_podcast(podcast.id, podcast.created_at)
+        search_index.add_podcast(podcast.id, podcast.topic, podcast.script, podcast.created_at)
+        similarity_index.add_podcast(podcast.id, podcast.language, podcast.topic_minhash, podcast.script_minhash,
+                                     podcast.created_at)
+
+    @staticmethod
+    def create_podcasts(podcasts):
+        """Bulk-insert validated Podcast documents in one unordered insert_many.
+
+        Returns the ids that were written; a duplicate or invalid document
+        does not stop the rest of the batch.
+        """
+        if not podcasts:
+            return []
+        sign_podcasts(podcasts)
+        try:
+            result = Podcast._get_collection().insert_many([p.to_mongo() for p in podcasts], ordered=False)
+            inserted = set(result.inserted_ids)
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            inserted = {p.id for i, p in enumerate(podcasts) if i not in failed}
+            logger.warning("Bulk insert wrote %d of %d podcasts", len(inserted), len(podcasts))
+        for podcast in podcasts:
+            if podcast.id in inserted:
+                DatabaseOperations.index_podcast(podcast)
+        return [podcast.id for podcast in podcasts if podcast.id in inserted]
+
+    @staticmethod
+    def get_trending_podcasts(limit=10, projection=None):
+        """Get raw trending podcast documents from the precomputed time-decayed ranking"""
+        return DatabaseOperations.get_podcasts_by_ids(trending_engine.top(limit), projection)
+
+    @staticmethod
+    def get_podcasts_by_ids(podcast_ids, projection=None):
+        """Get raw podcast documents in the order of podcast_ids, skipping any that no longer exist"""
+        ids = [ObjectId(podcast_id) for podcast_id in podcast_ids]
+        rows = {row['_id']: row for row in Podcast._get_collection().find({'_id': {'$in': ids}}, projection)}
+        return [rows[podcast_id] for podcast_id in ids if podcast_id in rows]
 
     @staticmethod
-    def get_trending_podcasts(limit=10):
-        """Get trending podcasts based on plays and likes"""
-        return Podcast.objects().order_by('-plays', '-likes').limit(limit)
+    def get_user_podcasts(user_id, limit=10, cursor=None, projection=None):
+        """Get one page of a user's raw podcast documents, newest first.
+
+        Returns (podcasts, next_cursor). Pages are keyset queries on the
+        (owner, created_at, _id) index, so every page costs the same.
+        """
+        query = keyset_filter({'owner': ObjectId(user_id)}, cursor)
+        if projection is not None:
+            projection = dict(projection, created_at=1)
+        rows = list(
+            Podcast._get_collection()
+            .find(query, projection)
+            .sort([('owner', 1), ('created_at', -1), ('_id', -1)])
+            .limit(limit + 1)
+        )
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['_id'])
+        return rows, next_cursor
 
     @staticmethod
     def increment_podcast_stat(podcast_id, stat_name):
-        """Increment a podcast statistic (plays, likes, or shares)"""
-        podcast = Podcast.objects(id=podcast_id).first()
-        if podcast:
-            if stat_name == 'plays':
-                podcast.plays += 1
-            elif stat_name == 'likes':
-                podcast.likes += 1
-            elif stat_name == 'shares':
-                podcast.shares += 1
-            podcast.save()
-            return True
-        return False
+        """Atomically increment a podcast statistic (plays, likes, or shares)"""
+        if stat_name not in ('plays', 'likes', 'shares'):
+            raise ValueError(f"Unknown stat: {stat_name}")
+        updated = Podcast.objects(id=podcast_id).update_one(**{f"inc__{stat_name}": 1}) == 1
+        if updated:
+            trending_engine.record(podcast_id, {stat_name: 1})
+        return updated
+
+    @staticmethod
+    def increment_podcast_stats(by_podcast):
+        """Atomically apply {podcast_id: {stat_name: delta}} increments in one bulk $inc write"""
+        for fields in by_podcast.values():
+            for stat_name in fields:
+                if stat_name not in ('plays', 'likes', 'shares'):
+                    raise ValueError(f"Unknown stat: {stat_name}")
+        if not by_podcast:
+            return
+        Podcast._get_collection().bulk_write(
+            [UpdateOne({'_id': ObjectId(podcast_id)}, {'$inc': fields}) for podcast_id, fields in by_podcast.items()],
+            ordered=False
+        )
+        for podcast_id, fields in by_podcast.items():
+            trending_engine.record(podcast_id, fields)
+
+# Keep trending scores current as buffered stat increments are written
+stat_counter.listeners.append(
+    lambda by_podcast: [trending_engine.record(podcast_id, fields) for podcast_id, fields in by_podcast.items()]
+)
@@ -0,0 +1,31 @@
+import base64
+from datetime import datetime, timezone
+from bson import ObjectId
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(created_at, object_id):
+    """Opaque cursor pointing just after (created_at, _id) in a newest-first listing"""
+    millis = int(created_at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    raw = f"{millis}:{object_id}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        millis, object_id = raw.split(':')
+        created_at = datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc).replace(tzinfo=None)
+        return created_at, ObjectId(object_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+def keyset_filter(base_filter, cursor):
+    """Restrict a newest-first (created_at, _id) query to rows after cursor"""
+    if not cursor:
+        return base_filter
+    created_at, object_id = decode_cursor(cursor)
+    return dict(base_filter, **{'$or': [
+        {'created_at': {'$lt': created_at}},
+        {'created_at': created_at, '_id': {'$lt': object_id}}
+    ]})
@@ -1,7 +1,19 @@
-from mongoengine import Document, StringField, IntField, DateTimeField, URLField
+from mongoengine import Document, StringField, IntField, FloatField, DateTimeField, URLField, DictField, EmailField, ReferenceField, BinaryField, BooleanField, ListField, ObjectIdField
 from datetime import datetime
 
+class User(Document):
+    username = StringField(required=True)
+    email = EmailField(required=True, unique=True)  # unique index, so login is one indexed lookup
+    password_hash = StringField(required=True)
+    role = StringField(default='user')
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'users'
+    }
+
 class Podcast(Document):
+    owner = ReferenceField(User)
     topic = StringField(required=True)
     script = StringField(required=True)
     audio_path = URLField(required=True)  # Cloudinary URL
@@ -12,6 +24,14 @@ class Podcast(Document):
     likes = IntField(default=0)
     plays = IntField(default=0)
     shares = IntField(default=0)
+    # Audio metadata read from the MP3 headers by media.indexer
+    duration = FloatField()  # seconds
+    bitrate = IntField()  # bits per second
+    size_bytes = IntField()
+    audio_mtime = FloatField()  # source mtime when probed, so backfills skip unchanged files
+    # MinHash signatures for near-duplicate detection, set by search.similar
+    topic_minhash = BinaryField()
+    script_minhash = BinaryField()
     
     meta = {
         'collection': 'podcasts',
@@ -19,7 +39,112 @@ class Podcast(Document):
             'created_at',
             'topic',
             '-likes',
-            '-plays'
+            '-plays',
+            # Per-owner listings page by (created_at, _id) keyset cursors
+            ('owner', '-created_at', '-id')
         ],
         'ordering': ['-created_at']
     }
+
+class Job(Document):
+    job_id = StringField(required=True, unique=True)
+    kind = StringField(required=True)
+    params = DictField()
+    status = StringField(required=True, default='queued')  # queued, running, succeeded, failed
+    stage = StringField()
+    progress = IntField(default=0)
+    result = DictField()
+    error = StringField()
+    owner = StringField()  # host:pid:token of the process holding the job, see jobs.queue.process_owner
+    heartbeat_at = DateTimeField()  # refreshed by the owner while it holds the job
+    created_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'jobs',
+        'indexes': [
+            'status',
+            '-created_at'
+        ]
+    }
+
+class RevokedToken(Document):
+    kind = StringField(required=True, choices=('token', 'user'))
+    key = StringField(required=True)  # token digest or user id
+    cutoff = FloatField()  # for users: tokens issued up to this timestamp are revoked
+    expires_at = DateTimeField(required=True)
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'revoked_tokens',
+        'indexes': [
+            {'fields': ['kind', 'key'], 'unique': True},
+            'created_at',
+            # MongoDB drops entries once the tokens they cover have expired
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+class AnalyticsSegment(Document):
+    """One flush of the play/like/share event log, as zlib-compressed array columns"""
+    start = DateTimeField(required=True)  # earliest event in the segment
+    count = IntField(required=True)
+    podcasts = ListField(ObjectIdField())  # podcast ids the podcast column indexes into
+    times = BinaryField(required=True)  # array('I') of epoch seconds
+    podcast_index = BinaryField(required=True)  # array('I') of indexes into podcasts
+    actions = BinaryField(required=True)  # array('B') of indexes into analytics.store.ACTIONS
+    rolled = BooleanField(default=False)  # counted into AnalyticsBucket
+    claimed_at = DateTimeField()  # when a worker started rolling it up
+    expires_at = DateTimeField(required=True)
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'analytics_log',
+        'indexes': [
+            ('rolled', 'claimed_at'),
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+class AnalyticsBucket(Document):
+    """Event counts for one podcast, or all podcasts when podcast is None, over one time bucket"""
+    podcast = ObjectIdField()
+    resolution = StringField(required=True, choices=('minute', 'hour', 'day'))
+    start = DateTimeField(required=True)
+    plays = IntField(default=0)
+    likes = IntField(default=0)
+    shares = IntField(default=0)
+    expires_at = DateTimeField()  # finer resolutions are dropped once coarser ones cover them
+
+    meta = {
+        'collection': 'analytics_buckets',
+        'indexes': [
+            {'fields': ['podcast', 'resolution', 'start'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+class AdmissionBucket(Document):
+    """Token bucket shared between workers by admission.control's MongoDB backend"""
+    id = StringField(primary_key=True)  # caller identity, or 'global'
+    tokens = FloatField()
+    updated = FloatField()  # epoch seconds of the last refill
+    granted = BooleanField()  # outcome of the last take
+    expires_at = DateTimeField()  # an idle bucket has refilled completely by then
+
+    meta = {
+        'collection': 'admission_buckets',
+        'indexes': [
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+class AdmissionSlots(Document):
+    """Leases on a capped pool of concurrent generations, shared between workers"""
+    id = StringField(primary_key=True)
+    holders = ListField(DictField())  # {'lease', 'expires'} per generation in flight
+    granted = BooleanField()  # outcome of the last acquire
+
+    meta = {
+        'collection': 'admission_slots'
+    }
@@ -0,0 +1,49 @@
+import json
+from datetime import datetime
+from bson import ObjectId
+from flask import Response
+
+# Fields returned by listing endpoints unless the client asks for more
+LISTING_FIELDS = (
+    'topic',
+    'audio_path',
+    'thumbnail_url',
+    'voice',
+    'language',
+    'created_at',
+    'likes',
+    'plays',
+    'shares',
+    'duration',
+    'bitrate',
+    'size_bytes'
+)
+# Fields a client may add to a listing with ?fields=
+OPTIONAL_FIELDS = ('script',)
+
+def listing_projection(extra_fields=None):
+    """Projection for listing queries, with any requested optional fields"""
+    fields = list(LISTING_FIELDS)
+    for name in (extra_fields or '').split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in OPTIONAL_FIELDS and name not in LISTING_FIELDS:
+            raise ValueError(f"Unknown field: {name}")
+        if name not in fields:
+            fields.append(name)
+    return {name: 1 for name in fields}
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat() + 'Z' if value.tzinfo is None else value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value):
+    """Encode raw documents to JSON bytes in a single pass"""
+    return json.dumps(value, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def json_response(value, status=200):
+    return Response(dumps(value), status=status, mimetype='application/json')
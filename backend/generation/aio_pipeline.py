@@ -0,0 +1,221 @@
+import asyncio
+from bson import ObjectId
+from database.aio import AsyncDatabaseOperations
+from database.schemas import Podcast
+from database.serializers import listing_projection
+from providers.registry import get_provider
+from media.mp3 import audio_info
+from .graph import Stage, StageGraph
+from .tts import (
+    split_script, split_phrases, phrase_key, phrase_audio, record_phrase_hits, phrase_cache, _strip_tags,
+    TTS_PHRASE_CACHE, TTS_CONCURRENCY, TTS_CHUNK_TIMEOUT, TTS_MODEL
+)
+from .cache import generation_cache
+from .ratelimit import acall_provider
+from .pipeline import (
+    SCRIPT_SYSTEM_PROMPT, SCRIPT_USER_PROMPT, THUMBNAIL_PROMPT, SCRIPT_MODEL, IMAGE_MODEL, DALLE_URL_TTL,
+    stage_timeout, script_key, thumbnail_key, audio_key, audio_url_key, thumbnail_url_key, _segment_audio,
+    duplicate_cause, reused_result
+)
+from search.similar import similarity_index, DuplicatePodcast
+
+async def _cached(key, compute, ttl=None):
+    """generation_cache.get_or_compute() with the (possibly disk) cache reads kept off the event loop"""
+    value = await asyncio.to_thread(generation_cache.get, key)
+    if value is None:
+        value = await compute()
+        await asyncio.to_thread(generation_cache.set, key, value, ttl)
+    return value
+
+def write_script(topic, language):
+    """Async stage factory: generate a script with the LLM provider"""
+    llm = get_provider('llm')
+    key = script_key(llm, topic, SCRIPT_SYSTEM_PROMPT, SCRIPT_USER_PROMPT, language)
+
+    async def run(inputs, cancel):
+        return await _cached(key, lambda: acall_provider(
+            llm.rate_limit,
+            llm.acomplete,
+            SCRIPT_SYSTEM_PROMPT,
+            SCRIPT_USER_PROMPT.format(topic=topic),
+            model=SCRIPT_MODEL,
+            timeout=stage_timeout('script')
+        ))
+    return run
+
+def draw_thumbnail(topic):
+    """Async stage factory: generate a thumbnail with the image provider and return its URL"""
+    images = get_provider('image')
+    key = thumbnail_key(images, topic, THUMBNAIL_PROMPT)
+
+    async def run(inputs, cancel):
+        return await _cached(key, lambda: acall_provider(
+            images.rate_limit,
+            images.agenerate,
+            THUMBNAIL_PROMPT.format(topic=topic),
+            model=IMAGE_MODEL,
+            size="1024x1024",
+            timeout=stage_timeout('thumbnail')
+        ), ttl=DALLE_URL_TTL)
+    return run
+
+def check_duplicate(language):
+    """Async stage factory: pipeline.check_duplicate with the index lookup off the event loop"""
+    async def run(inputs, cancel):
+        match = await asyncio.to_thread(similarity_index.check_script, inputs['script'], language)
+        if match is not None and match['action'] == 'reuse':
+            raise DuplicatePodcast(match)
+        return match
+    return run
+
+async def reuse_podcast(match, check):
+    podcasts = await AsyncDatabaseOperations.get_podcasts_by_ids([match['id']], listing_projection('script'))
+    return reused_result(match, check, podcasts[0]) if podcasts else None
+
+def speak(voice, report=None):
+    """Async stage factory: synthesize the script by sentence or chunk, TTS_CONCURRENCY at a time"""
+    tts = get_provider('tts')
+
+    async def gather(coroutines):
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def synthesize(script):
+        slots = asyncio.Semaphore(TTS_CONCURRENCY)
+
+        async def chunk(text):
+            async with slots:
+                return await acall_provider(tts.rate_limit, tts.asynthesize, text, voice,
+                                            model=TTS_MODEL, timeout=TTS_CHUNK_TIMEOUT)
+
+        if not TTS_PHRASE_CACHE:
+            segments = await gather(chunk(text) for text in split_script(script))
+            return bytes(segments[0]) + b''.join(_strip_tags(segment) for segment in segments[1:])
+
+        async def phrase(key, text):
+            audio = await asyncio.to_thread(phrase_cache.get, key)
+            if audio is not None:
+                return audio, True
+            audio = phrase_audio(await chunk(text))
+            await asyncio.to_thread(phrase_cache.set, key, audio)
+            return audio, False
+
+        # Same as tts.synthesize_phrases(): one lookup or call per distinct sentence
+        phrases = split_phrases(script)
+        keys = [phrase_key(tts, text, voice) for text in phrases]
+        unique = dict(zip(keys, phrases))
+        results = dict(zip(unique, await gather(phrase(key, text) for key, text in unique.items())))
+        segments, hits, seen = [], [], set()
+        for key in keys:
+            audio, cached = results[key]
+            segments.append(audio)
+            hits.append(cached or key in seen)
+            seen.add(key)
+        record_phrase_hits(phrases, hits, report)
+        return b''.join(segments)
+
+    async def run(inputs, cancel):
+        script = inputs['script']
+        return await _cached(audio_key(tts, script, voice), lambda: synthesize(script))
+    return run
+
+async def upload_audio(inputs, cancel):
+    blobs = get_provider('blob')
+    return await _cached(audio_url_key(blobs, inputs['tts']), lambda: acall_provider(
+        blobs.rate_limit,
+        blobs.aupload,
+        inputs['tts'],
+        folder="podcasts",
+        resource_type="video",
+        filename="podcast.mp3",
+        timeout=stage_timeout('audio_upload')
+    ))
+
+async def upload_thumbnail(inputs, cancel):
+    blobs = get_provider('blob')
+    return await _cached(thumbnail_url_key(blobs, inputs['thumbnail']), lambda: acall_provider(
+        blobs.rate_limit,
+        blobs.aupload,
+        inputs['thumbnail'],
+        folder="podcast_thumbnails",
+        timeout=stage_timeout('thumbnail_upload')
+    ))
+
+def build_generation_graph(topic, voice, language, dedupe=True, tts_report=None):
+    """Async twin of pipeline.build_generation_graph, for StageGraph.arun()"""
+    podcast_id = ObjectId()
+
+    async def save_podcast(inputs, cancel):
+        podcast = Podcast(
+            id=podcast_id,
+            topic=topic,
+            script=inputs['script'],
+            audio_path=inputs['audio_upload'],
+            thumbnail_url=inputs['thumbnail_upload'],
+            voice=voice,
+            language=language,
+            **audio_info(inputs['tts'])
+        )
+        podcast.validate()
+        return await AsyncDatabaseOperations.insert_podcast(podcast)
+
+    async def segment(inputs, cancel):
+        # Writes playlist files, so it runs on a thread
+        return await asyncio.to_thread(_segment_audio, podcast_id, inputs)
+
+    dedupe_stages = [
+        Stage('dedupe', check_duplicate(language), deps=['script'], timeout=stage_timeout('dedupe'))
+    ] if dedupe else []
+    return StageGraph([
+        Stage('script', write_script(topic, language), timeout=stage_timeout('script')),
+        *dedupe_stages,
+        Stage('tts', speak(voice, tts_report), deps=['script'] + [stage.name for stage in dedupe_stages],
+              timeout=stage_timeout('tts')),
+        Stage('audio_upload', upload_audio, deps=['tts'], timeout=stage_timeout('audio_upload')),
+        Stage('thumbnail', draw_thumbnail(topic), timeout=stage_timeout('thumbnail')),
+        Stage('thumbnail_upload', upload_thumbnail, deps=['thumbnail'], timeout=stage_timeout('thumbnail_upload')),
+        Stage('save', save_podcast, deps=['script', 'tts', 'audio_upload', 'thumbnail_upload'],
+              timeout=stage_timeout('save')),
+        Stage('hls', segment, deps=['save', 'tts', 'audio_upload'], timeout=stage_timeout('hls'))
+    ])
+
+async def generate_podcast_job(job_id, params, progress):
+    """Async job handler for /generate-podcast; returns the same result as the threaded one"""
+    tts_report = {}
+    graph = build_generation_graph(
+        params['topic'],
+        params.get('voice', 'Rachel'),
+        params.get('language', 'English'),
+        dedupe=params.get('dedupe', True),
+        tts_report=tts_report
+    )
+
+    async def on_stage_done(name, completed, total):
+        await progress(name, completed * 100 // total)
+
+    try:
+        results = await graph.arun(on_stage_done=on_stage_done)
+    except Exception as e:
+        duplicate = duplicate_cause(e)
+        result = duplicate and await reuse_podcast(duplicate.match, 'script')
+        if result is None:
+            raise
+        return result
+    podcast = results['save']
+    result = {
+        "id": str(podcast.id),
+        "topic": podcast.topic,
+        "audio_url": podcast.audio_path,
+        "thumbnail_url": podcast.thumbnail_url,
+        "hls_url": results['hls'],
+        "script": podcast.script
+    }
+    if params.get('similar_to') or results.get('dedupe'):
+        result['similar_to'] = params.get('similar_to') or results['dedupe']
+    if tts_report:
+        result['tts_cache'] = tts_report
+    return result
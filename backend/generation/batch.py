@@ -0,0 +1,130 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from database.mongodb import DatabaseOperations
+from .cache import normalize_topic
+from observability.metrics import STAGE_SECONDS
+from .pipeline import build_batch_graph, duplicate_cause, reuse_podcast
+from search.similar import similarity_index
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+BATCH_INSERT_SIZE = int(os.getenv('BATCH_INSERT_SIZE', 50))
+BATCH_MAX_TOPICS = int(os.getenv('BATCH_MAX_TOPICS', 1000))
+
+def parse_batch(data):
+    """Validate a /generate-batch body into a list of {topic, voice, language} items.
+
+    Topics may be strings or objects overriding the batch voice and language.
+    Repeated topics are dropped. Raises ValueError on bad input.
+    """
+    topics = data.get('topics')
+    if not isinstance(topics, list) or not topics:
+        raise ValueError("topics must be a non-empty list")
+    if len(topics) > BATCH_MAX_TOPICS:
+        raise ValueError(f"At most {BATCH_MAX_TOPICS} topics per batch")
+
+    voice = data.get('voice', 'Rachel')
+    language = data.get('language', 'English')
+    items, seen = [], set()
+    for entry in topics:
+        item = {'voice': voice, 'language': language}
+        if isinstance(entry, dict):
+            item.update({k: entry[k] for k in ('topic', 'voice', 'language') if entry.get(k)})
+        else:
+            item['topic'] = entry
+        if not isinstance(item.get('topic'), str) or not item['topic'].strip():
+            raise ValueError("Every topic must be a non-empty string")
+        key = (normalize_topic(item['topic']), item['voice'], item['language'])
+        if key not in seen:
+            seen.add(key)
+            items.append(item)
+    return items
+
+def run_batch(items, user_id=None, concurrency=BATCH_CONCURRENCY, insert_size=BATCH_INSERT_SIZE, on_progress=None):
+    """Generate every item with at most concurrency topics in flight.
+
+    Provider calls inside each graph share the per-provider token buckets and
+    retry transient errors themselves, so a topic here fails only once its
+    retries are spent. Finished documents are buffered and written with one
+    insert_many per insert_size podcasts. Topics or scripts that near-duplicate
+    an existing podcast are reported under "reused" instead of generated.
+    """
+    podcasts, errors, reused = [], [], []
+    pending = []
+
+    def reuse(item, match, check):
+        result = reuse_podcast(match, check)
+        if result is None:
+            return False
+        reused.append({"topic": item['topic'], "duplicate_of": result['duplicate_of'],
+                       "similarity": result['similarity'], "estimated_savings_usd": result['estimated_savings_usd']})
+        return True
+
+    def generate(item):
+        match = similarity_index.check_topic(item['topic'], item['language'])
+        if match is not None and match['action'] == 'reuse' and reuse(item, match, 'topic'):
+            return None
+        graph = build_batch_graph(item['topic'], item['voice'], item['language'], user_id=user_id)
+        try:
+            results = graph.run()
+        except Exception as e:
+            duplicate = duplicate_cause(e)
+            if duplicate is not None and reuse(item, duplicate.match, 'script'):
+                return None
+            raise
+        return results['document'], results['hls']
+
+    def flush():
+        batch = pending[:]
+        pending.clear()
+        started = time.perf_counter()
+        written = set(DatabaseOperations.create_podcasts([podcast for podcast, _ in batch]))
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage='bulk_insert', outcome='ok')
+        for podcast, hls_url in batch:
+            if podcast.id in written:
+                podcasts.append({"id": str(podcast.id), "topic": podcast.topic, "hls_url": hls_url})
+            else:
+                errors.append({"topic": podcast.topic, "error": "Insert failed"})
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch') as executor:
+        futures = {executor.submit(generate, item): item for item in items}
+        for done, future in enumerate(as_completed(futures), 1):
+            item = futures[future]
+            try:
+                generated = future.result()
+                if generated is not None:
+                    pending.append(generated)
+            except Exception as e:
+                logger.exception("Error generating batch topic", extra={'topic': item['topic']})
+                errors.append({"topic": item['topic'], "error": str(e)})
+            if len(pending) >= insert_size:
+                flush()
+            if on_progress is not None:
+                on_progress(done, len(items))
+    flush()
+
+    return {
+        "total": len(items),
+        "succeeded": len(podcasts),
+        "failed": len(errors),
+        "reused": len(reused),
+        "estimated_savings_usd": round(sum(entry['estimated_savings_usd'] for entry in reused), 4),
+        "podcasts": podcasts,
+        "errors": errors,
+        "duplicates": reused
+    }
+
+def generate_batch_job(job_id, params, progress):
+    """Job handler for /generate-batch"""
+    def on_progress(done, total):
+        progress(f"{done}/{total} topics", done * 100 // total)
+
+    return run_batch(
+        params['items'],
+        user_id=params.get('user_id'),
+        concurrency=int(params.get('concurrency') or BATCH_CONCURRENCY),
+        on_progress=on_progress
+    )
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+GENERATION_CACHE_DIR = os.getenv('GENERATION_CACHE_DIR', os.path.join('cache', 'generation'))
+GENERATION_CACHE_MEMORY_BYTES = int(os.getenv('GENERATION_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+GENERATION_CACHE_DISK_BYTES = int(os.getenv('GENERATION_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+GENERATION_CACHE_TTL = int(os.getenv('GENERATION_CACHE_TTL', 30 * 24 * 3600))
+# Seconds between rescans of the disk tier for entries written by other workers
+GENERATION_CACHE_DISK_RESCAN_INTERVAL = float(os.getenv('GENERATION_CACHE_DISK_RESCAN_INTERVAL', 60))
+
+_WHITESPACE = re.compile(r'\s+')
+_HEADER = struct.Struct('<dc')  # expires_at, value type
+
+def normalize_topic(topic):
+    """Case-fold, collapse whitespace and drop trailing punctuation"""
+    return _WHITESPACE.sub(' ', topic or '').strip().casefold().rstrip('.!?')
+
+def cache_key(kind, topic=None, prompt=None, model=None, voice=None, language=None, **extra):
+    """Content address for one generated artifact"""
+    parts = {
+        'kind': kind,
+        'topic': normalize_topic(topic) if topic is not None else None,
+        'prompt': prompt,
+        'model': model,
+        'voice': voice,
+        'language': language.casefold() if language else None
+    }
+    parts.update(extra)
+    encoded = json.dumps(parts, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return f"{kind}-{hashlib.sha256(encoded).hexdigest()}"
+
+def _encode(value, expires_at):
+    if isinstance(value, str):
+        return _HEADER.pack(expires_at, b's') + value.encode('utf-8')
+    return _HEADER.pack(expires_at, b'b') + bytes(value)
+
+def _decode(data):
+    expires_at, kind = _HEADER.unpack_from(data)
+    payload = data[_HEADER.size:]
+    return expires_at, (payload.decode('utf-8') if kind == b's' else payload)
+
+def _size(value):
+    return len(value.encode('utf-8')) if isinstance(value, str) else len(value)
+
+class MemoryTier:
+    """Size-bounded LRU of recently used artifacts"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, value, expires_at):
+        size = _size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, size, value)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+class DiskTier:
+    """Persistent artifact store, one file per key, evicted least recently used first.
+
+    Writes go through a temp file and os.replace so concurrent workers never
+    read a partial entry. Reads touch the file's mtime, so every worker sees
+    the same access order. Before evicting, the index is rebuilt from the
+    directory at most every rescan_interval seconds, which makes max_bytes a
+    bound on the shared directory rather than on each worker's own writes;
+    between rescans it can overshoot by what other workers have written.
+    """
+
+    def __init__(self, directory, max_bytes, rescan_interval=GENERATION_CACHE_DISK_RESCAN_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self.total_bytes = 0
+        self._index = OrderedDict()  # key -> size, ordered by last access
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _load_index(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # Evicted by another worker mid-scan
+                    continue
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        with self._lock:
+            self._index = index
+            self.total_bytes = sum(index.values())
+            self._scanned_at = time.monotonic()
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                if key in self._index:
+                    self.total_bytes -= self._index.pop(key)
+            return None, None
+
+        expires_at, value = _decode(data)
+        if expires_at < time.time():
+            self.delete(key)
+            return None, None
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return value, expires_at
+
+    def set(self, key, value, expires_at):
+        data = _encode(value, expires_at)
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        if time.monotonic() - self._scanned_at >= self.rescan_interval:
+            self._load_index()
+        with self._lock:
+            self.total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self.total_bytes += len(data)
+            evicted = []
+            while self.total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, size = self._index.popitem(last=False)
+                self.total_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._index:
+                self.total_bytes -= self._index.pop(key)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+class GenerationCache:
+    """Two-tier cache for generated scripts, audio and uploaded artifact URLs"""
+
+    def __init__(self, directory=GENERATION_CACHE_DIR, memory_bytes=GENERATION_CACHE_MEMORY_BYTES,
+                 disk_bytes=GENERATION_CACHE_DISK_BYTES, default_ttl=GENERATION_CACHE_TTL):
+        self.default_ttl = default_ttl
+        self.memory = MemoryTier(memory_bytes)
+        self._directory = directory
+        self._disk_bytes = disk_bytes
+        self._disk = None
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0}
+
+    @property
+    def disk(self):
+        # The disk index is built on first use rather than at import time
+        if self._disk is None:
+            with self._lock:
+                if self._disk is None:
+                    self._disk = DiskTier(self._directory, self._disk_bytes)
+        return self._disk
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+        value, expires_at = self.disk.get(key)
+        if value is not None:
+            self._count('disk_hits')
+            self.memory.set(key, value, expires_at)
+            return value
+        self._count('misses')
+        return None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl or self.default_ttl)
+        self.memory.set(key, value, expires_at)
+        self.disk.set(key, value, expires_at)
+        self._count('sets')
+
+    def get_or_compute(self, key, compute, ttl=None):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value, ttl=ttl)
+        return value
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats.update({
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'memory_bytes': self.memory.total_bytes,
+            # Reading self.disk would create the disk tier and its directory
+            'disk_bytes': self._disk.total_bytes if self._disk is not None else 0
+        })
+        return stats
+
+generation_cache = GenerationCache()
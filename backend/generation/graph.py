@@ -0,0 +1,193 @@
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from observability.metrics import STAGE_SECONDS
+
+class StageError(Exception):
+    """Raised when a stage fails, carrying the name of the stage"""
+
+    def __init__(self, stage, message):
+        super().__init__(f"Stage '{stage}' failed: {message}")
+        self.stage = stage
+
+class StageTimeout(StageError):
+    """Raised when a stage runs past its timeout"""
+
+    def __init__(self, stage, timeout):
+        super().__init__(stage, f"timed out after {timeout}s")
+
+class StageCancelled(Exception):
+    """Raised inside a stage that noticed the run was cancelled"""
+
+class Stage:
+    """A unit of pipeline work that runs once all of its dependencies are done.
+
+    fn is called as fn(results, cancel) where results maps dependency names to
+    their return values and cancel is a threading.Event set when the run is
+    aborted, so long-running stages can stop early.
+    """
+
+    def __init__(self, name, fn, deps=(), timeout=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout
+
+def _run_stage(stage, inputs, cancel):
+    """Run one stage, recording its duration by outcome"""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        result = stage.fn(inputs, cancel)
+        outcome = 'ok'
+        return result
+    except StageCancelled:
+        outcome = 'cancelled'
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage.name, outcome=outcome)
+
+async def _arun_stage(stage, inputs):
+    """_run_stage() for a coroutine stage, enforcing its timeout on the event loop"""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        result = await asyncio.wait_for(stage.fn(inputs, None), stage.timeout)
+        outcome = 'ok'
+        return result
+    except asyncio.TimeoutError:
+        raise StageTimeout(stage.name, stage.timeout)
+    except asyncio.CancelledError:
+        outcome = 'cancelled'
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage.name, outcome=outcome)
+
+class StageGraph:
+    """Runs stages concurrently in dependency order"""
+
+    def __init__(self, stages, max_workers=None):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {missing}")
+        self._check_acyclic()
+        self.max_workers = max_workers or len(self.stages)
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def run(self, on_stage_done=None, cancel=None):
+        """Run every stage and return a dict of stage name to result.
+
+        on_stage_done(name, completed, total) is called as each stage finishes.
+        The first failure or timeout sets cancel, drops stages that have not
+        started yet and is re-raised as a StageError.
+        """
+        cancel = cancel or threading.Event()
+        results = {}
+        running = {}  # future -> (stage, deadline)
+        pending = dict(self.stages)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stage')
+
+        def start_ready():
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.deps):
+                    del pending[name]
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    future = executor.submit(_run_stage, stage, inputs, cancel)
+                    deadline = time.monotonic() + stage.timeout if stage.timeout else None
+                    running[future] = (stage, deadline)
+
+        try:
+            start_ready()
+            while running:
+                deadlines = [d for _, d in running.values() if d is not None]
+                timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+                finished, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    stage, _ = running.pop(future)
+                    try:
+                        results[stage.name] = future.result()
+                    except StageError:
+                        raise
+                    except StageCancelled:
+                        raise StageError(stage.name, "cancelled")
+                    except Exception as e:
+                        raise StageError(stage.name, str(e)) from e
+                    if on_stage_done:
+                        on_stage_done(stage.name, len(results), len(self.stages))
+
+                now = time.monotonic()
+                for future, (stage, deadline) in running.items():
+                    if deadline is not None and now >= deadline:
+                        raise StageTimeout(stage.name, stage.timeout)
+
+                if cancel.is_set():
+                    raise StageCancelled("Pipeline run was cancelled")
+                start_ready()
+            return results
+        except BaseException:
+            cancel.set()
+            raise
+        finally:
+            # Running stage threads cannot be killed; they see cancel and their results are dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def arun(self, on_stage_done=None):
+        """run() for stages whose fn is a coroutine function, on the running event loop.
+
+        Stages run as tasks instead of threads and are passed cancel=None:
+        the first failure or timeout cancels the tasks still running.
+        on_stage_done may be a coroutine function.
+        """
+        results = {}
+        running = {}  # task -> stage
+        pending = dict(self.stages)
+
+        def start_ready():
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.deps):
+                    del pending[name]
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    running[asyncio.ensure_future(_arun_stage(stage, inputs))] = stage
+
+        try:
+            start_ready()
+            while running:
+                finished, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    stage = running.pop(task)
+                    try:
+                        results[stage.name] = task.result()
+                    except StageError:
+                        raise
+                    except Exception as e:
+                        raise StageError(stage.name, str(e)) from e
+                    if on_stage_done:
+                        done = on_stage_done(stage.name, len(results), len(self.stages))
+                        if inspect.isawaitable(done):
+                            await done
+                start_ready()
+            return results
+        finally:
+            for task in running:
+                task.cancel()
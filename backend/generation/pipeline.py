@@ -0,0 +1,330 @@
+import hashlib
+import os
+from bson import ObjectId
+from database.mongodb import DatabaseOperations
+from database.schemas import Podcast
+from database.serializers import listing_projection
+from providers.registry import get_provider
+from media.hls import HLS_DIR, write_playlist, segment_file
+from media.mp3 import audio_info
+from .graph import Stage, StageGraph, StageError
+from .tts import synthesize_script, audio_streams, TTS_MODEL
+from .cache import generation_cache, cache_key
+from .ratelimit import call_provider
+from search.similar import similarity_index, record_reuse, DuplicatePodcast
+
+SCRIPT_SYSTEM_PROMPT = "You are a professional podcast script writer. Create engaging, well-structured content that flows naturally when spoken."
+SCRIPT_USER_PROMPT = """Write a podcast script about {topic}. Include:
+                    - A catchy introduction
+                    - Clear main points
+                    - Engaging examples or stories
+                    - A strong conclusion
+                    Keep it under 5 minutes when read aloud."""
+THUMBNAIL_PROMPT = "A professional podcast cover art for a podcast about {topic}. Modern, minimal style."
+
+SEED_SCRIPT_SYSTEM_PROMPT = "You are a professional podcast script writer. Write a short, engaging script about programming topics."
+SEED_SCRIPT_USER_PROMPT = "Write a 2-minute podcast script about {topic}. Include a brief introduction and 2-3 main points."
+SEED_THUMBNAIL_PROMPT = "A minimalist, modern podcast cover art about Python programming. Use cool blue colors and simple Python logo."
+
+SCRIPT_MODEL = "gpt-3.5-turbo"
+IMAGE_MODEL = "dall-e-2"
+
+# DALL-E image URLs expire after an hour, uploaded Cloudinary URLs do not
+DALLE_URL_TTL = 50 * 60
+
+# Default per-stage timeouts in seconds, overridable with STAGE_TIMEOUT_<STAGE>
+STAGE_TIMEOUTS = {
+    'script': 120,
+    'tts': 300,
+    'audio_upload': 120,
+    'thumbnail': 120,
+    'thumbnail_upload': 60,
+    'dedupe': 30,
+    'save': 30,
+    'hls': 30
+}
+
+def stage_timeout(name):
+    return int(os.getenv(f"STAGE_TIMEOUT_{name.upper()}", STAGE_TIMEOUTS[name]))
+
+# Cache keys shared by the threaded pipeline and generation.aio_pipeline
+def script_key(llm, topic, system_prompt, user_template, language=None):
+    return cache_key('script', topic, prompt=system_prompt + user_template, model=SCRIPT_MODEL, language=language,
+                     provider=llm.name)
+
+def thumbnail_key(images, topic, prompt_template):
+    return cache_key('thumbnail', topic, prompt=prompt_template, model=IMAGE_MODEL, provider=images.name)
+
+def audio_key(tts, script, voice):
+    return cache_key('audio', model=TTS_MODEL, voice=voice, provider=tts.name,
+                     script=hashlib.sha256(script.encode('utf-8')).hexdigest())
+
+def audio_url_key(blobs, audio):
+    return cache_key('audio_url', audio=hashlib.sha256(audio).hexdigest(), provider=blobs.name)
+
+def thumbnail_url_key(blobs, source):
+    return cache_key('thumbnail_url', source=source, provider=blobs.name)
+
+def write_script(topic, system_prompt, user_template, language=None):
+    """Stage factory: generate a script with the LLM provider"""
+    llm = get_provider('llm')
+    key = script_key(llm, topic, system_prompt, user_template, language)
+
+    def run(inputs, cancel):
+        def compute():
+            return call_provider(
+                llm.rate_limit,
+                llm.complete,
+                system_prompt,
+                user_template.format(topic=topic),
+                cancel=cancel,
+                model=SCRIPT_MODEL,
+                timeout=stage_timeout('script')
+            )
+        return generation_cache.get_or_compute(key, compute)
+    return run
+
+def draw_thumbnail(topic, prompt_template):
+    """Stage factory: generate a thumbnail with the image provider and return its URL"""
+    images = get_provider('image')
+    key = thumbnail_key(images, topic, prompt_template)
+
+    def run(inputs, cancel):
+        def compute():
+            return call_provider(
+                images.rate_limit,
+                images.generate,
+                prompt_template.format(topic=topic),
+                cancel=cancel,
+                model=IMAGE_MODEL,
+                size="1024x1024",
+                timeout=stage_timeout('thumbnail')
+            )
+        return generation_cache.get_or_compute(key, compute, ttl=DALLE_URL_TTL)
+    return run
+
+def check_duplicate(language):
+    """Stage factory: compare the new script with existing ones before paying for TTS.
+
+    Raises DuplicatePodcast when DEDUPE_MODE is 'reuse'; in 'flag' mode the
+    match is returned and generation carries on.
+    """
+    def run(inputs, cancel):
+        match = similarity_index.check_script(inputs['script'], language)
+        if match is not None and match['action'] == 'reuse':
+            raise DuplicatePodcast(match)
+        return match
+    return run
+
+def duplicate_cause(error):
+    """The DuplicatePodcast behind a StageError, if that is why a graph stopped"""
+    cause = error.__cause__ if isinstance(error, StageError) else error
+    return cause if isinstance(cause, DuplicatePodcast) else None
+
+def reused_result(match, check, podcast):
+    """Job result for a request served by an existing podcast, counting the spend it saved"""
+    podcast_id = str(podcast['_id'])
+    hls_url = f"/hls/{podcast_id}.m3u8"
+    return {
+        "id": podcast_id,
+        "topic": podcast['topic'],
+        "audio_url": podcast['audio_path'],
+        "thumbnail_url": podcast['thumbnail_url'],
+        "hls_url": hls_url if os.path.exists(os.path.join(HLS_DIR, f"{podcast_id}.m3u8")) else None,
+        "script": podcast.get('script'),
+        "duplicate_of": podcast_id,
+        "similarity": match['similarity'],
+        "estimated_savings_usd": record_reuse(check, len(podcast.get('script') or ''))
+    }
+
+def reuse_podcast(match, check):
+    """reused_result() for the podcast a near-duplicate check matched, or None if it has gone"""
+    podcasts = DatabaseOperations.get_podcasts_by_ids([match['id']], listing_projection('script'))
+    return reused_result(match, check, podcasts[0]) if podcasts else None
+
+def speak(voice, stream=None, report=None):
+    """Stage factory: synthesize the script with the TTS provider, sentence by sentence or in chunks"""
+    def run(inputs, cancel):
+        script = inputs['script']
+        key = audio_key(get_provider('tts'), script, voice)
+        audio = generation_cache.get(key)
+        if audio is not None:
+            if stream is not None:
+                stream.append(audio)
+                stream.close()
+            return audio
+        audio = synthesize_script(script, voice, stream=stream, cancel=cancel, report=report)
+        generation_cache.set(key, audio)
+        return audio
+    return run
+
+def upload_audio(inputs, cancel):
+    blobs = get_provider('blob')
+    key = audio_url_key(blobs, inputs['tts'])
+
+    def compute():
+        # Upload straight from memory, no temp file on disk
+        return call_provider(
+            blobs.rate_limit,
+            blobs.upload,
+            inputs['tts'],
+            cancel=cancel,
+            folder="podcasts",
+            resource_type="video",  # Cloudinary uses "video" for audio files
+            filename="podcast.mp3",
+            timeout=stage_timeout('audio_upload')
+        )
+    return generation_cache.get_or_compute(key, compute)
+
+def upload_thumbnail(inputs, cancel):
+    blobs = get_provider('blob')
+    key = thumbnail_url_key(blobs, inputs['thumbnail'])
+
+    def compute():
+        return call_provider(
+            blobs.rate_limit,
+            blobs.upload,
+            inputs['thumbnail'],
+            cancel=cancel,
+            folder="podcast_thumbnails",
+            timeout=stage_timeout('thumbnail_upload')
+        )
+    return generation_cache.get_or_compute(key, compute)
+
+def _media_stages(topic, voice, language, stream=None, dedupe=True, tts_report=None):
+    """script -> [dedupe ->] tts -> audio_upload alongside thumbnail -> thumbnail_upload"""
+    dedupe_stages = [
+        Stage('dedupe', check_duplicate(language), deps=['script'], timeout=stage_timeout('dedupe'))
+    ] if dedupe else []
+    return [
+        Stage('script', write_script(topic, SCRIPT_SYSTEM_PROMPT, SCRIPT_USER_PROMPT, language),
+              timeout=stage_timeout('script')),
+        *dedupe_stages,
+        Stage('tts', speak(voice, stream, tts_report), deps=['script'] + [stage.name for stage in dedupe_stages],
+              timeout=stage_timeout('tts')),
+        Stage('audio_upload', upload_audio, deps=['tts'], timeout=stage_timeout('audio_upload')),
+        Stage('thumbnail', draw_thumbnail(topic, THUMBNAIL_PROMPT), timeout=stage_timeout('thumbnail')),
+        Stage('thumbnail_upload', upload_thumbnail, deps=['thumbnail'], timeout=stage_timeout('thumbnail_upload'))
+    ]
+
+def _segment_audio(podcast_id, inputs):
+    # Byte-range playlist over the uploaded MP3, cut at frame boundaries
+    write_playlist(str(podcast_id), inputs['tts'], inputs['audio_upload'])
+    return f"/hls/{podcast_id}.m3u8"
+
+def build_generation_graph(topic, voice, language, stream=None, dedupe=True, tts_report=None):
+    """Stage graph for /generate-podcast.
+
+    script -> tts -> audio_upload runs alongside thumbnail -> thumbnail_upload,
+    and save waits for both branches. TTS audio is pushed to stream as it is
+    synthesized and the phrase cache hit ratio is written to tts_report. With
+    dedupe, a near-duplicate script stops the graph before TTS.
+    """
+    def save_podcast(inputs, cancel):
+        return DatabaseOperations.create_podcast(
+            topic=topic,
+            script=inputs['script'],
+            audio_path=inputs['audio_upload'],
+            thumbnail_url=inputs['thumbnail_upload'],
+            voice=voice,
+            language=language,
+            # Duration and bitrate come from the MP3 headers already in memory
+            **audio_info(inputs['tts'])
+        )
+
+    return StageGraph(_media_stages(topic, voice, language, stream, dedupe, tts_report) + [
+        Stage('save', save_podcast, deps=['script', 'tts', 'audio_upload', 'thumbnail_upload'],
+              timeout=stage_timeout('save')),
+        Stage('hls', lambda inputs, cancel: _segment_audio(inputs['save'].id, inputs),
+              deps=['save', 'tts', 'audio_upload'], timeout=stage_timeout('hls'))
+    ])
+
+def build_batch_graph(topic, voice, language, user_id=None, dedupe=True):
+    """Stage graph for one topic of a batch.
+
+    Like build_generation_graph, but the 'document' stage only builds the
+    Podcast with a client-side ObjectId; the batch runner bulk-inserts them.
+    """
+    podcast_id = ObjectId()
+
+    def build_document(inputs, cancel):
+        podcast = Podcast(
+            id=podcast_id,
+            owner=ObjectId(user_id) if user_id else None,
+            topic=topic,
+            script=inputs['script'],
+            audio_path=inputs['audio_upload'],
+            thumbnail_url=inputs['thumbnail_upload'],
+            voice=voice,
+            language=language,
+            **audio_info(inputs['tts'])
+        )
+        podcast.validate()
+        return podcast
+
+    return StageGraph(_media_stages(topic, voice, language, dedupe=dedupe) + [
+        Stage('document', build_document, deps=['script', 'tts', 'audio_upload', 'thumbnail_upload'],
+              timeout=stage_timeout('save')),
+        Stage('hls', lambda inputs, cancel: _segment_audio(podcast_id, inputs),
+              deps=['tts', 'audio_upload'], timeout=stage_timeout('hls'))
+    ])
+
+def build_seed_graph(topic, voice, language, audio_path):
+    """Stage graph for one sample podcast: the script and audio run alongside the thumbnail"""
+    def save_audio(inputs, cancel):
+        with open(audio_path, 'wb') as f:
+            f.write(inputs['tts'])
+        return audio_path
+
+    return StageGraph([
+        Stage('script', write_script(topic, SEED_SCRIPT_SYSTEM_PROMPT, SEED_SCRIPT_USER_PROMPT, language),
+              timeout=stage_timeout('script')),
+        Stage('thumbnail', draw_thumbnail(topic, SEED_THUMBNAIL_PROMPT), timeout=stage_timeout('thumbnail')),
+        Stage('tts', speak(voice), deps=['script'], timeout=stage_timeout('tts')),
+        Stage('audio_save', save_audio, deps=['tts'], timeout=stage_timeout('save')),
+        Stage('hls', lambda inputs, cancel: segment_file(inputs['audio_save']), deps=['audio_save'],
+              timeout=stage_timeout('hls'))
+    ])
+
+def generate_podcast_job(job_id, params, progress):
+    """Job handler for a single /generate-podcast request"""
+    topic = params['topic']
+    stream = audio_streams.open(job_id)
+    tts_report = {}
+    graph = build_generation_graph(
+        topic,
+        params.get('voice', 'Rachel'),
+        params.get('language', 'English'),
+        stream=stream,
+        dedupe=params.get('dedupe', True),
+        tts_report=tts_report
+    )
+
+    def on_stage_done(name, completed, total):
+        progress(name, completed * 100 // total)
+
+    try:
+        results = graph.run(on_stage_done=on_stage_done)
+    except Exception as e:
+        # Release listeners when the run fails before TTS finishes
+        if not stream.closed:
+            stream.close(error=str(e))
+        duplicate = duplicate_cause(e)
+        result = duplicate and reuse_podcast(duplicate.match, 'script')
+        if result is None:
+            raise
+        return result
+    podcast = results['save']
+    result = {
+        "id": str(podcast.id),
+        "topic": podcast.topic,
+        "audio_url": podcast.audio_path,
+        "thumbnail_url": podcast.thumbnail_url,
+        "hls_url": results['hls'],
+        "script": podcast.script
+    }
+    if params.get('similar_to') or results.get('dedupe'):
+        result['similar_to'] = params.get('similar_to') or results['dedupe']
+    if tts_report:
+        result['tts_cache'] = tts_report
+    return result
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from observability.metrics import registry, PROVIDER_SECONDS, PROVIDER_ERRORS, PROVIDER_IN_FLIGHT
+from .graph import StageCancelled
+
+logger = logging.getLogger(__name__)
+
+# Default request rates per minute for each upstream provider, overridable with
+# RATE_LIMIT_<PROVIDER> (per minute) and RATE_BURST_<PROVIDER> (bucket size)
+PROVIDER_RATES = {
+    'openai_chat': 500,
+    'dalle': 50,
+    'elevenlabs': 120,
+    'cloudinary': 500
+}
+# Default cap on concurrent calls per provider in the async serving mode,
+# overridable with MAX_CONCURRENCY_<PROVIDER>
+PROVIDER_CONCURRENCY = {
+    'openai_chat': 100,
+    'dalle': 20,
+    'elevenlabs': 10,
+    'cloudinary': 50
+}
+PROVIDER_RETRIES = int(os.getenv('PROVIDER_RETRIES', 4))
+RETRY_BASE_SECONDS = float(os.getenv('RETRY_BASE_SECONDS', 1))
+RETRY_MAX_SECONDS = float(os.getenv('RETRY_MAX_SECONDS', 60))
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, up to capacity banked.
+
+    pause() empties the bucket until a deadline, so one 429 slows every
+    caller of that provider instead of each thread hammering it in turn.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now < self._paused_until:
+            self._updated = now
+            return
+        start = max(self._updated, self._paused_until)
+        self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available, otherwise return the seconds to wait for them"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now + tokens / self.rate
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, cancel=None):
+        """Block until tokens are available, raising StageCancelled if cancel is set meanwhile"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return
+            if cancel is not None:
+                if cancel.wait(wait):
+                    raise StageCancelled("Cancelled while waiting for rate limit")
+            else:
+                time.sleep(wait)
+
+    def refund(self, tokens=1):
+        """Give back tokens taken for work that did not go ahead"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the next seconds"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+def _bucket_for(provider):
+    name = provider.upper()
+    per_minute = float(os.getenv(f"RATE_LIMIT_{name}", PROVIDER_RATES[provider]))
+    burst = os.getenv(f"RATE_BURST_{name}")
+    return TokenBucket(per_minute / 60, float(burst) if burst else None)
+
+rate_limits = {provider: _bucket_for(provider) for provider in PROVIDER_RATES}
+
+RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    'provider_rate_limit_wait_seconds', "Time provider calls spent waiting for a rate-limit token", ('provider',)
+)
+
+def _is_rate_limited(error):
+    if getattr(error, 'http_status', None) == 429:
+        return True
+    return type(error).__name__ in ('RateLimitError', 'UnauthenticatedRateLimitError', 'RateLimited')
+
+def _is_retryable(error):
+    """Transient upstream failures are retried; bad requests and auth errors are not"""
+    if isinstance(error, (StageCancelled, ValueError, TypeError, KeyError)):
+        return False
+    if _is_rate_limited(error):
+        return True
+    status = getattr(error, 'http_status', None)
+    if status is not None:
+        return status >= 500 or status in (408, 409)
+    import cloudinary.exceptions
+
+    if isinstance(error, (cloudinary.exceptions.BadRequest, cloudinary.exceptions.AuthorizationRequired,
+                          cloudinary.exceptions.NotAllowed, cloudinary.exceptions.NotFound)):
+        return False
+    # Timeouts, dropped connections and other errors without a status
+    return True
+
+def _retry_after(error):
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        return float(retry_after)
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or headers.get('Retry-After') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def backoff_delay(attempt, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def call_provider(provider, fn, *args, cancel=None, retries=None, **kwargs):
+    """Call fn under the provider's rate limit, retrying transient failures with jittered backoff"""
+    bucket = rate_limits[provider]
+    retries = PROVIDER_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        with RATE_LIMIT_WAIT_SECONDS.time(provider=provider):
+            bucket.acquire(cancel=cancel)
+        try:
+            with PROVIDER_IN_FLIGHT.track_inprogress(provider=provider), PROVIDER_SECONDS.time(provider=provider):
+                return fn(*args, **kwargs)
+        except Exception as e:
+            PROVIDER_ERRORS.inc(provider=provider, error=type(e).__name__)
+            if attempt >= retries or not _is_retryable(e):
+                raise
+            delay = max(backoff_delay(attempt), _retry_after(e))
+            if _is_rate_limited(e):
+                bucket.pause(delay)
+            logger.warning("%s call failed, retrying", provider, extra={
+                'provider': provider, 'error': f"{type(e).__name__}: {e}",
+                'attempt': attempt + 1, 'retries': retries, 'delay_s': round(delay, 3)
+            })
+            if cancel is not None:
+                if cancel.wait(delay):
+                    raise StageCancelled(f"Cancelled while retrying {provider}")
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+_semaphores = weakref.WeakKeyDictionary()  # event loop -> {provider: asyncio.Semaphore}
+
+def provider_semaphore(provider):
+    """Bounded semaphore capping this event loop's concurrent calls to a provider"""
+    semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = semaphores.get(provider)
+    if semaphore is None:
+        limit = int(os.getenv(f"MAX_CONCURRENCY_{provider.upper()}", PROVIDER_CONCURRENCY[provider]))
+        semaphore = semaphores[provider] = asyncio.BoundedSemaphore(limit)
+    return semaphore
+
+async def acall_provider(provider, fn, *args, retries=None, **kwargs):
+    """call_provider() for coroutine functions: waits without blocking the event loop.
+
+    The token bucket is shared with the threaded pipeline in this process;
+    provider_semaphore() additionally bounds how many calls are in flight.
+    """
+    bucket = rate_limits[provider]
+    retries = PROVIDER_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        with RATE_LIMIT_WAIT_SECONDS.time(provider=provider):
+            while True:
+                wait = bucket.try_acquire()
+                if wait == 0:
+                    break
+                await asyncio.sleep(wait)
+        try:
+            async with provider_semaphore(provider):
+                with PROVIDER_IN_FLIGHT.track_inprogress(provider=provider), PROVIDER_SECONDS.time(provider=provider):
+                    return await fn(*args, **kwargs)
+        except Exception as e:
+            PROVIDER_ERRORS.inc(provider=provider, error=type(e).__name__)
+            if attempt >= retries or not _is_retryable(e):
+                raise
+            delay = max(backoff_delay(attempt), _retry_after(e))
+            if _is_rate_limited(e):
+                bucket.pause(delay)
+            logger.warning("%s call failed, retrying", provider, extra={
+                'provider': provider, 'error': f"{type(e).__name__}: {e}",
+                'attempt': attempt + 1, 'retries': retries, 'delay_s': round(delay, 3)
+            })
+            await asyncio.sleep(delay)
+            attempt += 1
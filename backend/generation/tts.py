@@ -0,0 +1,299 @@
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from providers.registry import get_provider
+from media.mp3 import audio_frames
+from observability.metrics import registry
+from .cache import GenerationCache, cache_key
+from .graph import StageCancelled
+from .ratelimit import call_provider
+
+logger = logging.getLogger(__name__)
+
+TTS_CHUNK_CHARS = int(os.getenv('TTS_CHUNK_CHARS', 1000))
+TTS_FIRST_CHUNK_CHARS = int(os.getenv('TTS_FIRST_CHUNK_CHARS', 300))
+TTS_CONCURRENCY = int(os.getenv('TTS_CONCURRENCY', 3))
+TTS_CHUNK_TIMEOUT = int(os.getenv('TTS_CHUNK_TIMEOUT', 120))
+TTS_MODEL = "eleven_monolingual_v1"
+
+# Synthesize sentence by sentence through a cache, so recurring greetings,
+# transitions and sign-offs are only ever paid for once per voice
+TTS_PHRASE_CACHE = os.getenv('TTS_PHRASE_CACHE', '1') == '1'
+TTS_PHRASE_CACHE_DIR = os.getenv('TTS_PHRASE_CACHE_DIR', os.path.join('cache', 'tts_phrases'))
+TTS_PHRASE_CACHE_MEMORY_BYTES = int(os.getenv('TTS_PHRASE_CACHE_MEMORY_BYTES', 32 * 1024 * 1024))
+TTS_PHRASE_CACHE_DISK_BYTES = int(os.getenv('TTS_PHRASE_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+TTS_PHRASE_CACHE_TTL = int(os.getenv('TTS_PHRASE_CACHE_TTL', 90 * 24 * 3600))
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_WHITESPACE = re.compile(r'\s+')
+_QUOTES = str.maketrans({'\u2018': "'", '\u2019': "'", '\u201c': '"', '\u201d': '"'})
+
+PHRASE_SENTENCES = registry.counter(
+    'tts_phrase_sentences_total', "Script sentences by whether their audio came from the phrase cache", ('result',)
+)
+PHRASE_CHARACTERS = registry.counter(
+    'tts_phrase_characters_total', "Script characters by whether their audio came from the phrase cache", ('result',)
+)
+PHRASE_HIT_RATIO = registry.histogram(
+    'tts_phrase_hit_ratio', "Share of each episode's sentences served from the phrase cache",
+    buckets=(0, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1)
+)
+
+phrase_cache = GenerationCache(TTS_PHRASE_CACHE_DIR, TTS_PHRASE_CACHE_MEMORY_BYTES,
+                               TTS_PHRASE_CACHE_DISK_BYTES, TTS_PHRASE_CACHE_TTL)
+
+def split_sentences(text):
+    """Split text at sentence boundaries"""
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+def normalize_sentence(sentence):
+    """Collapse whitespace and straighten quotes, so repeats of a sentence share one cache entry"""
+    return _WHITESPACE.sub(' ', sentence.translate(_QUOTES)).strip()
+
+def split_phrases(script):
+    """The normalized sentences of a script, in order"""
+    return [
+        normalize_sentence(sentence)
+        for paragraph in _PARAGRAPH_BREAK.split(script)
+        for sentence in split_sentences(paragraph)
+    ]
+
+def split_script(script, max_chars=TTS_CHUNK_CHARS, first_chunk_chars=TTS_FIRST_CHUNK_CHARS):
+    """Split a script into TTS chunks at paragraph, then sentence, boundaries.
+
+    The first chunk is kept short so the first audio arrives quickly. A single
+    sentence longer than the limit becomes its own chunk rather than being cut.
+    """
+    chunks = []
+    current = ''
+
+    def limit():
+        return first_chunk_chars if not chunks else max_chars
+
+    for paragraph in _PARAGRAPH_BREAK.split(script):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pieces = [paragraph] if len(paragraph) <= max_chars else split_sentences(paragraph)
+        for piece in pieces:
+            separator = '\n\n' if piece is paragraph else ' '
+            if current and len(current) + len(separator) + len(piece) > limit():
+                chunks.append(current)
+                current = ''
+            current = f"{current}{separator}{piece}" if current else piece
+            if len(current) >= limit():
+                chunks.append(current)
+                current = ''
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _strip_tags(segment):
+    """Drop ID3v2 header and ID3v1 trailer tags so MP3 frames can be joined"""
+    start = 0
+    if segment[:3] == b'ID3' and len(segment) >= 10:
+        size = (segment[6] << 21) | (segment[7] << 14) | (segment[8] << 7) | segment[9]
+        start = 10 + size + (10 if segment[5] & 0x10 else 0)
+    end = len(segment)
+    if end - start >= 128 and segment[end - 128:end - 125] == b'TAG':
+        end -= 128
+    return memoryview(segment)[start:end]
+
+def join_mp3_segments(segments):
+    """Join MP3 segments in order into one byte string"""
+    return b''.join(_strip_tags(segment) for segment in segments)
+
+def synthesize_chunks(chunks, voice, max_concurrency=TTS_CONCURRENCY, cancel=None, model=TTS_MODEL):
+    """Synthesize chunks in parallel, yielding the MP3 bytes of each chunk in order"""
+    tts = get_provider('tts')
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='tts')
+    try:
+        futures = [
+            executor.submit(call_provider, tts.rate_limit, tts.synthesize, chunk, voice,
+                            cancel=cancel, model=model, timeout=TTS_CHUNK_TIMEOUT)
+            for chunk in chunks
+        ]
+        for future in futures:
+            if cancel is not None and cancel.is_set():
+                # Never hand back partial audio, which the caller would cache as the whole episode
+                raise StageCancelled("Cancelled during speech synthesis")
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def phrase_key(tts, phrase, voice, model=TTS_MODEL):
+    """Cache key for one sentence's audio: the text, voice, voice settings and model"""
+    return cache_key('tts_phrase', prompt=phrase, model=model, voice=voice, provider=tts.name,
+                     voice_settings=getattr(tts, 'voice_settings', None))
+
+def phrase_audio(segment):
+    """A synthesized sentence reduced to bare MP3 frames, ready to be joined to the others"""
+    return audio_frames(segment) or bytes(_strip_tags(segment))
+
+def _cached_phrase(tts, key, phrase, voice, model, cancel):
+    audio = phrase_cache.get(key)
+    if audio is not None:
+        return audio, True
+    audio = phrase_audio(call_provider(tts.rate_limit, tts.synthesize, phrase, voice,
+                                       cancel=cancel, model=model, timeout=TTS_CHUNK_TIMEOUT))
+    phrase_cache.set(key, audio)
+    return audio, False
+
+def synthesize_phrases(phrases, voice, max_concurrency=TTS_CONCURRENCY, cancel=None, model=TTS_MODEL):
+    """Yield (audio, cached) for each sentence in order.
+
+    Only sentences missing from the phrase cache reach the provider, and a
+    sentence repeated within the script is synthesized once.
+    """
+    tts = get_provider('tts')
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='tts')
+    try:
+        futures = {}
+        keys = [phrase_key(tts, phrase, voice, model) for phrase in phrases]
+        for key, phrase in zip(keys, phrases):
+            if key not in futures:
+                futures[key] = executor.submit(_cached_phrase, tts, key, phrase, voice, model, cancel)
+        seen = set()
+        for key in keys:
+            if cancel is not None and cancel.is_set():
+                raise StageCancelled("Cancelled during speech synthesis")
+            audio, cached = futures[key].result()
+            yield audio, cached or key in seen
+            seen.add(key)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def record_phrase_hits(phrases, hits, report=None):
+    """Phrase cache hit ratio and characters saved for one episode, into metrics, the log and report"""
+    cached = sum(hits)
+    characters = sum(len(phrase) for phrase in phrases)
+    saved = sum(len(phrase) for phrase, hit in zip(phrases, hits) if hit)
+    stats = {
+        'sentences': len(phrases),
+        'cached_sentences': cached,
+        'hit_ratio': round(cached / len(phrases), 4) if phrases else 0.0,
+        'characters': characters,
+        'characters_saved': saved
+    }
+    PHRASE_SENTENCES.inc(cached, result='hit')
+    PHRASE_SENTENCES.inc(len(phrases) - cached, result='miss')
+    PHRASE_CHARACTERS.inc(saved, result='hit')
+    PHRASE_CHARACTERS.inc(characters - saved, result='miss')
+    PHRASE_HIT_RATIO.observe(stats['hit_ratio'])
+    logger.info("TTS phrase cache served %d of %d sentences, %d characters saved",
+                cached, len(phrases), saved, extra=stats)
+    if report is not None:
+        report.update(stats)
+    return stats
+
+class AudioStream:
+    """Growing in-memory MP3 that readers can follow while TTS is still running"""
+
+    def __init__(self):
+        self._segments = []
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+        self.updated_at = time.monotonic()
+
+    def append(self, segment):
+        with self._cond:
+            self._segments.append(bytes(segment))
+            self.updated_at = time.monotonic()
+            self._cond.notify_all()
+
+    def close(self, error=None):
+        with self._cond:
+            self._closed = True
+            self._error = error
+            self.updated_at = time.monotonic()
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def iter_segments(self, timeout=60):
+        """Yield segments as they arrive until the stream is closed"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._segments) and not self._closed:
+                    if not self._cond.wait(timeout=timeout):
+                        return
+                if index >= len(self._segments):
+                    return
+                segment = self._segments[index]
+            index += 1
+            yield segment
+
+class AudioStreamRegistry:
+    """Live audio streams by job id, kept for a short while after they close.
+
+    Streams live in the memory of the process running the job.
+    """
+
+    def __init__(self, retain_seconds=300):
+        self.retain_seconds = retain_seconds
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def open(self, key):
+        stream = AudioStream()
+        with self._lock:
+            self._prune()
+            self._streams[key] = stream
+        return stream
+
+    def get(self, key):
+        with self._lock:
+            return self._streams.get(key)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.retain_seconds
+        for key, stream in list(self._streams.items()):
+            if stream.closed and stream.updated_at < cutoff:
+                del self._streams[key]
+
+audio_streams = AudioStreamRegistry()
+
+def synthesize_script(script, voice, stream=None, cancel=None, report=None):
+    """Parallel TTS for a whole script, returning the joined MP3 bytes.
+
+    With the phrase cache on, the script is synthesized sentence by sentence
+    and only uncached sentences cost a provider call; the per-episode hit
+    ratio goes into report. Otherwise it goes out in chunks. Each piece is
+    pushed to stream as soon as it and every piece before it are ready, so
+    listeners can start playback after roughly one sentence or chunk.
+    """
+    phrases = split_phrases(script) if TTS_PHRASE_CACHE else None
+    hits = []
+
+    def pieces():
+        if phrases is None:
+            for index, segment in enumerate(synthesize_chunks(split_script(script), voice, cancel=cancel)):
+                yield segment if index == 0 else _strip_tags(segment)
+            return
+        for audio, cached in synthesize_phrases(phrases, voice, cancel=cancel):
+            hits.append(cached)
+            yield audio
+
+    segments = []
+    try:
+        for segment in pieces():
+            segments.append(segment)
+            if stream is not None:
+                stream.append(segment)
+    except Exception as e:
+        if stream is not None:
+            stream.close(error=str(e))
+        raise
+    if stream is not None:
+        stream.close()
+    if phrases is not None and len(hits) == len(phrases):
+        record_phrase_hits(phrases, hits, report)
+    return b''.join(segments)
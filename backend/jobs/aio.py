@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+import time
+from .queue import (
+    QueueFull, new_job, LocalJobStore, JOB_SECONDS, JOBS_RUNNING, JOB_HEARTBEAT_SECONDS,
+    RUNNING, SUCCEEDED, FAILED
+)
+
+logger = logging.getLogger(__name__)
+
+class AsyncJobRunner:
+    """JobQueue for coroutine handlers: each job is a task on the event loop.
+
+    Jobs only wait on upstream I/O, so one process can hold max_in_flight of
+    them; beyond that submit() raises QueueFull. Jobs share the job store
+    with the Flask app, so /jobs/<id> works from either server and a job
+    left running by a stopped process is resumed by JobQueue.
+    """
+
+    def __init__(self, store, max_in_flight=500, heartbeat_interval=JOB_HEARTBEAT_SECONDS):
+        self.store = store
+        self.max_in_flight = max_in_flight
+        self.heartbeat_interval = heartbeat_interval
+        self._handlers = {}
+        self._tasks = set()
+        self._held = set()  # ids of the jobs running on this loop
+        self._heartbeat = None
+
+    def register(self, kind, handler):
+        """Register async handler(job_id, params, progress) for a job kind"""
+        self._handlers[kind] = handler
+
+    def in_flight(self):
+        return len(self._tasks)
+
+    async def submit(self, kind, params):
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if len(self._tasks) >= self.max_in_flight:
+            raise QueueFull(f"Too many generations in flight ({self.max_in_flight})")
+        job = new_job(kind, params)
+        await self.store.create(job)
+        self._held.add(job['job_id'])
+        task = asyncio.ensure_future(self._run(job['job_id'], kind, params))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.ensure_future(self._heartbeats())
+        return job
+
+    async def get(self, job_id):
+        return await self.store.get(job_id)
+
+    async def shutdown(self):
+        """Cancel running jobs; their records stay 'running' and are resumed later"""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _heartbeats(self):
+        # Keeps JobQueue.resume_unfinished() in other processes off the jobs running here
+        while self._held:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if self._held:
+                    await self.store.heartbeat(list(self._held))
+            except Exception:
+                logger.exception("Error sending job heartbeats")
+
+    async def _run(self, job_id, kind, params):
+        async def progress(stage, percent):
+            await self.store.update(job_id, stage=stage, progress=int(percent))
+
+        started = time.perf_counter()
+        outcome = SUCCEEDED
+        JOBS_RUNNING.inc(kind=kind)
+        try:
+            await self.store.update(job_id, status=RUNNING, stage='starting')
+            result = await self._handlers[kind](job_id, params, progress)
+            await self.store.update(job_id, status=SUCCEEDED, stage='done', progress=100, result=result or {})
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            raise
+        except Exception as e:
+            outcome = FAILED
+            logger.exception("Job failed", extra={'job_id': job_id, 'kind': kind})
+            await self.store.update(job_id, status=FAILED, error=str(e))
+        finally:
+            JOBS_RUNNING.dec(kind=kind)
+            JOB_SECONDS.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+            self._held.discard(job_id)
+
+def create_job_runner():
+    """Build the async job runner configured by JOB_BACKEND and ASYNC_MAX_GENERATIONS"""
+    from database.aio import AsyncMongoJobStore, AsyncLocalJobStore
+    backend = os.getenv('JOB_BACKEND', 'mongo')
+    if backend == 'local':
+        store = AsyncLocalJobStore(LocalJobStore())
+    elif backend == 'mongo':
+        store = AsyncMongoJobStore()
+    else:
+        raise ValueError(f"Unknown JOB_BACKEND: {backend}")
+    return AsyncJobRunner(store, max_in_flight=int(os.getenv('ASYNC_MAX_GENERATIONS', 500)))
@@ -0,0 +1,291 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from observability.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# Each process refreshes heartbeat_at on the jobs it holds this often, queued or running
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', 30))
+
+JOB_SECONDS = registry.histogram('job_duration_seconds', "Background job run time", ('kind', 'outcome'))
+JOBS_RUNNING = registry.gauge('jobs_running', "Background jobs currently running", ('kind',))
+
+class QueueFull(Exception):
+    """Raised when the job queue has no room for another job"""
+
+_owner = (None, None)  # (pid, owner id) of this process
+
+def process_owner():
+    """host:pid:token naming this process as the holder of its jobs; the token tells a reused pid apart"""
+    global _owner
+    pid, owner = _owner
+    if pid != os.getpid():
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        _owner = (os.getpid(), owner)
+    return owner
+
+def owner_alive(owner):
+    """True or False for an owner on this host, None when it cannot be checked from here"""
+    if owner == process_owner():
+        return True
+    try:
+        host, pid, _ = owner.rsplit(':', 2)
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return None
+    if host != socket.gethostname():
+        return None
+    if pid == os.getpid():
+        # Our pid under another token: an earlier process that has exited
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def new_job(kind, params):
+    """A fresh queued job record, held by this process"""
+    now = datetime.utcnow()
+    return {
+        'job_id': uuid.uuid4().hex,
+        'kind': kind,
+        'params': params,
+        'status': QUEUED,
+        'stage': QUEUED,
+        'progress': 0,
+        'owner': process_owner(),
+        'heartbeat_at': now,
+        'created_at': now,
+        'updated_at': now
+    }
+
+def is_abandoned(job, stale_after):
+    """Whether an unfinished job's holder has gone: its process is dead, or its heartbeat stopped"""
+    alive = owner_alive(job.get('owner'))
+    if alive is not None:
+        return not alive
+    # Records from before heartbeats only have updated_at
+    last_seen = job.get('heartbeat_at') or job['updated_at']
+    return last_seen < datetime.utcnow() - stale_after
+
+class LocalJobStore:
+    """In-process job store, used for tests and single-process development"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job['job_id']] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=datetime.utcnow())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def unfinished(self):
+        with self._lock:
+            return [dict(j) for j in self._jobs.values() if j['status'] in (QUEUED, RUNNING)]
+
+    def heartbeat(self, job_ids):
+        now = datetime.utcnow()
+        with self._lock:
+            for job_id in job_ids:
+                if job_id in self._jobs:
+                    self._jobs[job_id]['heartbeat_at'] = now
+
+    def claim(self, job_id, seen):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['updated_at'] != seen['updated_at'] or job.get('heartbeat_at') != seen.get('heartbeat_at'):
+                return False
+            now = datetime.utcnow()
+            job.update(status=QUEUED, stage=QUEUED, progress=0, owner=process_owner(), heartbeat_at=now, updated_at=now)
+            return True
+
+class MongoJobStore:
+    """Job store backed by the jobs collection so jobs survive a restart"""
+
+    def create(self, job):
+        from database.schemas import Job
+        Job(**job).save()
+
+    def update(self, job_id, **fields):
+        from database.schemas import Job
+        updates = {f"set__{name}": value for name, value in fields.items()}
+        Job.objects(job_id=job_id).update_one(set__updated_at=datetime.utcnow(), **updates)
+
+    def get(self, job_id):
+        from database.schemas import Job
+        job = Job.objects(job_id=job_id).exclude('id').first()
+        return job.to_mongo().to_dict() if job else None
+
+    def unfinished(self):
+        from database.schemas import Job
+        return [j.to_mongo().to_dict() for j in Job.objects(status__in=[QUEUED, RUNNING]).exclude('id')]
+
+    def heartbeat(self, job_ids):
+        from database.schemas import Job
+        Job._get_collection().update_many({'job_id': {'$in': list(job_ids)}},
+                                          {'$set': {'heartbeat_at': datetime.utcnow()}})
+
+    def claim(self, job_id, seen):
+        from database.schemas import Job
+        # Only one process wins the compare-and-set, and a heartbeat since we looked makes it fail
+        now = datetime.utcnow()
+        return Job._get_collection().update_one(
+            {'job_id': job_id, 'updated_at': seen['updated_at'], 'heartbeat_at': seen.get('heartbeat_at')},
+            {'$set': {'status': QUEUED, 'stage': QUEUED, 'progress': 0, 'owner': process_owner(),
+                      'heartbeat_at': now, 'updated_at': now}}
+        ).modified_count == 1
+
+class JobQueue:
+    """Runs registered job handlers on a bounded worker pool"""
+
+    def __init__(self, store, max_workers=4, max_pending=100, stale_after=300, heartbeat_interval=JOB_HEARTBEAT_SECONDS):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.stale_after = timedelta(seconds=stale_after)
+        self.heartbeat_interval = heartbeat_interval
+        self._handlers = {}
+        self._held = set()  # ids of the jobs this process has queued or is running
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created on first use in each process; a forked child gets its own workers
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job-worker')
+                    self._held = set()
+                    threading.Thread(target=self._heartbeats, name='job-heartbeat', daemon=True).start()
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _heartbeats(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                held = list(self._held)
+                if held:
+                    self.store.heartbeat(held)
+            except Exception:
+                logger.exception("Error sending job heartbeats")
+
+    def register(self, kind, handler):
+        """Register handler(job_id, params, progress) for a job kind"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind, params):
+        """Persist a new job and schedule it, returning the job record"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+
+        job = new_job(kind, params)
+        try:
+            pool = self._pool()
+            self.store.create(job)
+            self._held.add(job['job_id'])
+            pool.submit(self._run, job['job_id'], kind, params)
+        except Exception:
+            self._held.discard(job['job_id'])
+            self._slots.release()
+            raise
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def free_slots(self):
+        """How many more jobs can be submitted before QueueFull"""
+        return self._slots._value
+
+    def resume_unfinished(self):
+        """Re-schedule jobs left queued or running by a process that stopped.
+
+        A job still held by a live process is never taken, however long it
+        has been queued or quiet: only a dead owner on this host, or an owner
+        whose heartbeat has stopped for stale_after, gives it up.
+        """
+        resumed = 0
+        pool = self._pool()
+        for job in self.store.unfinished():
+            if job['kind'] not in self._handlers or not is_abandoned(job, self.stale_after):
+                continue
+            if not self._slots.acquire(blocking=False):
+                break
+            if not self.store.claim(job['job_id'], job):
+                self._slots.release()
+                continue
+            self._held.add(job['job_id'])
+            pool.submit(self._run, job['job_id'], job['kind'], job.get('params') or {})
+            resumed += 1
+        return resumed
+
+    def shutdown(self, wait=True):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id, kind, params):
+        def progress(stage, percent):
+            self.store.update(job_id, stage=stage, progress=int(percent))
+
+        started = time.perf_counter()
+        outcome = SUCCEEDED
+        JOBS_RUNNING.inc(kind=kind)
+        try:
+            self.store.update(job_id, status=RUNNING, stage='starting')
+            result = self._handlers[kind](job_id, params, progress)
+            self.store.update(job_id, status=SUCCEEDED, stage='done', progress=100, result=result or {})
+        except Exception as e:
+            outcome = FAILED
+            logger.exception("Job failed", extra={'job_id': job_id, 'kind': kind})
+            self.store.update(job_id, status=FAILED, error=str(e))
+        finally:
+            JOBS_RUNNING.dec(kind=kind)
+            JOB_SECONDS.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+            self._held.discard(job_id)
+            self._slots.release()
+
+def create_job_queue():
+    """Build the job queue configured by the JOB_* environment variables"""
+    backend = os.getenv('JOB_BACKEND', 'mongo')
+    if backend == 'local':
+        store = LocalJobStore()
+    elif backend == 'mongo':
+        store = MongoJobStore()
+    else:
+        raise ValueError(f"Unknown JOB_BACKEND: {backend}")
+    return JobQueue(
+        store,
+        max_workers=int(os.getenv('JOB_WORKERS', 4)),
+        max_pending=int(os.getenv('JOB_MAX_PENDING', 100)),
+        stale_after=int(os.getenv('JOB_STALE_SECONDS', 300))
+    )
@@ -0,0 +1,43 @@
+from flask import Blueprint, jsonify, current_app, redirect, Response, stream_with_context
+from generation.tts import audio_streams
+
+jobs = Blueprint('jobs', __name__)
+
+@jobs.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report the stage, progress and result of a background job"""
+    job = current_app.extensions['job_queue'].get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify({
+        "job_id": job['job_id'],
+        "kind": job['kind'],
+        "status": job['status'],
+        "stage": job.get('stage'),
+        "progress": job.get('progress', 0),
+        "result": job.get('result') or None,
+        "error": job.get('error'),
+        "created_at": job['created_at'].isoformat(),
+        "updated_at": job['updated_at'].isoformat()
+    }), 200
+
+@jobs.route('/<job_id>/audio', methods=['GET'])
+def stream_job_audio(job_id):
+    """Stream a job's audio while it is being synthesized"""
+    stream = audio_streams.get(job_id)
+    if stream is None:
+        # Not running in this process; fall back to the uploaded file once it exists
+        job = current_app.extensions['job_queue'].get(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        audio_url = (job.get('result') or {}).get('audio_url')
+        if audio_url:
+            return redirect(audio_url)
+        return jsonify({"error": "Audio stream is not available yet"}), 404
+
+    return Response(
+        stream_with_context(stream.iter_segments()),
+        mimetype='audio/mpeg',
+        headers={"Cache-Control": "no-store"}
+    )
@@ -0,0 +1,95 @@
+import argparse
+import math
+import mmap
+import os
+import time
+from urllib.parse import quote
+from .mp3 import iter_frames
+
+HLS_DIR = os.path.abspath(os.getenv('HLS_DIR', 'hls'))
+HLS_SEGMENT_SECONDS = float(os.getenv('HLS_SEGMENT_SECONDS', 6))
+
+def plan_segments(buf, target_seconds=HLS_SEGMENT_SECONDS):
+    """Cut an MP3 at frame boundaries into (offset, length, duration) segments.
+
+    The first segment starts at byte 0 so it carries any ID3 tag, and the
+    last one ends at the final complete frame.
+    """
+    segments = []
+    start, duration, end = 0, 0.0, 0
+    for offset, header in iter_frames(buf):
+        if duration >= target_seconds:
+            segments.append((start, offset - start, duration))
+            start, duration = offset, 0.0
+        duration += header.samples / header.sample_rate
+        end = offset + header.length
+    if end > start:
+        segments.append((start, end - start, duration))
+    return segments
+
+def build_playlist(segments, audio_uri):
+    """HLS media playlist addressing each segment as a byte range of one audio file.
+
+    Byte ranges (EXT-X-BYTERANGE, protocol version 4) mean nothing is copied
+    or re-encoded: players fetch ranges of the original MP3.
+    """
+    target = max((math.ceil(duration) for _, _, duration in segments), default=1)
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:4',
+        f'#EXT-X-TARGETDURATION:{target}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD'
+    ]
+    for offset, length, duration in segments:
+        lines.append(f'#EXTINF:{duration:.3f},')
+        lines.append(f'#EXT-X-BYTERANGE:{length}@{offset}')
+        lines.append(audio_uri)
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+def write_playlist(name, buf, audio_uri, target_seconds=HLS_SEGMENT_SECONDS, hls_dir=HLS_DIR):
+    """Segment buf and write <hls_dir>/<name>.m3u8, returning its path"""
+    os.makedirs(hls_dir, exist_ok=True)
+    playlist = build_playlist(plan_segments(buf, target_seconds), audio_uri)
+    path = os.path.join(hls_dir, f'{name}.m3u8')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(playlist)
+    os.replace(tmp_path, path)
+    return path
+
+def segment_file(path, audio_uri=None, target_seconds=HLS_SEGMENT_SECONDS, hls_dir=HLS_DIR):
+    """Write the playlist for a local MP3, memory-mapped rather than read"""
+    filename = os.path.basename(path)
+    audio_uri = audio_uri or f'/audio/{quote(filename)}'
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return write_playlist(os.path.splitext(filename)[0], mm, audio_uri, target_seconds, hls_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write HLS playlists for MP3 files without re-encoding")
+    parser.add_argument('directory', nargs='?', default='podcasts')
+    parser.add_argument('--segment-seconds', type=float, default=HLS_SEGMENT_SECONDS)
+    parser.add_argument('--benchmark', action='store_true', help="report segmenter throughput in MB/s")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    files = sorted(
+        os.path.join(args.directory, name) for name in os.listdir(args.directory) if name.lower().endswith('.mp3')
+    )
+    for path in files:
+        playlist = segment_file(path, target_seconds=args.segment_seconds)
+        print(f"{path} -> {playlist}")
+
+    if args.benchmark:
+        total_bytes = sum(os.path.getsize(path) for path in files) * args.rounds
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            for path in files:
+                with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    plan_segments(mm, args.segment_seconds)
+        elapsed = time.perf_counter() - started
+        print(f"Segmented {total_bytes / 1e6:.1f} MB in {elapsed:.3f}s: {total_bytes / 1e6 / elapsed:.1f} MB/s")
+
+if __name__ == '__main__':
+    main()
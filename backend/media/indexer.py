@@ -0,0 +1,167 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from .mp3 import probe
+
+logger = logging.getLogger(__name__)
+
+PODCASTS_DIR = os.getenv('PODCASTS_DIR', 'podcasts')
+AUDIO_INDEX_PATH = os.getenv('AUDIO_INDEX_PATH', os.path.join(PODCASTS_DIR, '.index.json'))
+REMOTE_PROBE_BYTES = 64 * 1024
+
+def probe_file(path):
+    """(info, mtime, size) for a local MP3, read through mmap"""
+    stat = os.stat(path)
+    if stat.st_size == 0:
+        return None, stat.st_mtime, 0
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return probe(mm), stat.st_mtime, stat.st_size
+
+def probe_url(url, session=None):
+    """(info, mtime, size) for a remote MP3 from one ranged GET of its first bytes"""
+    session = session or requests
+    response = session.get(url, headers={'Range': f'bytes=0-{REMOTE_PROBE_BYTES - 1}'}, timeout=(5, 30))
+    response.raise_for_status()
+    content_range = response.headers.get('Content-Range', '')
+    size = int(content_range.rsplit('/', 1)[1]) if '/' in content_range else len(response.content)
+    last_modified = response.headers.get('Last-Modified')
+    mtime = parsedate_to_datetime(last_modified).timestamp() if last_modified else None
+    return probe(response.content, total_size=size), mtime, size
+
+def _unchanged(entry, mtime, size):
+    return entry.get('size_bytes') == size and entry.get('audio_mtime') == mtime and entry.get('duration') is not None
+
+def _probed(info, mtime, size):
+    """Index entry for a probe result, None if the file is not a readable MP3"""
+    if info is None:
+        return None
+    return {
+        'duration': round(info['duration'], 3),
+        'bitrate': info['bitrate'],
+        'size_bytes': size,
+        'audio_mtime': mtime
+    }
+
+def load_index(index_path=AUDIO_INDEX_PATH):
+    """The directory index written by index_directory, keyed by file name"""
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _indexed(index, path, stat):
+    """The directory index entry for a local file, if it still matches the file"""
+    entry = (index or {}).get(os.path.abspath(path))
+    return entry if entry is not None and _unchanged(entry, stat.st_mtime, stat.st_size) else None
+
+def index_podcast(row, force=False, session=None, index=None):
+    """Probe one podcast's audio and store its metadata, returning True if the document changed.
+
+    Local files with a matching entry in index, directory index entries
+    keyed by absolute path, are taken from it instead of being probed again.
+    """
+    from database.schemas import Podcast
+
+    audio_path = row.get('audio_path') or ''
+    if audio_path.startswith(('http://', 'https://')):
+        # Cheap HEAD first so unchanged remote files are skipped without a download
+        head = (session or requests).head(audio_path, timeout=(5, 30), allow_redirects=True)
+        last_modified = head.headers.get('Last-Modified')
+        size = int(head.headers.get('Content-Length', 0)) or None
+        mtime = parsedate_to_datetime(last_modified).timestamp() if last_modified else None
+        if not force and size and _unchanged(row, mtime, size):
+            return False
+        entry = _probed(*probe_url(audio_path, session))
+    elif os.path.isfile(audio_path):
+        stat = os.stat(audio_path)
+        if not force and _unchanged(row, stat.st_mtime, stat.st_size):
+            return False
+        entry = _indexed(index, audio_path, stat) or _probed(*probe_file(audio_path))
+    else:
+        return False
+
+    if entry is None:
+        return False
+    Podcast.objects(id=row['_id']).update_one(**{f"set__{field}": value for field, value in entry.items()})
+    return True
+
+def index_directory(directory=PODCASTS_DIR, index_path=AUDIO_INDEX_PATH, force=False, workers=8):
+    """Probe every MP3 in a directory into a JSON index, skipping files whose mtime and size are unchanged"""
+    index = load_index(index_path)
+
+    def work(name):
+        path = os.path.join(directory, name)
+        stat = os.stat(path)
+        if not force and name in index and _unchanged(index[name], stat.st_mtime, stat.st_size):
+            return name, None
+        return name, _probed(*probe_file(path))
+
+    names = [name for name in os.listdir(directory) if name.lower().endswith('.mp3')]
+    updated = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for name, entry in executor.map(work, names):
+            if entry is not None:
+                index[name] = entry
+                updated += 1
+    for name in set(index) - set(names):
+        del index[name]
+
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, index_path)
+    return updated, len(names)
+
+def backfill(force=False, workers=8, directory=PODCASTS_DIR, index_path=AUDIO_INDEX_PATH):
+    """Index every podcast document in parallel, returning (updated, total).
+
+    Local files already in the directory index are not probed again.
+    """
+    from database.schemas import Podcast
+
+    rows = Podcast.objects.order_by().only('id', 'audio_path', 'duration', 'size_bytes', 'audio_mtime').as_pymongo()
+    session = requests.Session()
+    session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+
+    directory = os.path.abspath(directory)
+    index = {os.path.join(directory, name): entry for name, entry in load_index(index_path).items()}
+
+    def work(row):
+        try:
+            return index_podcast(row, force=force, session=session, index=index)
+        except Exception:
+            logger.exception("Error indexing podcast", extra={'podcast_id': str(row['_id'])})
+            return False
+
+    total = updated = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for changed in executor.map(work, rows):
+            total += 1
+            updated += changed
+    return updated, total
+
+def main():
+    parser = argparse.ArgumentParser(description="Index duration, bitrate and size of podcast audio")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--force', action='store_true', help="re-probe files even if mtime and size are unchanged")
+    parser.add_argument('--skip-collection', action='store_true', help="only index the podcasts directory")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    updated, total = index_directory(force=args.force, workers=args.workers)
+    print(f"Indexed {updated} of {total} files in {PODCASTS_DIR}")
+    if not args.skip_collection:
+        import database.mongodb  # noqa: F401 connects to MongoDB
+        updated, total = backfill(force=args.force, workers=args.workers)
+        print(f"Updated {updated} of {total} podcast documents")
+    print(f"Done in {time.perf_counter() - started:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+from collections import namedtuple
+
+# Bitrates in kbps by (version is MPEG-1, layer)
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+# Sample rates by version bits: 0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1
+_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000)
+}
+
+FrameHeader = namedtuple('FrameHeader', [
+    'version',  # 1, 2 or 2.5
+    'layer',
+    'bitrate',  # bits per second
+    'sample_rate',
+    'channels',
+    'samples',  # samples per frame
+    'length'  # frame length in bytes, header included
+])
+
+def parse_header(buf, offset):
+    """Parse the 4-byte frame header at offset, or return None if there isn't a valid one"""
+    if offset + 4 > len(buf) or buf[offset] != 0xFF or buf[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = buf[offset + 1], buf[offset + 2], buf[offset + 3]
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        # Reserved values, or free-format streams, which have no fixed frame length
+        return None
+
+    mpeg1 = version_bits == 3
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][rate_index]
+    padding = (b2 >> 1) & 0x01
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+
+    return FrameHeader(
+        version=1 if mpeg1 else (2 if version_bits == 2 else 2.5),
+        layer=layer,
+        bitrate=bitrate,
+        sample_rate=sample_rate,
+        channels=1 if (b3 >> 6) == 3 else 2,
+        samples=samples,
+        length=length
+    )
+
+def id3v2_end(buf):
+    """Offset of the first byte after a leading ID3v2 tag (0 if there is none)"""
+    if len(buf) < 10 or buf[:3] != b'ID3':
+        return 0
+    size = (buf[6] << 21) | (buf[7] << 14) | (buf[8] << 7) | buf[9]
+    return 10 + size + (10 if buf[5] & 0x10 else 0)
+
+def audio_end(buf):
+    """Offset where audio data stops, before a trailing ID3v1 tag"""
+    end = len(buf)
+    if end >= 128 and buf[end - 128:end - 125] == b'TAG':
+        end -= 128
+    return end
+
+def _find_sync(buf, offset, end):
+    """Next offset holding two consecutive valid frame headers, or -1"""
+    while True:
+        offset = buf.find(b'\xff', offset, end)
+        if offset < 0:
+            return -1
+        header = parse_header(buf, offset)
+        if header is not None:
+            following = offset + header.length
+            # Accept the final frame on its own, otherwise require the next header to line up
+            if following >= end or parse_header(buf, following) is not None:
+                return offset
+        offset += 1
+
+def iter_frames(buf, start=None):
+    """Yield (offset, FrameHeader) for every MPEG audio frame in buf.
+
+    buf can be bytes or an mmap. Nothing is decoded; frames are found by
+    walking header lengths and resyncing past any junk between them.
+    """
+    end = audio_end(buf)
+    offset = id3v2_end(buf) if start is None else start
+    offset = _find_sync(buf, offset, end)
+    while 0 <= offset < end:
+        header = parse_header(buf, offset)
+        if header is None:
+            offset = _find_sync(buf, offset + 1, end)
+            continue
+        if offset + header.length > end:
+            return
+        yield offset, header
+        offset += header.length
+
+def _side_info_size(header):
+    if header.version == 1:
+        return 17 if header.channels == 1 else 32
+    return 9 if header.channels == 1 else 17
+
+def _read_vbr_header(buf, offset, header):
+    """(frames, bytes) from a Xing/Info or VBRI header in the first frame, if present"""
+    xing = offset + 4 + _side_info_size(header)
+    if buf[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = int.from_bytes(buf[xing + 4:xing + 8], 'big')
+        position = xing + 8
+        frames = data_bytes = None
+        if flags & 0x1:
+            frames = int.from_bytes(buf[position:position + 4], 'big')
+            position += 4
+        if flags & 0x2:
+            data_bytes = int.from_bytes(buf[position:position + 4], 'big')
+        return frames, data_bytes
+    vbri = offset + 4 + 32
+    if buf[vbri:vbri + 4] == b'VBRI':
+        return int.from_bytes(buf[vbri + 14:vbri + 18], 'big'), int.from_bytes(buf[vbri + 10:vbri + 14], 'big')
+    return None, None
+
+def _has_vbr_header(buf, offset, header):
+    xing = offset + 4 + _side_info_size(header)
+    return buf[xing:xing + 4] in (b'Xing', b'Info') or buf[offset + 36:offset + 40] == b'VBRI'
+
+def audio_frames(buf):
+    """Only the audio frames of buf, back to back.
+
+    Tags, junk between frames and a leading Xing/Info/VBRI frame are dropped,
+    so the results for several clips can simply be concatenated.
+    """
+    view = memoryview(buf)
+    frames = []
+    for index, (offset, header) in enumerate(iter_frames(buf)):
+        if index == 0 and _has_vbr_header(buf, offset, header):
+            continue
+        frames.append(view[offset:offset + header.length])
+    return b''.join(frames)
+
+def probe(buf, total_size=None, sample_frames=8):
+    """Duration, bitrate and format of an MP3 from its headers alone.
+
+    Uses the Xing/Info or VBRI frame count when there is one. Otherwise, if
+    the first frames share a bitrate, the stream is treated as CBR and sized
+    from the byte count. Only a VBR file without a VBR header gets a full
+    frame walk. buf may be just the start of the file when total_size says
+    how big the whole file is.
+    """
+    total_size = len(buf) if total_size is None else total_size
+    frames = iter_frames(buf)
+    first = next(frames, None)
+    if first is None:
+        return None
+    offset, header = first
+    info = {
+        'sample_rate': header.sample_rate,
+        'channels': header.channels,
+        'size_bytes': total_size
+    }
+
+    vbr_frames, vbr_bytes = _read_vbr_header(buf, offset, header)
+    if vbr_frames:
+        duration = vbr_frames * header.samples / header.sample_rate
+        audio_bytes = vbr_bytes or (total_size - offset)
+        info.update(duration=duration, bitrate=int(audio_bytes * 8 / duration) if duration else header.bitrate)
+        return info
+
+    bitrates = {header.bitrate}
+    for _, (_, next_header) in zip(range(sample_frames), frames):
+        bitrates.add(next_header.bitrate)
+    if len(bitrates) == 1 or len(buf) < total_size:
+        audio_bytes = total_size - offset - (128 if len(buf) == total_size and audio_end(buf) < len(buf) else 0)
+        info.update(duration=audio_bytes * 8 / header.bitrate, bitrate=header.bitrate)
+        return info
+
+    samples = total_bytes = 0
+    for _, frame in iter_frames(buf):
+        samples += frame.samples
+        total_bytes += frame.length
+    duration = samples / header.sample_rate
+    info.update(duration=duration, bitrate=int(total_bytes * 8 / duration) if duration else header.bitrate)
+    return info
+
+def audio_info(data):
+    """Metadata fields for a Podcast document from in-memory MP3 bytes"""
+    info = probe(data)
+    if info is None:
+        return {}
+    return {
+        'duration': round(info['duration'], 3),
+        'bitrate': info['bitrate'],
+        'size_bytes': info['size_bytes']
+    }
@@ -0,0 +1,91 @@
+import mimetypes
+import os
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, jsonify
+from werkzeug.http import http_date, is_resource_modified
+from werkzeug.security import safe_join
+from werkzeug.wsgi import FileWrapper, _RangeWrapper
+from .hls import HLS_DIR
+
+PODCASTS_DIR = os.path.abspath(os.getenv('PODCASTS_DIR', 'podcasts'))
+AUDIO_BLOCK_SIZE = 64 * 1024
+AUDIO_MAX_AGE = int(os.getenv('AUDIO_MAX_AGE', 24 * 3600))
+
+media = Blueprint('media', __name__)
+
+def _zero_copy_wrapper():
+    """The server's wsgi.file_wrapper if it can sendfile, else None"""
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    # werkzeug's development server hands out its own FileWrapper, which reads in Python
+    if file_wrapper is None or file_wrapper is FileWrapper:
+        return None
+    return file_wrapper
+
+def _file_body(path, start, length):
+    """Response body for a byte range, sent with sendfile when the server supports it"""
+    f = open(path, 'rb')
+    file_wrapper = _zero_copy_wrapper()
+    if file_wrapper is not None:
+        # Servers sendfile from the file's current offset and stop at Content-Length
+        f.seek(start)
+        return file_wrapper(f, AUDIO_BLOCK_SIZE)
+    return _RangeWrapper(FileWrapper(f, AUDIO_BLOCK_SIZE), start, length)
+
+def _if_range_matches(etag, mtime):
+    """True when there is no If-Range header or it still matches the file"""
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return int(mtime) <= if_range.date.timestamp()
+    return True
+
+@media.route('/audio/<path:filename>', methods=['GET', 'HEAD'])
+def serve_audio(filename):
+    """Serve a local podcast file with Range, ETag and Last-Modified support"""
+    path = safe_join(PODCASTS_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({"error": "Audio not found"}), 404
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f"{stat.st_mtime_ns:x}-{size:x}"
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': f"public, max-age={AUDIO_MAX_AGE}"
+    }
+    mimetype = mimetypes.guess_type(path)[0] or 'audio/mpeg'
+
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified, ignore_if_range=True):
+        return Response(status=304, headers=headers)
+
+    start, length, status = 0, size, 200
+    byte_range = request.range
+    # If-Range: only honour the range when the client's copy is still current. Multiple
+    # ranges are not served as multipart; RFC 9110 lets us ignore them and send it all
+    if byte_range is not None and len(byte_range.ranges) == 1 and _if_range_matches(etag, stat.st_mtime):
+        span = byte_range.range_for_length(size)
+        if span is None:
+            headers['Content-Range'] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        start, stop = span
+        length = stop - start
+        status = 206
+        headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+
+    headers['Content-Length'] = str(length)
+    body = [] if request.method == 'HEAD' else _file_body(path, start, length)
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+
+@media.route('/hls/<name>.m3u8', methods=['GET'])
+def serve_playlist(name):
+    """Serve the HLS playlist written for a podcast"""
+    path = safe_join(HLS_DIR, f"{name}.m3u8")
+    if path is None or not os.path.isfile(path):
+        return jsonify({"error": "Playlist not found"}), 404
+    with open(path, 'rb') as f:
+        playlist = f.read()
+    return Response(playlist, mimetype='application/vnd.apple.mpegurl', headers={'Cache-Control': 'no-cache'})
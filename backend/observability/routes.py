@@ -0,0 +1,68 @@
+import os
+import time
+from flask import Blueprint, Response, request, g, jsonify
+from observability.metrics import registry
+from observability.logs import dropped_records
+
+observability = Blueprint('observability', __name__)
+
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', "Flask request latency by route template", ('route', 'method', 'status')
+)
+REQUESTS_IN_FLIGHT = registry.gauge('http_requests_in_flight', "Requests currently being handled")
+_process_started = time.time()
+
+registry.callback_gauge('log_records_dropped', "Log records dropped because the log queue was full", dropped_records)
+
+@observability.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@observability.route('/health/live', methods=['GET'])
+def liveness():
+    """The process is up and serving requests; no dependencies are checked"""
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.time() - _process_started, 3)
+    }), 200
+
+@observability.route('/health/ready', methods=['GET'])
+def readiness():
+    """Whether this worker can serve traffic: MongoDB must answer a ping"""
+    from database.mongodb import DatabaseOperations
+    checks = {}
+    started = time.perf_counter()
+    try:
+        DatabaseOperations.ping()
+        checks['mongodb'] = {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        checks['mongodb'] = {"ok": False, "error": str(e)}
+    ready = all(check['ok'] for check in checks.values())
+    return jsonify({"status": "ready" if ready else "unavailable", "checks": checks}), 200 if ready else 503
+
+def instrument(app):
+    """Time every request by its route template rather than its raw path"""
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            REQUESTS_IN_FLIGHT.dec()
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started, route=route, method=request.method, status=response.status_code
+            )
+        return response
+
+    @app.teardown_request
+    def release_in_flight(error):
+        # after_request is skipped when a handler raises past the error handlers
+        if g.pop('request_started', None) is not None:
+            REQUESTS_IN_FLIGHT.dec()
@@ -0,0 +1,62 @@
+import os
+import time
+from .http import PROVIDER_POOL_SIZE, PROVIDER_CONNECT_TIMEOUT, aio_session, aio_timeout, araise_for_status
+
+CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME', 'dvgyv4sgq')
+
+class CloudinaryBlobStore:
+    """Blob provider uploading to Cloudinary and returning the secure URL"""
+    name = 'cloudinary'
+    rate_limit = 'cloudinary'
+
+    def __init__(self, pool_size=PROVIDER_POOL_SIZE):
+        import cloudinary
+        import cloudinary.uploader
+        import cloudinary.utils
+        import urllib3
+        cloudinary.config(
+            cloud_name=CLOUDINARY_CLOUD_NAME,
+            api_key=os.getenv('CLOUDINARY_API_KEY'),
+            api_secret=os.getenv('CLOUDINARY_API_SECRET')
+        )
+        self._config = cloudinary.config()
+        self._utils = cloudinary.utils
+        self._uploader = cloudinary.uploader
+        self._timeout = urllib3.Timeout
+        # The SDK's default pool keeps a single connection per host
+        cloudinary.uploader._http = cloudinary.utils.get_http_connector(
+            cloudinary.config(), dict(cloudinary.CERT_KWARGS, maxsize=pool_size)
+        )
+
+    def upload(self, source, folder, resource_type='image', filename='upload', timeout=60):
+        """Upload bytes (straight from memory) or a remote URL"""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = (filename, bytes(source))
+        result = self._uploader.upload(
+            source,
+            folder=folder,
+            resource_type=resource_type,
+            timeout=self._timeout(connect=PROVIDER_CONNECT_TIMEOUT, read=timeout)
+        )
+        return result['secure_url']
+
+    async def aupload(self, source, folder, resource_type='image', filename='upload', timeout=60):
+        """upload() over the shared aiohttp session, as a signed multipart POST"""
+        import aiohttp
+        params = {'folder': folder, 'timestamp': int(time.time())}
+        form = aiohttp.FormData()
+        for key, value in params.items():
+            form.add_field(key, str(value))
+        form.add_field('api_key', self._config.api_key or '')
+        form.add_field('signature', self._utils.api_sign_request(params, self._config.api_secret or ''))
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            form.add_field('file', bytes(source), filename=filename)
+        else:
+            form.add_field('file', source)
+        async with aio_session().post(
+            self._utils.cloudinary_api_url('upload', resource_type=resource_type),
+            data=form,
+            timeout=aio_timeout(timeout)
+        ) as response:
+            await araise_for_status(self.name, response)
+            return (await response.json())['secure_url']
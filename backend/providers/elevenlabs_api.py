@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+from .http import pooled_session, timeouts, raise_for_status, aio_session, aio_timeout, araise_for_status
+
+ELEVENLABS_API_URL = os.getenv('ELEVENLABS_API_URL', 'https://api.elevenlabs.io/v1')
+# JSON voice_settings sent with every request, e.g. {"stability": 0.5, "similarity_boost": 0.75}
+ELEVENLABS_VOICE_SETTINGS = json.loads(os.getenv('ELEVENLABS_VOICE_SETTINGS') or 'null')
+# Premade voices, so the common names need no /voices lookup
+PREMADE_VOICES = {
+    'Rachel': '21m00Tcm4TlvDq8ikWAM',
+    'Domi': 'AZnzlk1XvdvUeBnXmlld',
+    'Bella': 'EXAVITQu4vr4xnSDxMaL',
+    'Antoni': 'ErXwobaYiN019PkySvjV',
+    'Elli': 'MF3mGyEYCl7XYWbV9V6O',
+    'Josh': 'TxGEqnHWrfWFTfGW9XjX',
+    'Arnold': 'VR6AewLTigWG4xSOukaG',
+    'Adam': 'pNInz6obpgDQGcFmaJgB',
+    'Sam': 'yoZ06aMxZJJ28mfd3POQ'
+}
+
+class ElevenLabsTTS:
+    """TTS provider calling the ElevenLabs REST API over a pooled session.
+
+    The elevenlabs SDK opens a new connection per request and looks the voice
+    name up with an extra API call every time; here voice ids are resolved
+    once and connections are reused.
+    """
+    name = 'elevenlabs'
+    rate_limit = 'elevenlabs'
+
+    def __init__(self, api_key=None, session=None, voice_settings=ELEVENLABS_VOICE_SETTINGS):
+        self.api_key = api_key or os.getenv('ELEVENLABS_API_KEY')
+        self.voice_settings = voice_settings
+        self.session = session or pooled_session()
+        self._voices = dict(PREMADE_VOICES)
+        self._voices_lock = threading.Lock()
+
+    def _body(self, text, model):
+        body = {'text': text, 'model_id': model}
+        if self.voice_settings:
+            body['voice_settings'] = self.voice_settings
+        return body
+
+    def _headers(self):
+        return {'xi-api-key': self.api_key} if self.api_key else {}
+
+    def voice_id(self, voice, timeout=30):
+        with self._voices_lock:
+            if voice in self._voices:
+                return self._voices[voice]
+        response = self.session.get(f"{ELEVENLABS_API_URL}/voices", headers=self._headers(), timeout=timeouts(timeout))
+        raise_for_status(self.name, response)
+        return self._remember_voices(response.json(), voice)
+
+    def _remember_voices(self, payload, voice):
+        with self._voices_lock:
+            for entry in payload.get('voices', []):
+                self._voices[entry['name']] = entry['voice_id']
+            # Anything else is taken to be a voice id already
+            return self._voices.setdefault(voice, voice)
+
+    async def avoice_id(self, voice, timeout=30):
+        with self._voices_lock:
+            if voice in self._voices:
+                return self._voices[voice]
+        async with aio_session().get(f"{ELEVENLABS_API_URL}/voices", headers=self._headers(),
+                                     timeout=aio_timeout(timeout)) as response:
+            await araise_for_status(self.name, response)
+            return self._remember_voices(await response.json(), voice)
+
+    def synthesize(self, text, voice, model, timeout):
+        response = self.session.post(
+            f"{ELEVENLABS_API_URL}/text-to-speech/{self.voice_id(voice)}",
+            json=self._body(text, model),
+            headers=dict(self._headers(), accept='audio/mpeg'),
+            timeout=timeouts(timeout)
+        )
+        raise_for_status(self.name, response)
+        return response.content
+
+    async def asynthesize(self, text, voice, model, timeout):
+        async with aio_session().post(
+            f"{ELEVENLABS_API_URL}/text-to-speech/{await self.avoice_id(voice)}",
+            json=self._body(text, model),
+            headers=dict(self._headers(), accept='audio/mpeg'),
+            timeout=aio_timeout(timeout)
+        ) as response:
+            await araise_for_status(self.name, response)
+            return await response.read()
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from .http import ProviderError
+
+FAKE_HOST = 'https://fake-provider.test'
+_WORDS = (
+    'podcast listeners story idea future people world question answer research history simple '
+    'example change system practice energy signal network pattern model language voice culture'
+).split()
+
+# One frame of MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono: header then silence
+_MP3_FRAME = b'\xff\xfb\x90\xc4' + bytes(413)
+_FRAME_SECONDS = 1152 / 44100
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+def _fraction(*parts):
+    """Deterministic number in [0, 1) from the given values"""
+    digest = hashlib.sha256('\x00'.join(str(part) for part in parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+class _FakeProvider:
+    """Local stand-in that sleeps like a remote call and returns deterministic output.
+
+    Latency is latency_ms, spread by +/- jitter, and the same request always
+    takes the same time. error_rate makes that share of attempts fail with a
+    retryable 503.
+    """
+    kind = None
+
+    def __init__(self, latency_ms=None, jitter=None, error_rate=None):
+        prefix = f"FAKE_{self.kind.upper()}"
+        self.latency_ms = _env_float(f"{prefix}_LATENCY_MS", self.default_latency_ms) if latency_ms is None else latency_ms
+        self.jitter = _env_float('FAKE_JITTER', 0.2) if jitter is None else jitter
+        self.error_rate = _env_float('FAKE_ERROR_RATE', 0) if error_rate is None else error_rate
+        self._attempts = Counter()
+        self._lock = threading.Lock()
+
+    def _attempt(self, key, extra_ms):
+        """(seconds to sleep, whether this attempt fails)"""
+        with self._lock:
+            self._attempts[key] += 1
+            attempt = self._attempts[key]
+        spread = 1 + self.jitter * (2 * _fraction(key, 'latency') - 1)
+        failed = bool(self.error_rate) and _fraction(key, attempt) < self.error_rate
+        return max(0.0, self.latency_ms * spread + extra_ms) / 1000, failed
+
+    def _fail(self):
+        raise ProviderError(self.name, "HTTP 503: simulated failure", 503)
+
+    def _call(self, key, extra_ms=0.0):
+        delay, failed = self._attempt(key, extra_ms)
+        time.sleep(delay)
+        if failed:
+            self._fail()
+
+    async def _acall(self, key, extra_ms=0.0):
+        delay, failed = self._attempt(key, extra_ms)
+        await asyncio.sleep(delay)
+        if failed:
+            self._fail()
+
+class FakeLLM(_FakeProvider):
+    name = 'fake-llm'
+    kind = 'llm'
+    rate_limit = 'openai_chat'
+    default_latency_ms = 800
+
+    def __init__(self, script_chars=None, **kwargs):
+        super().__init__(**kwargs)
+        self.script_chars = int(_env_float('FAKE_SCRIPT_CHARS', 3000) if script_chars is None else script_chars)
+
+    def complete(self, system_prompt, user_prompt, model, timeout):
+        key = (system_prompt, user_prompt, model)
+        self._call(key)
+        return self._script(key)
+
+    async def acomplete(self, system_prompt, user_prompt, model, timeout):
+        key = (system_prompt, user_prompt, model)
+        await self._acall(key)
+        return self._script(key)
+
+    def _script(self, key):
+        seed = hashlib.sha256(repr(key).encode('utf-8')).digest()
+        sentences, length, i = [], 0, 0
+        while length < self.script_chars:
+            words = [_WORDS[(seed[(i + j) % len(seed)] + i * j) % len(_WORDS)] for j in range(12)]
+            sentence = ' '.join(words).capitalize() + '.'
+            sentences.append(sentence + ('\n\n' if i % 5 == 4 else ' '))
+            length += len(sentence) + 1
+            i += 1
+        return ''.join(sentences).strip()
+
+class FakeImages(_FakeProvider):
+    name = 'fake-image'
+    kind = 'image'
+    rate_limit = 'dalle'
+    default_latency_ms = 1500
+
+    def generate(self, prompt, model, size, timeout):
+        key = (prompt, model, size)
+        self._call(key)
+        return self._url(key)
+
+    async def agenerate(self, prompt, model, size, timeout):
+        key = (prompt, model, size)
+        await self._acall(key)
+        return self._url(key)
+
+    def _url(self, key):
+        return f"{FAKE_HOST}/images/{hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:24]}.png"
+
+class FakeTTS(_FakeProvider):
+    """Silent CBR MP3 lasting as long as the text would take to read aloud"""
+    name = 'fake-tts'
+    kind = 'tts'
+    rate_limit = 'elevenlabs'
+    default_latency_ms = 300
+    voice_settings = None
+
+    def __init__(self, chars_per_second=None, **kwargs):
+        super().__init__(**kwargs)
+        self.chars_per_second = _env_float('FAKE_TTS_CHARS_PER_SECOND', 15) if chars_per_second is None else chars_per_second
+
+    def synthesize(self, text, voice, model, timeout):
+        self._call((text, voice, model))
+        return self._audio(text)
+
+    async def asynthesize(self, text, voice, model, timeout):
+        await self._acall((text, voice, model))
+        return self._audio(text)
+
+    def _audio(self, text):
+        frames = max(1, int(len(text) / self.chars_per_second / _FRAME_SECONDS))
+        return _MP3_FRAME * frames
+
+class FakeBlobStore(_FakeProvider):
+    """Upload stand-in whose latency also grows with the payload size"""
+    name = 'fake-blob'
+    kind = 'blob'
+    rate_limit = 'cloudinary'
+    default_latency_ms = 200
+
+    def __init__(self, mbps=None, **kwargs):
+        super().__init__(**kwargs)
+        self.mbps = _env_float('FAKE_BLOB_MBPS', 50) if mbps is None else mbps
+
+    def _describe(self, source):
+        if isinstance(source, str):
+            return hashlib.sha256(source.encode('utf-8')).hexdigest(), 0
+        return hashlib.sha256(source).hexdigest(), len(source)
+
+    def _transfer_ms(self, size):
+        return size * 8 / (self.mbps * 1e6) * 1000
+
+    def _url(self, digest, folder, resource_type):
+        extension = 'mp3' if resource_type == 'video' else 'png'
+        return f"{FAKE_HOST}/{folder}/{digest[:24]}.{extension}"
+
+    def upload(self, source, folder, resource_type='image', filename='upload', timeout=60):
+        digest, size = self._describe(source)
+        self._call((digest, folder), extra_ms=self._transfer_ms(size))
+        return self._url(digest, folder, resource_type)
+
+    async def aupload(self, source, folder, resource_type='image', filename='upload', timeout=60):
+        digest, size = self._describe(source)
+        await self._acall((digest, folder), extra_ms=self._transfer_ms(size))
+        return self._url(digest, folder, resource_type)
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+import weakref
+import requests
+from requests.adapters import HTTPAdapter
+
+PROVIDER_POOL_SIZE = int(os.getenv('PROVIDER_POOL_SIZE', 20))
+PROVIDER_CONNECT_TIMEOUT = float(os.getenv('PROVIDER_CONNECT_TIMEOUT', 5))
+
+class ProviderError(Exception):
+    """An upstream API returned an error status"""
+
+    def __init__(self, provider, message, http_status=None, retry_after=None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.http_status = http_status
+        self.retry_after = retry_after
+
+def pooled_session(pool_size=PROVIDER_POOL_SIZE):
+    """requests.Session keeping up to pool_size keep-alive connections per host.
+
+    Retries are left to generation.ratelimit.call_provider, so the adapter
+    never retries on its own.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def timeouts(read_timeout):
+    """(connect, read) timeout pair: connects fail fast, reads may be slow"""
+    return (PROVIDER_CONNECT_TIMEOUT, read_timeout)
+
+def raise_for_status(provider, response):
+    """Raise ProviderError for a 4xx/5xx response, keeping its status and Retry-After"""
+    if response.status_code < 400:
+        return
+    try:
+        detail = response.json().get('detail', response.text)
+        message = detail.get('message', str(detail)) if isinstance(detail, dict) else str(detail)
+    except ValueError:
+        message = response.text[:200]
+    try:
+        retry_after = float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        retry_after = None
+    raise ProviderError(provider, f"HTTP {response.status_code}: {message}", response.status_code, retry_after)
+
+_aio_sessions = weakref.WeakKeyDictionary()  # event loop -> aiohttp.ClientSession
+
+def aio_session(pool_size=PROVIDER_POOL_SIZE):
+    """The aiohttp.ClientSession shared by every provider on the running event loop.
+
+    Like pooled_session(), it keeps up to pool_size connections per host and
+    never retries on its own. Created on first use inside the loop.
+    """
+    import aiohttp
+    loop = asyncio.get_running_loop()
+    session = _aio_sessions.get(loop)
+    if session is None or session.closed:
+        session = _aio_sessions[loop] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, limit_per_host=pool_size)
+        )
+    return session
+
+async def close_aio_session():
+    session = _aio_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+def aio_timeout(read_timeout):
+    """aiohttp counterpart of timeouts(): connects fail fast, reads may be slow"""
+    import aiohttp
+    return aiohttp.ClientTimeout(sock_connect=PROVIDER_CONNECT_TIMEOUT, sock_read=read_timeout)
+
+async def araise_for_status(provider, response):
+    """raise_for_status() for an aiohttp response"""
+    if response.status < 400:
+        return
+    text = await response.text()
+    try:
+        detail = json.loads(text)
+        detail = detail.get('detail', detail.get('error', text)) if isinstance(detail, dict) else detail
+        message = detail.get('message', str(detail)) if isinstance(detail, dict) else str(detail)
+    except ValueError:
+        message = text[:200]
+    try:
+        retry_after = float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        retry_after = None
+    raise ProviderError(provider, f"HTTP {response.status}: {message}", response.status, retry_after)
@@ -0,0 +1,74 @@
+import os
+from .http import pooled_session, timeouts, aio_session, aio_timeout, araise_for_status
+
+OPENAI_API_URL = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+
+class _OpenAIProvider:
+    def __init__(self, api_key=None, session=None):
+        import openai
+        self._openai = openai
+        openai.api_key = api_key or openai.api_key or os.getenv('OPENAI_API_KEY')
+        # One pooled session for every thread instead of the SDK's session per thread
+        openai.requestssession = session or pooled_session()
+
+    async def _apost(self, path, payload, timeout):
+        # The 0.27 SDK opens an aiohttp session per call unless one is set in a
+        # context variable, so the REST API is called directly on the shared session
+        async with aio_session().post(
+            f"{OPENAI_API_URL}{path}",
+            json=payload,
+            headers={'Authorization': f"Bearer {self._openai.api_key}"},
+            timeout=aio_timeout(timeout)
+        ) as response:
+            await araise_for_status(self.name, response)
+            return await response.json()
+
+class OpenAIChat(_OpenAIProvider):
+    """LLM provider backed by the OpenAI chat completions API"""
+    name = 'openai'
+    rate_limit = 'openai_chat'
+
+    def complete(self, system_prompt, user_prompt, model, timeout):
+        response = self._openai.ChatCompletion.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            request_timeout=timeouts(timeout)
+        )
+        return response.choices[0].message.content
+
+    async def acomplete(self, system_prompt, user_prompt, model, timeout):
+        response = await self._apost('/chat/completions', {
+            'model': model,
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+        }, timeout)
+        return response['choices'][0]['message']['content']
+
+class DalleImages(_OpenAIProvider):
+    """Image provider backed by DALL-E, returning the generated image URL"""
+    name = 'dalle'
+    rate_limit = 'dalle'
+
+    def generate(self, prompt, model, size, timeout):
+        image_response = self._openai.Image.create(
+            prompt=prompt,
+            n=1,
+            size=size,
+            model=model,
+            request_timeout=timeouts(timeout)
+        )
+        return image_response['data'][0]['url']
+
+    async def agenerate(self, prompt, model, size, timeout):
+        image_response = await self._apost('/images/generations', {
+            'prompt': prompt,
+            'n': 1,
+            'size': size,
+            'model': model
+        }, timeout)
+        return image_response['data'][0]['url']
@@ -0,0 +1,52 @@
+import importlib
+import os
+import threading
+
+# PROVIDER_BACKEND picks real or fake for every kind; <KIND>_PROVIDER overrides one
+PROVIDER_BACKEND = os.getenv('PROVIDER_BACKEND', 'real')
+PROVIDERS = {
+    'real': {
+        'llm': 'providers.openai_api:OpenAIChat',
+        'image': 'providers.openai_api:DalleImages',
+        'tts': 'providers.elevenlabs_api:ElevenLabsTTS',
+        'blob': 'providers.cloudinary_api:CloudinaryBlobStore'
+    },
+    'fake': {
+        'llm': 'providers.fake:FakeLLM',
+        'image': 'providers.fake:FakeImages',
+        'tts': 'providers.fake:FakeTTS',
+        'blob': 'providers.fake:FakeBlobStore'
+    }
+}
+
+_instances = {}
+_pid = None
+_lock = threading.Lock()
+
+def _create(kind):
+    backend = os.getenv(f"{kind.upper()}_PROVIDER", PROVIDER_BACKEND)
+    module_name, class_name = PROVIDERS[backend][kind].split(':')
+    # Imported here so the SDKs of unused backends are never loaded
+    return getattr(importlib.import_module(module_name), class_name)()
+
+def _reset_after_fork():
+    global _pid
+    # Pooled connections must not be shared with a forked parent
+    if _pid != os.getpid():
+        _instances.clear()
+        _pid = os.getpid()
+
+def get_provider(kind):
+    """The llm, image, tts or blob provider for this process, created on first use"""
+    with _lock:
+        _reset_after_fork()
+        provider = _instances.get(kind)
+        if provider is None:
+            provider = _instances[kind] = _create(kind)
+        return provider
+
+def set_provider(kind, provider):
+    """Replace the provider for a kind in this process, e.g. with a configured fake"""
+    with _lock:
+        _reset_after_fork()
+        _instances[kind] = provider
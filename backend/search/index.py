@@ -0,0 +1,384 @@
+"""In-process full-text index over podcast topics and scripts.
+
+    python -m search.index rebuild      # reindex every podcast and write a snapshot
+    python -m search.index stats
+"""
+import argparse
+import bisect
+import json
+import logging
+import math
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from database.schemas import Podcast
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', os.path.join('cache', 'search.index'))
+SEARCH_REFRESH_INTERVAL = float(os.getenv('SEARCH_REFRESH_INTERVAL', 60))
+SEARCH_SNAPSHOT_INTERVAL = float(os.getenv('SEARCH_SNAPSHOT_INTERVAL', 600))
+# Podcasts built in another worker may be inserted a little after their created_at
+SEARCH_REFRESH_OVERLAP = timedelta(seconds=float(os.getenv('SEARCH_REFRESH_OVERLAP', 600)))
+# A topic word counts as this many script words
+SEARCH_TOPIC_WEIGHT = int(os.getenv('SEARCH_TOPIC_WEIGHT', 3))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TF = 0xFFFF
+
+SNAPSHOT_MAGIC = b'AYSI\x01'
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just let me more most my myself no nor
+not now of off on once only or other our ours ourselves out over own same she should so some such than that
+the their theirs them themselves then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+_WORD = re.compile(r"[^\W_]+")
+
+def words(text):
+    return _WORD.findall((text or '').lower())
+
+def tokenize(text):
+    """Lowercased index terms of a text, stopwords dropped"""
+    return [word for word in words(text) if word not in STOPWORDS]
+
+class SearchIndex:
+    """BM25 inverted index kept in memory in every worker.
+
+    Topic and script share one postings list per term, with each topic word
+    weighted SEARCH_TOPIC_WEIGHT times. Documents are numbered in the order
+    they are added and postings are (doc, tf) arrays appended in that order,
+    so indexing a new podcast only appends. A second set of postings over
+    topic words, with their sorted vocabulary, serves prefix autocomplete.
+
+    Each process loads the on-disk snapshot, then a background thread pulls
+    podcasts created since, so restarts only index what is new. Offline tools
+    pass background=False and fill the index themselves.
+    """
+
+    def __init__(self, path=SEARCH_INDEX_PATH, refresh_interval=SEARCH_REFRESH_INTERVAL,
+                 snapshot_interval=SEARCH_SNAPSHOT_INTERVAL, topic_weight=SEARCH_TOPIC_WEIGHT, background=True):
+        self.path = path
+        self.background = background
+        self.refresh_interval = refresh_interval
+        self.snapshot_interval = snapshot_interval
+        self.topic_weight = topic_weight
+        self._reset()
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._pid = None
+        self._thread = None
+
+    def _reset(self):
+        self._ids = []  # doc number -> podcast id
+        self._docs = {}  # podcast id -> doc number
+        self._topics = []  # doc number -> topic
+        self._lengths = array('I')  # doc number -> weighted term count
+        self._total_length = 0
+        self._postings = {}  # term -> (doc numbers, term frequencies)
+        self._topic_postings = {}  # topic term -> doc numbers
+        self._vocabulary = []  # sorted topic terms
+        self._since = None  # newest created_at indexed
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add_podcast(self, podcast_id, topic, script='', created_at=None):
+        """Index a podcast; ids already in the index are ignored"""
+        podcast_id = str(podcast_id)
+        if podcast_id in self._docs:
+            return
+        topic_terms = tokenize(topic)
+        counts = Counter(tokenize(script))
+        for term in topic_terms:
+            counts[term] += self.topic_weight
+        with self._lock:
+            self._add(podcast_id, topic or '', counts, set(topic_terms), created_at)
+
+    def _add(self, podcast_id, topic, counts, topic_terms, created_at):
+        if podcast_id in self._docs:
+            return
+        doc = len(self._ids)
+        self._ids.append(podcast_id)
+        self._docs[podcast_id] = doc
+        self._topics.append(topic)
+        length = sum(counts.values())
+        self._lengths.append(length)
+        self._total_length += length
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array('I'), array('H'))
+            postings[0].append(doc)
+            postings[1].append(min(tf, MAX_TF))
+        for term in topic_terms:
+            docs = self._topic_postings.get(term)
+            if docs is None:
+                docs = self._topic_postings[term] = array('I')
+                bisect.insort(self._vocabulary, term)
+            docs.append(doc)
+        if created_at is not None and (self._since is None or created_at > self._since):
+            self._since = created_at
+        self._dirty = True
+
+    def search(self, query, limit=10, offset=0):
+        """One page of BM25-ranked (podcast id, score) pairs, and the total number of matches.
+
+        Scores are accumulated with numpy over zero-copy views of the
+        postings arrays, so a query costs a few vectorised passes over its
+        terms' postings rather than a Python loop per document.
+        """
+        import numpy as np
+        self._ensure_started()
+        terms = set(tokenize(query))
+        with self._lock:
+            total_docs = len(self._ids)
+            terms = [term for term in terms if term in self._postings]
+            if not terms or not total_docs:
+                return [], 0
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            avgdl = self._total_length / total_docs or 1.0
+            scores = np.zeros(total_docs)
+            for term in terms:
+                docs, tfs = self._postings[term]
+                df = len(docs)
+                weight = math.log(1 + (total_docs - df + 0.5) / (df + 0.5)) * (BM25_K1 + 1)
+                docs = np.frombuffer(docs, dtype=np.uint32)
+                tfs = np.frombuffer(tfs, dtype=np.uint16).astype(np.float64)
+                # Each document appears once per postings list, so fancy-index += is safe
+                scores[docs] += weight * tfs / (tfs + BM25_K1 * (1 - BM25_B + BM25_B * lengths[docs] / avgdl))
+                del docs, tfs
+            del lengths
+            total = int(np.count_nonzero(scores))
+            wanted = min(offset + limit, total)
+            if wanted <= offset:
+                return [], total
+            top = np.argpartition(-scores, wanted - 1)[:wanted]
+            top = top[np.argsort(-scores[top], kind='stable')][offset:]
+            return [(self._ids[doc], round(float(scores[doc]), 4)) for doc in top.tolist()], total
+
+    def suggest(self, prefix, limit=10):
+        """Topics whose words complete the last word of prefix and contain the words before it.
+
+        Returns [{'id', 'topic'}], newest first, one entry per distinct topic.
+        """
+        self._ensure_started()
+        typed = words(prefix)
+        if not typed:
+            return []
+        complete = [word for word in (typed[:-1] if prefix[-1:].isalnum() else typed) if word not in STOPWORDS]
+        partial = typed[-1] if prefix[-1:].isalnum() else None
+        with self._lock:
+            candidates = None
+            for term in sorted(complete, key=lambda term: len(self._topic_postings.get(term, ()))):
+                docs = self._topic_postings.get(term, ())
+                candidates = set(docs) if candidates is None else candidates.intersection(docs)
+                if not candidates:
+                    return []
+            if partial is not None:
+                lo = bisect.bisect_left(self._vocabulary, partial)
+                hi = bisect.bisect_left(self._vocabulary, partial + '\uffff', lo)
+                matches = set()
+                for term in self._vocabulary[lo:hi]:
+                    docs = self._topic_postings[term]
+                    matches.update(docs if candidates is None else candidates.intersection(docs))
+                # "history o" is probably heading for "of", which is never indexed
+                if matches or candidates is None or not any(word.startswith(partial) for word in STOPWORDS):
+                    candidates = matches
+            results, seen = [], set()
+            # Doc numbers follow insertion order, so the largest are the newest
+            for doc in sorted(candidates or (), reverse=True):
+                key = self._topics[doc].strip().lower()
+                if key not in seen:
+                    seen.add(key)
+                    results.append({'id': self._ids[doc], 'topic': self._topics[doc]})
+                    if len(results) >= limit:
+                        break
+            return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': len(self._ids),
+                'terms': len(self._postings),
+                'postings': sum(len(docs) for docs, _ in self._postings.values()),
+                'topic_terms': len(self._vocabulary),
+                'since': self._since.isoformat() if self._since else None
+            }
+
+    def refresh(self, full=False):
+        """Index podcasts created since the newest one indexed, or every podcast when full"""
+        query = Podcast.objects.order_by('created_at')
+        if self._since is not None and not full:
+            query = query.filter(created_at__gte=self._since - SEARCH_REFRESH_OVERLAP)
+        added = 0
+        for row in query.only('id', 'topic', 'script', 'created_at').as_pymongo():
+            if str(row['_id']) not in self._docs:
+                self.add_podcast(row['_id'], row.get('topic'), row.get('script'), row.get('created_at'))
+                added += 1
+        self._loaded.set()
+        return added
+
+    def rebuild(self):
+        """Reindex every podcast into a fresh index, swap it in and snapshot it"""
+        fresh = SearchIndex(path=self.path, topic_weight=self.topic_weight, background=False)
+        fresh.refresh(full=True)
+        with self._lock, fresh._lock:
+            for name, value in vars(fresh).items():
+                if name not in ('background', '_lock', '_loaded', '_pid', '_thread'):
+                    setattr(self, name, value)
+        self._loaded.set()
+        self.save()
+        return len(self)
+
+    def save(self, path=None):
+        """Write a compact snapshot: a zlib-compressed JSON header, then the raw postings arrays.
+
+        The file is written next to its destination and moved into place, so
+        concurrent workers never read a partial snapshot.
+        """
+        path = path or self.path
+        with self._lock:
+            terms = list(self._postings)
+            topic_terms = list(self._vocabulary)
+            header = {
+                'byteorder': sys.byteorder,
+                'topic_weight': self.topic_weight,
+                'since': self._since.isoformat() if self._since else None,
+                'ids': self._ids,
+                'topics': self._topics,
+                'terms': terms,
+                'df': [len(self._postings[term][0]) for term in terms],
+                'topic_terms': topic_terms,
+                'topic_df': [len(self._topic_postings[term]) for term in topic_terms]
+            }
+            header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+            body = [self._lengths.tobytes()]
+            for term in terms:
+                docs, tfs = self._postings[term]
+                body.append(docs.tobytes())
+                body.append(tfs.tobytes())
+            body.extend(self._topic_postings[term].tobytes() for term in topic_terms)
+            self._dirty = False
+        header = zlib.compress(header, 6)
+        body = zlib.compress(b''.join(body), 1)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            f.write(body)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    def load(self, path=None):
+        """Replace the index with a snapshot; returns False when there is none"""
+        path = path or self.path
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        if not data.startswith(SNAPSHOT_MAGIC):
+            raise ValueError(f"Not a search index snapshot: {path}")
+        offset = len(SNAPSHOT_MAGIC)
+        (header_size,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+        header = json.loads(zlib.decompress(data[offset:offset + header_size]))
+        body = memoryview(zlib.decompress(data[offset + header_size:]))
+        swap = header['byteorder'] != sys.byteorder
+
+        def take(typecode, count):
+            nonlocal position
+            values = array(typecode)
+            values.frombytes(body[position:position + count * values.itemsize])
+            position += count * values.itemsize
+            if swap:
+                values.byteswap()
+            return values
+
+        position = 0
+        ids = header['ids']
+        lengths = take('I', len(ids))
+        postings = {term: (take('I', df), take('H', df)) for term, df in zip(header['terms'], header['df'])}
+        topic_postings = {term: take('I', df) for term, df in zip(header['topic_terms'], header['topic_df'])}
+        with self._lock:
+            self._reset()
+            self.topic_weight = header['topic_weight']
+            self._ids = ids
+            self._docs = {podcast_id: doc for doc, podcast_id in enumerate(ids)}
+            self._topics = header['topics']
+            self._lengths = lengths
+            self._total_length = sum(lengths)
+            self._postings = postings
+            self._topic_postings = topic_postings
+            self._vocabulary = header['topic_terms']
+            self._since = datetime.fromisoformat(header['since']) if header['since'] else None
+        return True
+
+    def _ensure_started(self):
+        if not self.background:
+            return
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name='search-refresh', daemon=True)
+                    self._thread.start()
+        # The first query waits for the initial load; later queries never touch the database
+        self._loaded.wait(timeout=30)
+
+    def _run(self):
+        try:
+            if self.load():
+                logger.info("Loaded search index snapshot with %d podcasts", len(self))
+        except Exception:
+            logger.exception("Error loading search index snapshot, rebuilding")
+        last_snapshot = time.monotonic()
+        while True:
+            try:
+                added = self.refresh()
+                if added:
+                    logger.info("Indexed %d new podcasts for search", added)
+                if self._dirty and time.monotonic() - last_snapshot >= self.snapshot_interval:
+                    self.save()
+                    last_snapshot = time.monotonic()
+            except Exception:
+                logger.exception("Error refreshing search index")
+            time.sleep(self.refresh_interval)
+
+search_index = SearchIndex()
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the podcast search index snapshot")
+    parser.add_argument('command', choices=('rebuild', 'stats'))
+    parser.add_argument('--path', default=SEARCH_INDEX_PATH)
+    args = parser.parse_args()
+    search_index.path = args.path
+
+    if args.command == 'rebuild':
+        import database.mongodb  # noqa: F401 connects to MongoDB
+        started = time.perf_counter()
+        count = search_index.rebuild()
+        print(f"Indexed {count} podcasts in {time.perf_counter() - started:.1f}s, "
+              f"snapshot {os.path.getsize(args.path) / 1024:.0f}KB at {args.path}")
+    elif not search_index.load():
+        print(f"No snapshot at {args.path}")
+    print(json.dumps(search_index.stats(), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import logging
+from flask import Blueprint, request, jsonify
+from database.mongodb import DatabaseOperations
+from database.serializers import listing_projection, json_response
+from .index import search_index
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 100
+
+search = Blueprint('search', __name__)
+
+@search.route('/search', methods=['GET'])
+def search_podcasts():
+    """BM25-ranked podcasts matching ?q= in their topic or script, paged with ?offset= and ?limit="""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query is required"}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), MAX_PAGE_SIZE))
+        offset = max(0, int(request.args.get('offset', 0)))
+        projection = listing_projection(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        hits, total = search_index.search(query, limit=limit, offset=offset)
+        scores = dict(hits)
+        podcasts = DatabaseOperations.get_podcasts_by_ids(list(scores), projection)
+        for podcast in podcasts:
+            podcast['score'] = scores[str(podcast['_id'])]
+        next_offset = offset + limit if offset + limit < total else None
+        return json_response({"podcasts": podcasts, "total": total, "next_offset": next_offset})
+    except Exception as e:
+        logger.exception("Error in search_podcasts")
+        return jsonify({"error": str(e)}), 500
+
+@search.route('/search/suggest', methods=['GET'])
+def suggest_topics():
+    """Autocomplete topics from a typed prefix, served from memory"""
+    prefix = request.args.get('q', '')
+    if not prefix.strip():
+        return jsonify({"error": "Query is required"}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), MAX_PAGE_SIZE))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"suggestions": search_index.suggest(prefix, limit=limit)})
@@ -0,0 +1,503 @@
+"""Near-duplicate detection over podcast topics and scripts with MinHash and LSH.
+
+    python -m search.similar backfill    # sign podcasts missing signatures and report duplicates
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import timedelta
+from database.schemas import Podcast
+from observability.metrics import registry
+from .index import tokenize
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_MODE = os.getenv('DEDUPE_MODE', 'reuse')  # reuse, flag or off
+DEDUPE_TOPIC_THRESHOLD = float(os.getenv('DEDUPE_TOPIC_THRESHOLD', 0.8))
+# A topic match alone is only reused when the topics are near-verbatim: different
+# subjects with similar wording ("... the Arctic" / "... the Antarctic") score
+# above DEDUPE_TOPIC_THRESHOLD and are flagged, leaving reuse to the script check
+DEDUPE_TOPIC_REUSE_THRESHOLD = float(os.getenv('DEDUPE_TOPIC_REUSE_THRESHOLD', 0.95))
+DEDUPE_SCRIPT_THRESHOLD = float(os.getenv('DEDUPE_SCRIPT_THRESHOLD', 0.6))
+DEDUPE_REFRESH_INTERVAL = float(os.getenv('DEDUPE_REFRESH_INTERVAL', 60))
+# Backfilled script signatures of older podcasts are picked up by a periodic full reload
+DEDUPE_FULL_REFRESH_INTERVAL = float(os.getenv('DEDUPE_FULL_REFRESH_INTERVAL', 3600))
+DEDUPE_REFRESH_OVERLAP = timedelta(seconds=float(os.getenv('DEDUPE_REFRESH_OVERLAP', 600)))
+
+# Estimated provider prices for the spend-saved report
+SCRIPT_COST_USD = float(os.getenv('SCRIPT_COST_USD', 0.003))
+TTS_COST_PER_1K_CHARS_USD = float(os.getenv('TTS_COST_PER_1K_CHARS_USD', 0.30))
+IMAGE_COST_USD = float(os.getenv('IMAGE_COST_USD', 0.02))
+
+NUM_PERM = 64
+TOPIC_SHINGLE_CHARS = 3
+# Extra shingles for words with digits, so "World War 1" and "World War 2" stay apart
+NUMBER_SHINGLES = 8
+SCRIPT_SHINGLE_WORDS = 3
+# Band width is chosen so a pair right at the threshold becomes a candidate this often
+LSH_RECALL = 0.9
+# Rows added since the last merge are compared directly until there are this many
+LSH_MERGE_ROWS = 1024
+# Shingles hashed per numpy pass when signing in bulk, sized to stay in cache
+SIGNATURE_CHUNK = 1 << 14
+
+# Podcast fields holding signatures, left out of API responses
+SIGNATURE_FIELDS = ('topic_minhash', 'script_minhash')
+
+_MAX_HASH = 0xFFFFFFFF
+_SEED = 0x5EED
+
+DEDUPE_MATCHES = registry.counter(
+    'dedupe_matches_total', "Near-duplicates of existing podcasts found before generation", ('check', 'action')
+)
+DEDUPE_SKIPPED = registry.counter(
+    'dedupe_checks_skipped_total', "Near-duplicate checks skipped because the index was still loading", ('check',)
+)
+DEDUPE_SAVED_USD = registry.counter(
+    'dedupe_saved_usd_total', "Estimated provider spend avoided by reusing near-duplicate podcasts", ('provider',)
+)
+
+class DuplicatePodcast(Exception):
+    """Raised by the script check to stop a generation in favour of an existing podcast"""
+
+    def __init__(self, match):
+        super().__init__(f"Near-duplicate of podcast {match['id']} ({match['similarity']:.2f})")
+        self.match = match
+
+def topic_shingles(topic):
+    """crc32 hashes of the character trigrams of each topic word"""
+    shingles = set()
+    for word in tokenize(topic):
+        padded = f"#{word}#"
+        shingles.update(padded[i:i + TOPIC_SHINGLE_CHARS] for i in range(len(padded) - TOPIC_SHINGLE_CHARS + 1))
+        if any(char.isdigit() for char in word):
+            shingles.update(f"{padded}{i}" for i in range(NUMBER_SHINGLES))
+    return [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles]
+
+def script_shingles(script):
+    """Hashes of the word trigrams of a script, combined from per-word crc32s with numpy"""
+    import numpy as np
+    hashes = np.array([zlib.crc32(word.encode('utf-8')) for word in tokenize(script)], dtype=np.uint64)
+    if len(hashes) < SCRIPT_SHINGLE_WORDS:
+        return np.unique(hashes)
+    count = len(hashes) - SCRIPT_SHINGLE_WORDS + 1
+    shingles = hashes[:count].copy()
+    for offset in range(1, SCRIPT_SHINGLE_WORDS):
+        shingles = ((shingles * np.uint64(1000003)) ^ hashes[offset:offset + count]) & np.uint64(_MAX_HASH)
+    return np.unique(shingles)
+
+_coefficients = None
+
+def _permutations():
+    """(a, b) of the NUM_PERM multiply-shift hash functions, the same in every process"""
+    global _coefficients
+    if _coefficients is None:
+        import numpy as np
+        rng = np.random.RandomState(_SEED)
+        _coefficients = (rng.randint(0, 1 << 64, NUM_PERM, dtype=np.uint64) | np.uint64(1),
+                         rng.randint(0, 1 << 64, NUM_PERM, dtype=np.uint64))
+    return _coefficients
+
+def signatures(shingle_sets):
+    """MinHash signatures, one uint32 row of NUM_PERM values per shingle set.
+
+    Each hash function is multiply-shift, the high 32 bits of a * x + b
+    mod 2**64, which needs no division. Shingles of many documents are
+    hashed in one (shingles x NUM_PERM) numpy pass and reduced per document
+    with minimum.reduceat. Empty sets get a row of _MAX_HASH, which callers
+    treat as unsigned.
+    """
+    import numpy as np
+    a, b = _permutations()
+    result = np.full((len(shingle_sets), NUM_PERM), _MAX_HASH, dtype=np.uint32)
+    rows, chunk, size = [], [], 0
+
+    def flush():
+        flat = np.concatenate([np.asarray(shingles, dtype=np.uint64) for shingles in chunk])
+        starts = np.cumsum([0] + [len(shingles) for shingles in chunk[:-1]])
+        hashed = flat[:, None] * a
+        hashed += b
+        hashed >>= np.uint64(32)
+        result[rows] = np.minimum.reduceat(hashed, starts, axis=0)
+
+    for row, shingles in enumerate(shingle_sets):
+        if len(shingles) == 0:
+            continue
+        rows.append(row)
+        chunk.append(shingles)
+        size += len(shingles)
+        if size >= SIGNATURE_CHUNK:
+            flush()
+            rows, chunk, size = [], [], 0
+    if chunk:
+        flush()
+    return result
+
+def sign_podcasts(podcasts):
+    """Set topic_minhash and script_minhash on Podcast documents before they are written"""
+    if not podcasts:
+        return
+    topics = signatures([topic_shingles(podcast.topic) for podcast in podcasts])
+    scripts = signatures([script_shingles(podcast.script) for podcast in podcasts])
+    for podcast, topic, script in zip(podcasts, topics, scripts):
+        podcast.topic_minhash = _to_bytes(topic)
+        podcast.script_minhash = _to_bytes(script)
+
+def _to_bytes(signature):
+    return None if (signature == _MAX_HASH).all() else signature.tobytes()
+
+def _from_bytes(data):
+    import numpy as np
+    if not data or len(data) != NUM_PERM * 4:
+        # Missing, or signed with a different NUM_PERM
+        return None
+    return np.frombuffer(data, dtype=np.uint32)
+
+def lsh_bands(threshold, num_perm=NUM_PERM):
+    """(bands, rows) with the widest bands that still make a pair at threshold a candidate with LSH_RECALL"""
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows == 0 and 1 - (1 - threshold ** rows) ** (num_perm // rows) >= LSH_RECALL:
+            best = (num_perm // rows, rows)
+    return best
+
+def estimated_cost(script_chars, providers=('llm', 'tts', 'image')):
+    """Estimated provider spend, per provider, of generating a podcast with a script this long"""
+    costs = {
+        'llm': SCRIPT_COST_USD,
+        'tts': script_chars / 1000 * TTS_COST_PER_1K_CHARS_USD,
+        'image': IMAGE_COST_USD
+    }
+    return {provider: costs[provider] for provider in providers}
+
+def record_reuse(check, script_chars):
+    """Count the spend avoided by reusing a podcast: everything for a topic match, TTS for a script match"""
+    providers = ('llm', 'tts', 'image') if check == 'topic' else ('tts',)
+    saved = estimated_cost(script_chars, providers)
+    for provider, amount in saved.items():
+        DEDUPE_SAVED_USD.inc(amount, provider=provider)
+    return round(sum(saved.values()), 4)
+
+class LSHTable:
+    """MinHash signatures of one field, banded for candidate lookup.
+
+    Band keys of merged rows live in one sorted array per band, so a lookup
+    is a binary search per band. Rows added since the last merge are few
+    and compared against directly, so adding a podcast never re-sorts.
+    """
+
+    def __init__(self, threshold):
+        import numpy as np
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(threshold)
+        self.ids = []  # row -> podcast id
+        self.languages = []  # row -> podcast language
+        self._merged = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self._keys = np.empty((self.bands, 0), dtype=np.uint64)  # sorted band keys
+        self._order = np.empty((self.bands, 0), dtype=np.int32)  # rows in key order
+        self._pending = []
+        self._multipliers = np.random.RandomState(_SEED + 1).randint(
+            1, 1 << 62, self.rows, dtype=np.uint64) | np.uint64(1)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _band_keys(self, matrix):
+        """(bands, n) band keys; uint64 arithmetic wraps, which is fine for hashing"""
+        import numpy as np
+        banded = matrix.reshape(len(matrix), self.bands, self.rows).astype(np.uint64)
+        return (banded * self._multipliers).sum(axis=2, dtype=np.uint64).T
+
+    def add(self, podcast_id, language, signature):
+        self.ids.append(podcast_id)
+        self.languages.append(language)
+        self._pending.append(signature)
+        if len(self._pending) >= LSH_MERGE_ROWS:
+            self.merge()
+
+    def merge(self):
+        import numpy as np
+        if not self._pending:
+            return
+        self._merged = np.vstack([self._merged, np.array(self._pending, dtype=np.uint32)])
+        self._pending = []
+        keys = self._band_keys(self._merged)
+        self._order = np.argsort(keys, axis=1, kind='stable').astype(np.int32)
+        self._keys = np.take_along_axis(keys, self._order, axis=1)
+
+    def query(self, signature, language=None):
+        """Best {'id', 'similarity'} at or above the threshold, or None"""
+        import numpy as np
+        candidates, similarities = [], []
+        if len(self._merged):
+            keys = self._band_keys(signature[None, :])[:, 0]
+            rows = [self._order[band, np.searchsorted(self._keys[band], key, 'left'):
+                                np.searchsorted(self._keys[band], key, 'right')]
+                    for band, key in enumerate(keys)]
+            rows = np.unique(np.concatenate(rows))
+            candidates.extend(rows.tolist())
+            similarities.extend((self._merged[rows] == signature).mean(axis=1).tolist())
+        if self._pending:
+            candidates.extend(range(len(self._merged), len(self.ids)))
+            similarities.extend((np.array(self._pending) == signature).mean(axis=1).tolist())
+        best = None
+        for row, similarity in zip(candidates, similarities):
+            if similarity < self.threshold or (language is not None and self.languages[row] != language):
+                continue
+            if best is None or similarity > best['similarity']:
+                best = {'id': self.ids[row], 'similarity': round(similarity, 3)}
+        return best
+
+    def pairs(self, max_bucket=64):
+        """Candidate pairs (i, j), i < j, sharing a band, verified against the threshold.
+
+        Buckets larger than max_bucket, e.g. thousands of empty-ish scripts,
+        are cut to their first max_bucket rows.
+        """
+        import numpy as np
+        self.merge()
+        found = set()
+        for band in range(self.bands):
+            keys, order = self._keys[band], self._order[band]
+            if not len(keys):
+                continue
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            ends = np.r_[starts[1:], len(keys)]
+            for start, end in zip(starts[ends - starts > 1].tolist(), ends[ends - starts > 1].tolist()):
+                bucket = np.sort(order[start:min(end, start + max_bucket)])
+                left, right = np.triu_indices(len(bucket), 1)
+                found.update(zip(bucket[left].tolist(), bucket[right].tolist()))
+        if not found:
+            return []
+        pairs = np.array(sorted(found), dtype=np.int64)
+        similarity = (self._merged[pairs[:, 0]] == self._merged[pairs[:, 1]]).mean(axis=1)
+        keep = similarity >= self.threshold
+        return list(zip(pairs[keep, 0].tolist(), pairs[keep, 1].tolist(), similarity[keep].tolist()))
+
+class SimilarityIndex:
+    """Topic and script LSH tables over every podcast, kept in memory in each worker.
+
+    Signatures are stored on the Podcast documents when they are written,
+    so a worker loads them rather than re-shingling scripts. Podcasts
+    written before signatures existed are matched on topic, which is cheap
+    to sign on load, until `python -m search.similar backfill` signs their
+    scripts too.
+    """
+
+    def __init__(self, topic_threshold=DEDUPE_TOPIC_THRESHOLD, script_threshold=DEDUPE_SCRIPT_THRESHOLD,
+                 mode=DEDUPE_MODE, refresh_interval=DEDUPE_REFRESH_INTERVAL, background=True,
+                 topic_reuse_threshold=DEDUPE_TOPIC_REUSE_THRESHOLD):
+        self.topic_threshold = topic_threshold
+        self.topic_reuse_threshold = topic_reuse_threshold
+        self.script_threshold = script_threshold
+        self.mode = mode
+        self.refresh_interval = refresh_interval
+        self.background = background
+        self._topics = None
+        self._scripts = None
+        self._topic_ids = set()
+        self._script_ids = set()
+        self._since = None
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._pid = None
+        self._thread = None
+
+    def _tables(self):
+        # Built on first use, so importing this module does not import numpy
+        if self._topics is None:
+            self._topics = LSHTable(self.topic_threshold)
+            self._scripts = LSHTable(self.script_threshold)
+        return self._topics, self._scripts
+
+    def add_podcast(self, podcast_id, language, topic_minhash=None, script_minhash=None, created_at=None):
+        """Index a podcast's stored signatures; ids already indexed are skipped per field"""
+        podcast_id = str(podcast_id)
+        topic, script = _from_bytes(topic_minhash), _from_bytes(script_minhash)
+        with self._lock:
+            topics, scripts = self._tables()
+            if topic is not None and podcast_id not in self._topic_ids:
+                self._topic_ids.add(podcast_id)
+                topics.add(podcast_id, language, topic)
+            if script is not None and podcast_id not in self._script_ids:
+                self._script_ids.add(podcast_id)
+                scripts.add(podcast_id, language, script)
+            if created_at is not None and (self._since is None or created_at > self._since):
+                self._since = created_at
+
+    def check_topic(self, topic, language=None):
+        """Existing podcast whose topic is a near-duplicate, as {'id', 'similarity', 'action'}, or None"""
+        return self._check('topic', signatures([topic_shingles(topic)])[0], language)
+
+    def check_script(self, script, language=None):
+        """Existing podcast whose script is a near-duplicate, as {'id', 'similarity', 'action'}, or None"""
+        return self._check('script', signatures([script_shingles(script)])[0], language)
+
+    def _check(self, check, signature, language):
+        if self.mode == 'off' or _to_bytes(signature) is None:
+            return None
+        self.start()
+        if self.background and not self._loaded.is_set():
+            # Never park a request behind the initial load; this generation just goes unchecked
+            DEDUPE_SKIPPED.inc(check=check)
+            logger.warning("Near-duplicate index still loading, %s check skipped", check)
+            return None
+        with self._lock:
+            topics, scripts = self._tables()
+            match = (topics if check == 'topic' else scripts).query(signature, language)
+        if match is None:
+            return None
+        reuse = self.mode == 'reuse' and (check == 'script' or match['similarity'] >= self.topic_reuse_threshold)
+        match['action'] = 'reuse' if reuse else 'flag'
+        DEDUPE_MATCHES.inc(check=check, action=match['action'])
+        logger.info("Near-duplicate %s found", check, extra={'podcast_id': match['id'],
+                                                             'similarity': match['similarity']})
+        return match
+
+    def stats(self):
+        with self._lock:
+            topics, scripts = self._tables()
+            return {'topics': len(topics), 'scripts': len(scripts), 'topic_bands': topics.bands,
+                    'script_bands': scripts.bands}
+
+    def refresh(self, full=False):
+        """Index podcasts created since the newest one indexed, or every podcast when full"""
+        query = Podcast.objects.order_by('created_at')
+        if self._since is not None and not full:
+            query = query.filter(created_at__gte=self._since - DEDUPE_REFRESH_OVERLAP)
+        rows = list(query.only('id', 'topic', 'language', 'created_at', 'topic_minhash', 'script_minhash')
+                    .as_pymongo())
+        # Podcasts from before signatures were stored get a topic signature here
+        unsigned = [row for row in rows if _from_bytes(row.get('topic_minhash')) is None]
+        for row, signature in zip(unsigned, signatures([topic_shingles(row.get('topic')) for row in unsigned])):
+            row['topic_minhash'] = _to_bytes(signature)
+        for row in rows:
+            self.add_podcast(row['_id'], row.get('language'), row.get('topic_minhash'),
+                             row.get('script_minhash'), row.get('created_at'))
+        self._loaded.set()
+        return len(rows)
+
+    def start(self):
+        """Start this process's refresh thread, whose first pass loads the index; does not wait for it"""
+        if not self.background:
+            return
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name='dedupe-refresh', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        last_full = time.monotonic()
+        while True:
+            try:
+                full = time.monotonic() - last_full >= DEDUPE_FULL_REFRESH_INTERVAL
+                self.refresh(full=full)
+                if full:
+                    last_full = time.monotonic()
+            except Exception:
+                logger.exception("Error refreshing near-duplicate index")
+            time.sleep(self.refresh_interval)
+
+similarity_index = SimilarityIndex()
+
+def backfill(force=False, batch_size=1000):
+    """Sign podcasts missing signatures in vectorised batches; returns (signed, total)"""
+    from pymongo import UpdateOne
+    collection = Podcast._get_collection()
+    query = {} if force else {'$or': [{'topic_minhash': None}, {'script_minhash': None}]}
+    signed = 0
+
+    def write(batch):
+        topics = signatures([topic_shingles(row.get('topic')) for row in batch])
+        scripts = signatures([script_shingles(row.get('script')) for row in batch])
+        collection.bulk_write([
+            UpdateOne({'_id': row['_id']}, {'$set': {'topic_minhash': _to_bytes(topic),
+                                                     'script_minhash': _to_bytes(script)}})
+            for row, topic, script in zip(batch, topics, scripts)
+        ], ordered=False)
+        return len(batch)
+
+    batch = []
+    for row in collection.find(query, {'topic': 1, 'script': 1}):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            signed += write(batch)
+            batch = []
+    if batch:
+        signed += write(batch)
+    return signed, collection.estimated_document_count()
+
+def duplicate_report(topic_threshold=DEDUPE_TOPIC_THRESHOLD, script_threshold=DEDUPE_SCRIPT_THRESHOLD):
+    """Near-duplicate clusters already in the collection and what generating them cost.
+
+    Every podcast after the first in a cluster is one the checks would have
+    served from the existing episode.
+    """
+    index = SimilarityIndex(topic_threshold, script_threshold, mode='flag', background=False)
+    rows = {}
+    for row in Podcast.objects.order_by('created_at').only(
+            'id', 'language', 'created_at', 'topic_minhash', 'script_minhash').as_pymongo():
+        rows[str(row['_id'])] = row
+        index.add_podcast(row['_id'], row.get('language'), row.get('topic_minhash'), row.get('script_minhash'))
+    lengths = {str(row['_id']): row.get('length', 0) for row in Podcast._get_collection().aggregate([
+        {'$project': {'length': {'$strLenCP': {'$ifNull': ['$script', '']}}}}
+    ])}
+
+    parent = {}
+
+    def find(podcast_id):
+        while parent.setdefault(podcast_id, podcast_id) != podcast_id:
+            podcast_id = parent[podcast_id]
+        return podcast_id
+
+    topics, scripts = index._tables()
+    pair_counts = {}
+    for check, table in (('topic', topics), ('script', scripts)):
+        pair_counts[check] = 0
+        for left, right, _ in table.pairs():
+            if table.languages[left] != table.languages[right]:
+                continue
+            pair_counts[check] += 1
+            parent[find(table.ids[right])] = find(table.ids[left])
+
+    clusters = {}
+    for podcast_id in parent:
+        clusters.setdefault(find(podcast_id), set()).add(podcast_id)
+    duplicates = [podcast_id for members in clusters.values()
+                  for podcast_id in sorted(members, key=lambda member: rows[member]['created_at'])[1:]]
+    spend = {'llm': 0.0, 'tts': 0.0, 'image': 0.0}
+    for podcast_id in duplicates:
+        for provider, amount in estimated_cost(lengths.get(podcast_id, 0)).items():
+            spend[provider] += amount
+    return {
+        'podcasts': len(rows),
+        'topic_pairs': pair_counts['topic'],
+        'script_pairs': pair_counts['script'],
+        'clusters': len(clusters),
+        'duplicates': len(duplicates),
+        'duplicate_spend_usd': {provider: round(amount, 4) for provider, amount in spend.items()},
+        'duplicate_spend_total_usd': round(sum(spend.values()), 4)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Sign podcasts for near-duplicate detection and report duplicates")
+    parser.add_argument('command', choices=('backfill', 'report'))
+    parser.add_argument('--force', action='store_true', help="re-sign podcasts that already have signatures")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    import json
+    import database.mongodb  # noqa: F401 connects to MongoDB
+    started = time.perf_counter()
+    if args.command == 'backfill':
+        signed, total = backfill(force=args.force, batch_size=args.batch_size)
+        print(f"Signed {signed} of {total} podcasts in {time.perf_counter() - started:.1f}s")
+    print(json.dumps(duplicate_report(), indent=2))
+
+if __name__ == '__main__':
+    main()
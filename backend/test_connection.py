@@ -1,7 +1,6 @@
 from dotenv import load_dotenv
 import os
 import openai
-from elevenlabs import set_api_key
 from mongoengine import connect
 from pymongo.errors import ServerSelectionTimeoutError
 
@@ -43,7 +42,6 @@ def test_connections():
     elevenlabs_key = os.getenv('ELEVENLABS_API_KEY')
     print(f"ElevenLabs API key exists: {'Yes' if elevenlabs_key else 'No'}")
     if elevenlabs_key:
-        set_api_key(elevenlabs_key)
         # Note: We don't make an actual API call to ElevenLabs here
         # as it would consume credits
         print("✅ ElevenLabs API key is set (validity not tested)")
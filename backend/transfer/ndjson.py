@@ -0,0 +1,244 @@
+"""Streaming NDJSON export and import of the users and podcasts collections.
+
+Each line is one raw document in MongoDB relaxed Extended JSON, so ids,
+dates and MinHash signatures survive the round trip. Export walks a
+cursor and import reads line by line with a bounded number of batches in
+flight, so memory stays flat however large the collection is.
+"""
+import argparse
+import base64
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from bson import ObjectId, json_util
+from pymongo import ReplaceOne, InsertOne
+from pymongo.errors import BulkWriteError
+from observability.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_BATCH_SIZE = int(os.getenv('TRANSFER_BATCH_SIZE', 1000))
+TRANSFER_WORKERS = int(os.getenv('TRANSFER_WORKERS', 4))
+TRANSFER_GZIP_LEVEL = int(os.getenv('TRANSFER_GZIP_LEVEL', 6))
+# Write errors kept in an import report; the rest are only counted
+TRANSFER_MAX_ERRORS = 20
+
+TRANSFER_DOCUMENTS = registry.counter(
+    'transfer_documents_total', "Documents exported or imported as NDJSON", ('collection', 'direction')
+)
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+def collections():
+    """Collections that can be exported and imported, by name"""
+    from database.schemas import Podcast, User
+    return {'users': User, 'podcasts': Podcast}
+
+def _collection(name):
+    documents = collections().get(name)
+    if documents is None:
+        raise ValueError(f"Unknown collection: {name}")
+    return documents._get_collection()
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return {'$date': value.isoformat(timespec='milliseconds') + 'Z'}
+        return {'$date': value.isoformat(timespec='milliseconds')}
+    if isinstance(value, bytes):
+        return {'$binary': {'base64': base64.b64encode(value).decode('ascii'), 'subType': '00'}}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode(document):
+    """One raw document as an NDJSON line in relaxed Extended JSON"""
+    return json.dumps(document, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+
+def decode(line):
+    return json.loads(line, object_hook=json_util.object_hook)
+
+def export_lines(name, batch_size=TRANSFER_BATCH_SIZE, report=None):
+    """Yield a collection as NDJSON, one chunk of up to batch_size lines per cursor batch.
+
+    Documents come in _id order, so an export taken while writes continue
+    still holds each document once. report, if given, is filled in with
+    counts and throughput when the generator finishes.
+    """
+    started = time.perf_counter()
+    documents = size = 0
+    chunk = []
+    for document in _collection(name).find().sort('_id', 1).batch_size(batch_size):
+        chunk.append(encode(document))
+        if len(chunk) >= batch_size:
+            data = b''.join(chunk)
+            documents += len(chunk)
+            size += len(data)
+            chunk = []
+            yield data
+    if chunk:
+        data = b''.join(chunk)
+        documents += len(chunk)
+        size += len(data)
+        yield data
+    TRANSFER_DOCUMENTS.inc(documents, collection=name, direction='export')
+    if report is not None:
+        report.update(_throughput(name, documents, started), bytes=size)
+
+def gzip_chunks(chunks, level=TRANSFER_GZIP_LEVEL):
+    """Compress a stream of byte chunks into one gzip stream without buffering it"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def open_input(raw):
+    """Line-iterable reader over a binary stream, gunzipping it if it starts with the gzip magic"""
+    reader = raw if hasattr(raw, 'peek') else io.BufferedReader(raw)
+    if reader.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=reader)
+    return reader
+
+def _write_batch(collection, lines, first_line, upsert, on_written=None):
+    """Decode and write one batch, returning (counts, errors)"""
+    counts = {'inserted': 0, 'replaced': 0, 'skipped': 0, 'failed': 0}
+    errors = []
+    documents = []
+    requests = []
+    line_numbers = []
+    for offset, line in enumerate(lines):
+        try:
+            document = decode(line)
+            if not isinstance(document, dict):
+                raise ValueError("line is not a JSON object")
+        except ValueError as e:
+            counts['failed'] += 1
+            errors.append({'line': first_line + offset, 'error': str(e)})
+            continue
+        if upsert and '_id' in document:
+            requests.append(ReplaceOne({'_id': document['_id']}, document, upsert=True))
+        else:
+            requests.append(InsertOne(document))
+        documents.append(document)
+        line_numbers.append(first_line + offset)
+    if not requests:
+        return counts, errors
+
+    failed = set()
+    try:
+        details = collection.bulk_write(requests, ordered=False).bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for error in details.get('writeErrors', []):
+            failed.add(error['index'])
+            # Duplicate keys are documents already in the collection
+            outcome = 'skipped' if error.get('code') == 11000 and not upsert else 'failed'
+            counts[outcome] += 1
+            if outcome == 'failed':
+                errors.append({'line': line_numbers[error['index']], 'error': error.get('errmsg')})
+    counts['inserted'] += details.get('nInserted', 0) + details.get('nUpserted', 0)
+    counts['replaced'] += details.get('nMatched', 0)
+    if on_written is not None:
+        on_written([document for index, document in enumerate(documents) if index not in failed])
+    return counts, errors
+
+def import_lines(name, lines, batch_size=TRANSFER_BATCH_SIZE, workers=TRANSFER_WORKERS, upsert=False,
+                 on_written=None):
+    """Write NDJSON lines into a collection with unordered bulk writes on parallel workers.
+
+    Without upsert, documents whose _id already exists are skipped; with
+    it they are replaced. At most two batches per worker are held at once,
+    and on_written, if given, is called with each batch's written documents.
+    Returns a report with counts, the first few errors and throughput.
+    """
+    collection = _collection(name)
+    started = time.perf_counter()
+    totals = {'inserted': 0, 'replaced': 0, 'skipped': 0, 'failed': 0}
+    errors = []
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            counts, batch_errors = future.result()
+            for key, value in counts.items():
+                totals[key] += value
+            errors.extend(batch_errors[:TRANSFER_MAX_ERRORS - len(errors)])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        batch = []
+        first_line = 1
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            if not batch:
+                first_line = line_number
+            batch.append(line)
+            if len(batch) >= batch_size:
+                pending.add(executor.submit(_write_batch, collection, batch, first_line, upsert, on_written))
+                batch = []
+                if len(pending) >= 2 * max(1, workers):
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+        if batch:
+            pending.add(executor.submit(_write_batch, collection, batch, first_line, upsert, on_written))
+        collect(wait(pending)[0])
+
+    documents = sum(totals.values())
+    TRANSFER_DOCUMENTS.inc(totals['inserted'] + totals['replaced'], collection=name, direction='import')
+    return dict(_throughput(name, documents, started), **totals, errors=errors)
+
+def _throughput(name, documents, started):
+    seconds = time.perf_counter() - started
+    return {
+        'collection': name,
+        'documents': documents,
+        'seconds': round(seconds, 3),
+        'docs_per_second': round(documents / seconds) if seconds > 0 else documents
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import users and podcasts as NDJSON")
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('collection', choices=('users', 'podcasts'))
+    parser.add_argument('path', nargs='?', default='-', help="file to write or read, - for stdout/stdin")
+    parser.add_argument('--batch-size', type=int, default=TRANSFER_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=TRANSFER_WORKERS, help="parallel import writers")
+    parser.add_argument('--gzip', action='store_true', help="compress the export (implied by a .gz path)")
+    parser.add_argument('--upsert', action='store_true', help="replace documents whose _id already exists")
+    args = parser.parse_args()
+
+    import database.mongodb  # noqa: F401 connects to MongoDB
+    if args.command == 'export':
+        report = {}
+        chunks = export_lines(args.collection, batch_size=args.batch_size, report=report)
+        if args.gzip or args.path.endswith('.gz'):
+            chunks = gzip_chunks(chunks)
+        out = sys.stdout.buffer if args.path == '-' else open(args.path, 'wb')
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+    else:
+        source = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+        with open_input(source) as lines:
+            report = import_lines(args.collection, lines, batch_size=args.batch_size,
+                                  workers=args.workers, upsert=args.upsert)
+        if args.collection == 'podcasts' and report['inserted']:
+            # Imported podcasts keep their created_at, which incremental refreshes would miss
+            from search.index import search_index
+            search_index.rebuild()
+    print(json.dumps(report, indent=2), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import logging
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from auth.jwt_handler import token_required
+from .ndjson import collections, export_lines, gzip_chunks, import_lines, open_input, TRANSFER_BATCH_SIZE, TRANSFER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+transfer = Blueprint('transfer', __name__)
+
+def _index_podcasts(rows):
+    # Imported podcasts keep their created_at, which the indexes' incremental refreshes would miss
+    from database.mongodb import DatabaseOperations
+    from database.schemas import Podcast
+    for row in rows:
+        DatabaseOperations.index_podcast(Podcast._from_son(row))
+
+@transfer.route('/export/<collection>', methods=['GET'])
+@token_required
+def export_collection(current_user, collection):
+    """Stream a collection as NDJSON, gzipped with ?gzip=1 (admin only)"""
+    if current_user.get('role') != 'admin':
+        return jsonify({"error": "Admin access required"}), 403
+    if collection not in collections():
+        return jsonify({"error": f"Unknown collection: {collection}"}), 404
+    try:
+        batch_size = max(1, int(request.args.get('batch_size', TRANSFER_BATCH_SIZE)))
+    except ValueError:
+        return jsonify({"error": "batch_size must be an integer"}), 400
+
+    report = {}
+
+    def body():
+        yield from export_lines(collection, batch_size=batch_size, report=report)
+        logger.info("Exported %s", collection, extra=report)
+
+    filename = f"{collection}.ndjson"
+    chunks, mimetype = stream_with_context(body()), 'application/x-ndjson'
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks, mimetype, filename = gzip_chunks(chunks), 'application/gzip', f"{filename}.gz"
+    return Response(chunks, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@transfer.route('/import/<collection>', methods=['POST'])
+@token_required
+def import_collection(current_user, collection):
+    """Load an NDJSON body, plain or gzipped, into a collection (admin only); ?upsert=1 replaces by _id"""
+    if current_user.get('role') != 'admin':
+        return jsonify({"error": "Admin access required"}), 403
+    if collection not in collections():
+        return jsonify({"error": f"Unknown collection: {collection}"}), 404
+    try:
+        batch_size = max(1, int(request.args.get('batch_size', TRANSFER_BATCH_SIZE)))
+        workers = max(1, min(int(request.args.get('workers', TRANSFER_WORKERS)), TRANSFER_WORKERS))
+    except ValueError:
+        return jsonify({"error": "batch_size and workers must be integers"}), 400
+    try:
+        report = import_lines(
+            collection,
+            open_input(request.stream),
+            batch_size=batch_size,
+            workers=workers,
+            upsert=request.args.get('upsert') in ('1', 'true'),
+            on_written=_index_podcasts if collection == 'podcasts' else None
+        )
+        logger.info("Imported %s", collection, extra={k: v for k, v in report.items() if k != 'errors'})
+        return jsonify(report), 200
+    except Exception as e:
+        logger.exception("Error in import_collection")
+        return jsonify({"error": str(e)}), 500
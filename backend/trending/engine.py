@@ -0,0 +1,167 @@
+import bisect
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from database.schemas import Podcast
+
+logger = logging.getLogger(__name__)
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 48))
+TRENDING_TOP_N = int(os.getenv('TRENDING_TOP_N', 200))
+TRENDING_REFRESH_INTERVAL = float(os.getenv('TRENDING_REFRESH_INTERVAL', 300))
+
+STAT_WEIGHTS = {'plays': 1.0, 'likes': 3.0, 'shares': 5.0}
+
+_EPOCH = datetime(2024, 1, 1)
+
+def _log2_add(a, b):
+    """log2(2**a + 2**b) without overflow"""
+    if a == -math.inf:
+        return b
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log2(1.0 + 2.0 ** (low - high))
+
+def weighted_total(stats):
+    return sum(STAT_WEIGHTS[field] * (stats.get(field) or 0) for field in STAT_WEIGHTS)
+
+class TrendingEngine:
+    """Time-decayed trending scores with a precomputed top-N.
+
+    Scores use forward decay: an event of weight w at time t adds
+    w * 2 ** ((t - epoch) / half_life), kept in log2 space. Dividing every
+    score by the same 2 ** ((now - epoch) / half_life) gives the decayed score,
+    so ranks never need recomputing as time passes and each stat change is a
+    constant-time update. New podcasts start from their creation time, so
+    recent episodes surface ahead of old hits with the same totals.
+    """
+
+    def __init__(self, half_life_hours=TRENDING_HALF_LIFE_HOURS, top_n=TRENDING_TOP_N,
+                 refresh_interval=TRENDING_REFRESH_INTERVAL):
+        self.half_life = half_life_hours * 3600
+        self.top_n = top_n
+        self.refresh_interval = refresh_interval
+        self._scores = {}  # podcast id -> log2 score
+        self._seen = {}  # podcast id -> stored weighted stat total at the last refresh
+        self._local = {}  # podcast id -> weight recorded here that stored totals may not show yet
+        self._top = []  # (-score, id) ascending, at most top_n entries
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._pid = None
+        self._thread = None
+
+    def _time_offset(self, when):
+        return (when - _EPOCH).total_seconds() / self.half_life
+
+    def _set_score(self, podcast_id, score):
+        old = self._scores.get(podcast_id)
+        self._scores[podcast_id] = score
+        if old is not None:
+            index = bisect.bisect_left(self._top, (-old, podcast_id))
+            if index < len(self._top) and self._top[index] == (-old, podcast_id):
+                del self._top[index]
+        if len(self._top) < self.top_n or -score < self._top[-1][0]:
+            bisect.insort(self._top, (-score, podcast_id))
+            if len(self._top) > self.top_n:
+                self._top.pop()
+
+    def record(self, podcast_id, deltas, when=None):
+        """Add stat increments, e.g. {'plays': 3}, to a podcast's score"""
+        weight = weighted_total(deltas)
+        if weight <= 0:
+            return
+        podcast_id = str(podcast_id)
+        event = math.log2(weight) + self._time_offset(when or datetime.utcnow())
+        with self._lock:
+            if podcast_id not in self._scores:
+                # Not loaded yet; the next refresh scores it from its stored totals
+                return
+            self._local[podcast_id] = self._local.get(podcast_id, 0.0) + weight
+            self._set_score(podcast_id, _log2_add(self._scores[podcast_id], event))
+
+    def add_podcast(self, podcast_id, created_at):
+        """Start scoring a new podcast from its creation time"""
+        with self._lock:
+            if str(podcast_id) not in self._scores:
+                self._seen[str(podcast_id)] = 0.0
+                self._set_score(str(podcast_id), self._time_offset(created_at))
+
+    def refresh(self):
+        """Reconcile scores with the stored totals.
+
+        Podcasts seen for the first time are scored as if their totals arrived
+        at creation. Growth in the stored totals since the last refresh is
+        credited at the current time, less what record() already scored here,
+        so only increments from elsewhere, e.g. another worker, are added.
+        Podcasts that no longer exist are dropped.
+        """
+        now = self._time_offset(datetime.utcnow())
+        with self._lock:
+            # Podcasts added while the query runs are not in its results but still exist
+            known = set(self._scores)
+        rows = list(Podcast.objects.order_by().only('id', 'plays', 'likes', 'shares', 'created_at').as_pymongo())
+        with self._lock:
+            stored = set()
+            for row in rows:
+                podcast_id = str(row['_id'])
+                stored.add(podcast_id)
+                total = weighted_total(row)
+                if podcast_id not in self._scores:
+                    created_at = row.get('created_at') or datetime.utcnow()
+                    self._seen[podcast_id] = total
+                    self._local.pop(podcast_id, None)
+                    self._set_score(podcast_id, math.log2(total + 1.0) + self._time_offset(created_at))
+                    continue
+                growth = total - self._seen[podcast_id]
+                self._seen[podcast_id] = total
+                if growth <= 0:
+                    continue
+                # Local increments still waiting to be written stay pending until the totals show them
+                local = self._local.pop(podcast_id, 0.0)
+                if local > growth:
+                    self._local[podcast_id] = local - growth
+                extra = growth - local
+                if extra > 0:
+                    self._set_score(podcast_id, _log2_add(self._scores[podcast_id], math.log2(extra) + now))
+            self._evict(known - stored)
+        self._loaded.set()
+
+    def _evict(self, podcast_ids):
+        """Forget deleted podcasts, refilling the top-N from the remaining scores"""
+        if not podcast_ids:
+            return
+        for podcast_id in podcast_ids:
+            self._scores.pop(podcast_id, None)
+            self._seen.pop(podcast_id, None)
+            self._local.pop(podcast_id, None)
+        self._top = heapq.nsmallest(self.top_n, ((-score, podcast_id) for podcast_id, score in self._scores.items()))
+
+    def top(self, limit=10):
+        """Ids of the highest scoring podcasts, best first; limit is clamped to 0..top_n"""
+        self._ensure_started()
+        limit = max(0, min(limit, self.top_n))
+        with self._lock:
+            return [podcast_id for _, podcast_id in self._top[:limit]]
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name='trending-refresh', daemon=True)
+                    self._thread.start()
+        # The first read waits for the initial load; later reads never touch the database
+        self._loaded.wait(timeout=30)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Error refreshing trending scores")
+            time.sleep(self.refresh_interval)
+
+trending_engine = TrendingEngine()